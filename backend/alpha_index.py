@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+OnlineLp Alpha 查找索引
+=======================
+在模型加载时把 period.csv 预处理为按 (advertiserCategoryIndex, timeStepIndex)
+分组的 cum_cost / realCPA 数组，get_alpha 由两次全表布尔筛选变为一次二分查找。
+
+查找语义与原实现一致：取分组内（按文件顺序）第一条 cum_cost > 剩余预算 的
+realCPA，找不到时返回默认值。为保证二分查找在 cum_cost 非单调时依然正确，
+索引内保存的是 cum_cost 的前缀最大值：第一个前缀最大值 > b 的位置，
+恰好就是第一个 cum_cost > b 的位置。
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+
+class AlphaIndex:
+    """按 (行业, 时间步) 分组的 alpha 查找表"""
+
+    def __init__(self, model: pd.DataFrame):
+        categories = model["advertiserCategoryIndex"].to_numpy(dtype=np.int64)
+        steps = model["timeStepIndex"].to_numpy(dtype=np.int64)
+        cum_cost = model["cum_cost"].to_numpy(dtype=np.float64)
+        real_cpa = model["realCPA"].to_numpy(dtype=np.float64)
+
+        # 稳定排序：分组内保持文件顺序
+        order = np.lexsort((steps, categories))
+        categories = categories[order]
+        steps = steps[order]
+        cum_cost = cum_cost[order]
+        real_cpa = real_cpa[order]
+
+        n_rows = len(order)
+        change = np.flatnonzero((np.diff(categories) != 0) | (np.diff(steps) != 0)) + 1
+        starts = np.concatenate(([0], change)) if n_rows else np.empty(0, dtype=np.int64)
+        ends = np.append(starts[1:], n_rows)
+
+        self.cum_cost = np.empty_like(cum_cost)
+        self.real_cpa = real_cpa
+        self.groups: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        for start, end in zip(starts, ends):
+            self.cum_cost[start:end] = np.maximum.accumulate(cum_cost[start:end])
+            self.groups[(int(categories[start]), int(steps[start]))] = (int(start), int(end))
+
+    @classmethod
+    def from_csv(cls, model_path: str) -> "AlphaIndex":
+        """从 period.csv 构建索引"""
+        model = pd.read_csv(
+            model_path,
+            usecols=["timeStepIndex", "advertiserCategoryIndex", "cum_cost", "realCPA"],
+        )
+        return cls(model)
+
+    def save(self, index_dir: str, source: Optional[str] = None) -> str:
+        """
+        保存为 .npy 目录，供 load(mmap_mode="r") 在多个进程间共享同一份只读数组；
+        source 为模型文件路径时一并记录其修改时间，用于判断索引是否过期
+        """
+        os.makedirs(index_dir, exist_ok=True)
+        keys = sorted(self.groups)
+        np.save(os.path.join(index_dir, "cum_cost.npy"), self.cum_cost)
+        np.save(os.path.join(index_dir, "real_cpa.npy"), self.real_cpa)
+        np.save(os.path.join(index_dir, "group_keys.npy"), np.array(keys, dtype=np.int64).reshape(-1, 2))
+        np.save(os.path.join(index_dir, "group_spans.npy"),
+                np.array([self.groups[key] for key in keys], dtype=np.int64).reshape(-1, 2))
+        # meta.json 最后写入，作为目录完整的标记
+        meta = {"rows": len(self), "groups": len(keys)}
+        if source is not None:
+            meta.update(source=os.path.abspath(source), source_mtime=os.path.getmtime(source))
+        with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        return index_dir
+
+    @classmethod
+    def load(cls, index_dir: str, mmap_mode: Optional[str] = "r") -> "AlphaIndex":
+        """读取 save() 写出的目录；默认以 mmap 映射 cum_cost / realCPA"""
+        index = cls.__new__(cls)
+        index.cum_cost = np.load(os.path.join(index_dir, "cum_cost.npy"), mmap_mode=mmap_mode)
+        index.real_cpa = np.load(os.path.join(index_dir, "real_cpa.npy"), mmap_mode=mmap_mode)
+        keys = np.load(os.path.join(index_dir, "group_keys.npy"))
+        spans = np.load(os.path.join(index_dir, "group_spans.npy"))
+        index.groups = {(int(c), int(t)): (int(start), int(end)) for (c, t), (start, end) in zip(keys, spans)}
+        return index
+
+    def __len__(self) -> int:
+        return len(self.real_cpa)
+
+    def lookup(self, category: int, time_step: int, remaining_budget: float, default: float) -> float:
+        """单次查找：返回第一条 cum_cost > remaining_budget 的 realCPA"""
+        span = self.groups.get((int(category), int(time_step)))
+        if span is None:
+            return default
+        start, end = span
+        pos = start + np.searchsorted(self.cum_cost[start:end], remaining_budget, side="right")
+        if pos >= end:
+            return default
+        return float(self.real_cpa[pos])
+
+    def lookup_batch(self, categories, time_steps, remaining_budgets, defaults) -> np.ndarray:
+        """
+        批量查找 alpha
+
+        参数均可为标量或等长数组，返回 float64 数组；
+        每个 (行业, 时间步) 分组只做一次向量化 searchsorted。
+        """
+        categories, time_steps, remaining_budgets, defaults = np.broadcast_arrays(
+            np.asarray(categories, dtype=np.int64),
+            np.asarray(time_steps, dtype=np.int64),
+            np.asarray(remaining_budgets, dtype=np.float64),
+            np.asarray(defaults, dtype=np.float64),
+        )
+        alphas = defaults.astype(np.float64, copy=True).ravel()
+        flat_cat = categories.ravel()
+        flat_step = time_steps.ravel()
+        flat_budget = remaining_budgets.ravel()
+
+        keys = np.stack([flat_cat, flat_step], axis=1)
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        by_key = np.argsort(inverse, kind="stable")
+        key_counts = np.bincount(inverse, minlength=len(unique_keys))
+        key_ends = np.cumsum(key_counts)
+        key_starts = key_ends - key_counts
+        for (category, time_step), k_start, k_end in zip(unique_keys, key_starts, key_ends):
+            span = self.groups.get((int(category), int(time_step)))
+            if span is None:
+                continue
+            start, end = span
+            members = by_key[k_start:k_end]
+            pos = start + np.searchsorted(self.cum_cost[start:end], flat_budget[members], side="right")
+            found = pos < end
+            alphas[members[found]] = self.real_cpa[pos[found]]
+
+        return alphas.reshape(categories.shape)
@@ -12,23 +12,51 @@ GrowEngine 后端 API 服务
 技术栈: FastAPI + Uvicorn
 """
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from datetime import datetime
+from contextlib import asynccontextmanager
+import json
 import random
-import math
 import uuid
+import numpy as np
+
+from mock_auction import ENGINE_VERSION, iter_mock_auction, simulate_mock_auction
+from replay_service import ReplayBusy, ReplayService
+from simulation_cache import SimulationCache
+from campaign_store import CampaignStore
+from timeseries_store import TimeSeriesStore
+from event_ingest import EventIngestor, IngestQueueFull, event_batch
+from diagnosis_engine import DiagnosisEngine
 
 # ==================== 应用初始化 ====================
 
+# 真实流量回放进程池 (第一次请求时启动)
+replay_service = ReplayService()
+
+# 竞价模拟结果缓存 (广告计划修改 / 启停 / 删除时失效)
+simulation_cache = SimulationCache()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await event_ingestor.start()
+    yield
+    await event_ingestor.stop()
+    replay_service.shutdown()
+    campaign_store.close()
+
 app = FastAPI(
     title="GrowEngine API",
     description="广告投放自动化平台 - 后端 API 服务",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS 配置 - 允许前端跨域访问
@@ -38,6 +66,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # ==================== 数据模型 ====================
@@ -52,12 +81,15 @@ class Campaign(BaseModel):
     spend: float = 0
     impressions: int = 0
     clicks: int = 0
+    conversions: int = 0
     ctr: float = 0
     cvr: float = 0
     cpa: float = 0
     roi: float = 0
+    gmv: float = 0
     learning_stage: str = "learning"  # learning, passed, failed
     bid_type: str = "oCPM"  # CPC, CPM, oCPM, NOBID
+    category: Optional[str] = None  # 行业，如 电商、游戏
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
 
@@ -68,6 +100,7 @@ class CampaignCreate(BaseModel):
     bid: float = Field(ge=0.1, le=10000)
     target_type: str = "商品购买"
     bid_type: str = "oCPM"
+    category: Optional[str] = None
 
 class CampaignUpdate(BaseModel):
     """更新广告计划请求"""
@@ -106,105 +139,29 @@ class MetricsSnapshot(BaseModel):
     cvr: float
     active_campaigns: int
 
-# ==================== 模拟数据存储 (内存) ====================
-
-# 初始化模拟广告计划数据
-MOCK_CAMPAIGNS: Dict[int, Campaign] = {}
-
-def init_mock_data():
-    """初始化模拟数据"""
-    global MOCK_CAMPAIGNS
-    
-    campaign_data = [
-        {
-            "id": 101,
-            "name": "新品推广_冬季大衣_V1",
-            "status": "active",
-            "budget": 5000,
-            "bid": 45.00,
-            "spend": 3200.50,
-            "impressions": 85200,
-            "clicks": 2130,
-            "ctr": 2.50,
-            "cvr": 3.2,
-            "cpa": 47.06,
-            "roi": 3.8,
-            "learning_stage": "passed",
-            "bid_type": "oCPM"
-        },
-        {
-            "id": 102,
-            "name": "双11预热_美妆礼盒_自动出价",
-            "status": "learning",
-            "budget": 2000,
-            "bid": 120.00,
-            "spend": 450.00,
-            "impressions": 12000,
-            "clicks": 180,
-            "ctr": 1.50,
-            "cvr": 1.1,
-            "cpa": 225.00,
-            "roi": 0.8,
-            "learning_stage": "learning",
-            "bid_type": "NOBID"
-        },
-        {
-            "id": 103,
-            "name": "库存清仓_长尾流量_003",
-            "status": "paused",
-            "budget": 1000,
-            "bid": 20.00,
-            "spend": 890.00,
-            "impressions": 150000,
-            "clicks": 4500,
-            "ctr": 3.00,
-            "cvr": 0.5,
-            "cpa": 39.55,
-            "roi": 1.2,
-            "learning_stage": "failed",
-            "bid_type": "CPC"
-        },
-        {
-            "id": 104,
-            "name": "品牌曝光_春节活动_A/B测试",
-            "status": "active",
-            "budget": 8000,
-            "bid": 80.00,
-            "spend": 5600.00,
-            "impressions": 220000,
-            "clicks": 6600,
-            "ctr": 3.00,
-            "cvr": 2.8,
-            "cpa": 30.27,
-            "roi": 4.5,
-            "learning_stage": "passed",
-            "bid_type": "oCPM"
-        },
-        {
-            "id": 105,
-            "name": "定向人群_高消费用户_精准投放",
-            "status": "active",
-            "budget": 3000,
-            "bid": 150.00,
-            "spend": 1800.00,
-            "impressions": 8000,
-            "clicks": 320,
-            "ctr": 4.00,
-            "cvr": 5.5,
-            "cpa": 102.27,
-            "roi": 5.2,
-            "learning_stage": "passed",
-            "bid_type": "oCPM"
-        }
-    ]
-    
-    for data in campaign_data:
-        now = datetime.now().isoformat()
-        campaign = Campaign(**data, created_at=now, updated_at=now)
-        MOCK_CAMPAIGNS[campaign.id] = campaign
+# ==================== 广告计划存储 (SQLite) ====================
+
+# 多个 worker 共用同一个数据库文件；空库时从 data/campaigns.json 导入。
+# 读写存储的路由都是同步函数（在线程池中执行），SQLite 调用不阻塞事件循环；
+# 异步路由中用 run_in_threadpool 调用
+campaign_store = CampaignStore()
 
-# 启动时初始化数据
-init_mock_data()
+# 时序指标 (进程内环形数组)；启动时导入 data/metrics_timeseries.json
+metrics_store = TimeSeriesStore()
+metrics_store.seed_from_json()
+
+# 投放事件：入队后按固定间隔批量写入 campaign_store 与 metrics_store
+event_ingestor = EventIngestor(campaign_store, metrics_store)
+
+# 智能诊断：按广告计划缓存，随存储的版本号增量更新
+diagnosis_engine = DiagnosisEngine(campaign_store)
+
+def load_campaign(campaign_id: int) -> Campaign:
+    """读取广告计划，不存在时 404"""
+    record = campaign_store.get(campaign_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Campaign {campaign_id} not found")
+    return Campaign(**record)
 
 # ==================== API 路由 ====================
 
@@ -227,106 +184,122 @@ async def health_check():
 
 # ---------- 广告计划管理 ----------
 
+# 下一页游标放在响应头里，响应体仍是广告计划数组
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 @app.get("/api/campaigns", response_model=List[Campaign], tags=["Campaigns"])
-async def list_campaigns(
+def list_campaigns(
+    response: Response,
     status: Optional[str] = Query(None, description="按状态过滤"),
+    bid_type: Optional[str] = Query(None, description="按出价方式过滤"),
+    learning_stage: Optional[str] = Query(None, description="按学习阶段过滤"),
+    sort: str = Query("id", pattern="^(id|spend|roi|cpa)$", description="排序字段"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
     limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0, description="兼容旧客户端；深分页请用 cursor"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值")
 ):
-    """获取广告计划列表"""
-    campaigns = list(MOCK_CAMPAIGNS.values())
-    
-    if status:
-        campaigns = [c for c in campaigns if c.status == status]
-    
-    return campaigns[offset:offset + limit]
+    """
+    获取广告计划列表
+    
+    按 (sort, id) 排序，沿索引读取；还有下一页时响应头 X-Next-Cursor 给出游标，
+    带上 cursor 请求下一页，每页的代价与页的深度无关。
+    """
+    descending = order == "desc"
+    after = None
+    if cursor:
+        if offset:
+            raise HTTPException(status_code=400, detail="cursor and offset cannot be combined")
+        try:
+            after = campaign_store.decode_cursor(cursor, sort, descending)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    # 多取一行判断是否还有下一页
+    records = campaign_store.list(status or None, limit + 1, offset, sort, descending, after,
+                                  bid_type=bid_type or None, learning_stage=learning_stage or None)
+    if len(records) > limit:
+        records = records[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = campaign_store.encode_cursor(records[-1], sort, descending)
+    return [Campaign(**record) for record in records]
+
+@app.get("/api/campaigns/top", response_model=List[Campaign], tags=["Campaigns"])
+def top_campaigns(
+    metric: str = Query("roi", pattern="^(spend|roi|cpa)$"),
+    k: int = Query(10, ge=1, le=1000),
+    order: str = Query("desc", pattern="^(asc|desc)$", description="desc 取最大的 k 个，asc 取最小的"),
+    status: Optional[str] = Query(None),
+    bid_type: Optional[str] = Query(None),
+    learning_stage: Optional[str] = Query(None)
+):
+    """按 spend / roi / cpa 取前 k 个广告计划 (沿排序索引只读 k 行)"""
+    records = campaign_store.top(metric, k, order == "desc", status=status or None,
+                                 bid_type=bid_type or None, learning_stage=learning_stage or None)
+    return [Campaign(**record) for record in records]
 
 @app.get("/api/campaigns/{campaign_id}", response_model=Campaign, tags=["Campaigns"])
-async def get_campaign(campaign_id: int):
+def get_campaign(campaign_id: int):
     """获取单个广告计划详情"""
-    if campaign_id not in MOCK_CAMPAIGNS:
-        raise HTTPException(status_code=404, detail=f"Campaign {campaign_id} not found")
-    return MOCK_CAMPAIGNS[campaign_id]
+    return load_campaign(campaign_id)
 
 @app.post("/api/campaigns", response_model=Campaign, tags=["Campaigns"])
-async def create_campaign(request: CampaignCreate):
-    """创建新广告计划"""
-    new_id = max(MOCK_CAMPAIGNS.keys(), default=100) + 1
+def create_campaign(request: CampaignCreate):
+    """创建新广告计划 (id 由存储分配)"""
     now = datetime.now().isoformat()
     
-    new_campaign = Campaign(
-        id=new_id,
-        name=request.name,
-        budget=request.budget,
-        bid=request.bid,
-        bid_type=request.bid_type,
-        status="learning",
-        learning_stage="learning",
-        spend=0,
-        impressions=0,
-        clicks=0,
-        ctr=0,
-        cvr=0,
-        cpa=0,
-        roi=0,
-        created_at=now,
-        updated_at=now
-    )
-    
-    MOCK_CAMPAIGNS[new_id] = new_campaign
-    return new_campaign
+    record = campaign_store.create({
+        "name": request.name,
+        "budget": request.budget,
+        "bid": request.bid,
+        "bid_type": request.bid_type,
+        "category": request.category,
+        "status": "learning",
+        "learning_stage": "learning",
+        "created_at": now,
+        "updated_at": now
+    })
+    return Campaign(**record)
 
 @app.put("/api/campaigns/{campaign_id}", response_model=Campaign, tags=["Campaigns"])
-async def update_campaign(campaign_id: int, request: CampaignUpdate):
+def update_campaign(campaign_id: int, request: CampaignUpdate):
     """更新广告计划"""
-    if campaign_id not in MOCK_CAMPAIGNS:
-        raise HTTPException(status_code=404, detail=f"Campaign {campaign_id} not found")
+    update_data = request.dict(exclude_unset=True, exclude_none=True)
     
-    campaign = MOCK_CAMPAIGNS[campaign_id]
-    update_data = request.dict(exclude_unset=True)
-    
-    for field, value in update_data.items():
-        setattr(campaign, field, value)
+    record = campaign_store.update(campaign_id, update_data, datetime.now().isoformat())
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Campaign {campaign_id} not found")
     
-    campaign.updated_at = datetime.now().isoformat()
-    MOCK_CAMPAIGNS[campaign_id] = campaign
-    return campaign
+    simulation_cache.invalidate(campaign_id)
+    return Campaign(**record)
 
 @app.delete("/api/campaigns/{campaign_id}", tags=["Campaigns"])
-async def delete_campaign(campaign_id: int):
+def delete_campaign(campaign_id: int):
     """删除广告计划"""
-    if campaign_id not in MOCK_CAMPAIGNS:
+    if not campaign_store.delete(campaign_id):
         raise HTTPException(status_code=404, detail=f"Campaign {campaign_id} not found")
     
-    del MOCK_CAMPAIGNS[campaign_id]
+    simulation_cache.invalidate(campaign_id)
     return {"message": f"Campaign {campaign_id} deleted successfully"}
 
 @app.post("/api/campaigns/{campaign_id}/toggle", response_model=Campaign, tags=["Campaigns"])
-async def toggle_campaign_status(campaign_id: int):
+def toggle_campaign_status(campaign_id: int):
     """切换广告计划状态 (启用/暂停)"""
-    if campaign_id not in MOCK_CAMPAIGNS:
+    record = campaign_store.toggle_status(campaign_id, datetime.now().isoformat())
+    if record is None:
         raise HTTPException(status_code=404, detail=f"Campaign {campaign_id} not found")
     
-    campaign = MOCK_CAMPAIGNS[campaign_id]
-    
-    if campaign.status == "paused":
-        campaign.status = "active"
-    else:
-        campaign.status = "paused"
-    
-    campaign.updated_at = datetime.now().isoformat()
-    return campaign
+    simulation_cache.invalidate(campaign_id)
+    return Campaign(**record)
 
 # ---------- 实时数据 ----------
 
 @app.get("/api/metrics/realtime", response_model=MetricsSnapshot, tags=["Metrics"])
-async def get_realtime_metrics():
-    """获取实时指标数据"""
-    campaigns = list(MOCK_CAMPAIGNS.values())
-    active_campaigns = [c for c in campaigns if c.status == "active"]
+def get_realtime_metrics():
+    """获取实时指标数据 (读取存储中随增删改维护的汇总，与广告计划数量无关)"""
+    totals = campaign_store.totals()
     
-    total_spend = sum(c.spend for c in campaigns)
-    total_gmv = sum(c.spend * c.roi for c in campaigns)
+    total_spend = totals["spend"]
+    total_gmv = totals["gmv"]
     avg_roi = total_gmv / total_spend if total_spend > 0 else 0
     
     # 添加一点随机波动模拟实时数据
@@ -339,202 +312,500 @@ async def get_realtime_metrics():
         roi=round(avg_roi * fluctuation, 2),
         ctr=round(random.uniform(2.8, 3.5), 2),
         cvr=round(random.uniform(2.0, 4.0), 2),
-        active_campaigns=len(active_campaigns)
+        active_campaigns=int(round(totals["active"]))
     )
 
+def rollup_summary(measures: Dict[str, float]) -> Dict[str, Any]:
+    """汇总表的一组累计值 -> 接口输出（计数取整，附 ROI / CTR）"""
+    spend = measures["spend"]
+    impressions = int(round(measures["impressions"]))
+    clicks = int(round(measures["clicks"]))
+    return {
+        "campaigns": int(round(measures["campaigns"])),
+        "active_campaigns": int(round(measures["active"])),
+        "budget": round(measures["budget"], 2),
+        "spend": round(spend, 2),
+        "gmv": round(measures["gmv"], 2),
+        "roi": round(measures["gmv"] / spend, 2) if spend > 0 else 0,
+        "impressions": impressions,
+        "clicks": clicks,
+        "ctr": round(clicks / impressions * 100, 2) if impressions > 0 else 0
+    }
+
+@app.get("/api/metrics/breakdown", tags=["Metrics"])
+def get_metrics_breakdown():
+    """按状态、出价方式、行业拆分的累计指标 (读取汇总表)"""
+    breakdown = campaign_store.breakdown()
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "totals": rollup_summary(campaign_store.totals()),
+        **{dimension: {value: rollup_summary(measures) for value, measures in groups.items()}
+           for dimension, groups in breakdown.items()}
+    }
+
 @app.get("/api/metrics/trend", tags=["Metrics"])
 async def get_metrics_trend(
-    hours: int = Query(24, ge=1, le=168, description="获取多少小时内的趋势数据")
+    hours: int = Query(24, ge=1, le=720, description="获取多少小时内的趋势数据"),
+    resolution: str = Query("hour", pattern="^(minute|hour|day)$", description="时间粒度"),
+    campaign_id: Optional[int] = Query(None, description="只看该广告计划；为空时为全部计划合计"),
+    max_points: int = Query(200, ge=10, le=2000, description="点数上限，超出时按消耗曲线 LTTB 降采样")
 ):
-    """获取趋势数据 (用于图表展示)"""
-    data = []
-    now = datetime.now()
-    
-    for i in range(hours):
-        timestamp = now - timedelta(hours=hours - i)
-        
-        # 模拟一天内的流量分布 (早高峰、晚高峰)
-        hour = timestamp.hour
-        if 8 <= hour <= 10 or 19 <= hour <= 22:
-            base_spend = random.uniform(3000, 5000)
-        elif 0 <= hour <= 6:
-            base_spend = random.uniform(500, 1500)
-        else:
-            base_spend = random.uniform(1500, 3000)
-        
-        roi = random.uniform(3.5, 5.0)
-        
-        data.append({
-            "time": timestamp.strftime("%H:%M"),
-            "date": timestamp.strftime("%Y-%m-%d"),
-            "spend": round(base_spend, 2),
-            "gmv": round(base_spend * roi, 2),
-            "roas": round(roi, 2)
-        })
-    
-    return data
+    """获取趋势数据 (用于图表展示)，读取时序存储"""
+    # 以当前（未结束的）时间桶为最后一个点，共 hours 小时；hours 短于一个时间桶时只返回当前桶
+    end = datetime.now().timestamp()
+    start = min(end - hours * 3600 + metrics_store.resolutions[resolution][0], end)
+    try:
+        series = metrics_store.query(start, end, resolution, campaign_id,
+                                     metrics=("spend", "gmv", "roi", "impressions", "clicks", "conversions"),
+                                     max_points=max_points)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    times = [datetime.fromtimestamp(ts) for ts in series["timestamp"].tolist()]
+    label = "%m-%d" if resolution == "day" else "%H:%M"
+    columns = {
+        "time": [t.strftime(label) for t in times],
+        "date": [t.strftime("%Y-%m-%d") for t in times],
+        "timestamp": [t.isoformat() for t in times],
+        "spend": np.round(series["spend"], 2).tolist(),
+        "gmv": np.round(series["gmv"], 2).tolist(),
+        "roas": np.round(series["roi"], 2).tolist(),
+        "impressions": series["impressions"].astype(np.int64).tolist(),
+        "clicks": series["clicks"].astype(np.int64).tolist(),
+        "conversions": series["conversions"].astype(np.int64).tolist()
+    }
+    keys = list(columns)
+    return [dict(zip(keys, values)) for values in zip(*(columns[key] for key in keys))]
+
+# ---------- 投放事件 ----------
+
+# 单次请求的最大事件数
+MAX_INGEST_EVENTS = 1_000_000
+
+def parse_event_batch(body: bytes, content_type: str) -> Dict[str, np.ndarray]:
+    """
+    事件请求体 -> event_batch() 列式批次
+    
+    - application/json: 列式 {"campaign_id": [...], "type": [...], "value": [...], "timestamp": [...]}
+    - application/x-ndjson: 每行一个 {"campaign_id": ..., "type": ..., "value": ..., "timestamp": ...}
+    
+    type 为 impression / click / conversion / cost；value 为消耗金额或转化 GMV，可省略；
+    timestamp 为 Unix 秒，省略时取接收时间
+    """
+    if "ndjson" in content_type:
+        lines = [line for line in body.splitlines() if line.strip()]
+        rows = json.loads(b"[" + b",".join(lines) + b"]")
+        return event_batch([row["campaign_id"] for row in rows], [row["type"] for row in rows],
+                           [row.get("value", 0) for row in rows], [row.get("timestamp") for row in rows])
+    data = json.loads(body)
+    return event_batch(data["campaign_id"], data["type"], data.get("value"), data.get("timestamp"))
+
+@app.post("/api/events/ingest", status_code=202, tags=["Events"])
+async def ingest_events(request: Request):
+    """
+    批量接收曝光 / 点击 / 转化 / 消耗事件 (列式 JSON 或 NDJSON，见 parse_event_batch)
+    
+    事件只入队即返回 202；写入任务每隔 GROWENGINE_INGEST_FLUSH_INTERVAL 秒按广告计划汇总，
+    累加 spend / impressions / clicks / conversions / gmv 并重算 ctr / cvr / cpa / roi，
+    同时计入趋势时序。不存在的广告计划的事件在写入时丢弃（计入 /api/events/stats）。
+    """
+    body = await request.body()
+    try:
+        # 解析大请求体放到线程池，不阻塞事件循环上的其他请求
+        batch = await run_in_threadpool(parse_event_batch, body, request.headers.get("content-type", ""))
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid event batch: {e}")
+    if len(batch["campaign_id"]) > MAX_INGEST_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_INGEST_EVENTS} events per request")
+    
+    try:
+        accepted = event_ingestor.submit(batch)
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(max(int(event_ingestor.flush_interval), 1))})
+    return {"accepted": accepted, "queue_events": event_ingestor.pending}
+
+@app.get("/api/events/stats", tags=["Events"])
+async def ingest_stats():
+    """事件写入状态：队列深度、累计事件数、写入耗时 (本 worker)"""
+    return event_ingestor.stats()
 
 # ---------- 竞价服务 ----------
 
 @app.post("/api/bidding/calculate", response_model=BidResponse, tags=["Bidding"])
-async def calculate_bid(request: BidRequest):
+def calculate_bid(request: BidRequest):
     """计算竞价出价"""
-    if request.campaign_id not in MOCK_CAMPAIGNS:
-        raise HTTPException(status_code=404, detail=f"Campaign {request.campaign_id} not found")
-    
-    campaign = MOCK_CAMPAIGNS[request.campaign_id]
+    campaign = load_campaign(request.campaign_id)
+    bid_price, win_probability, estimated_conversion = bid_estimates(campaign.bid, request.p_value)
     
+    # 与批量接口相同的 np.round，两者结果逐位一致
+    return BidResponse(
+        bid_price=float(np.round(bid_price, 4)),
+        win_probability=float(np.round(win_probability, 4)),
+        estimated_conversion=float(np.round(estimated_conversion, 6))
+    )
+
+def bid_estimates(alpha, p_value):
+    """出价、获胜概率与预估转化；alpha / p_value 可以是标量或等长数组"""
     # 使用 OnlineLp 策略计算出价: bid = alpha * pValue
     # 这里 alpha 约等于 CPA 目标
-    alpha = campaign.bid
-    bid_price = alpha * request.p_value
+    bid_price = alpha * p_value
     
     # 模拟获胜概率 (基于出价和市场竞争)
-    win_probability = min(0.95, 0.3 + bid_price / 200)
+    win_probability = np.minimum(0.95, 0.3 + bid_price / 200)
     
     # 预估转化
-    estimated_conversion = request.p_value * win_probability
-    
-    return BidResponse(
-        bid_price=round(bid_price, 4),
-        win_probability=round(win_probability, 4),
-        estimated_conversion=round(estimated_conversion, 6)
-    )
+    estimated_conversion = p_value * win_probability
+    return bid_price, win_probability, estimated_conversion
+
+# 单次批量请求的最大曝光数
+MAX_BATCH_BIDS = 1_000_000
+
+def parse_bid_batch(body: bytes, content_type: str):
+    """
+    批量竞价请求体 -> (campaign_id 数组, p_value 数组)
+    
+    - application/json: 列式 {"campaign_id": [...], "p_value": [...]}
+    - application/x-ndjson: 每行一个 {"campaign_id": ..., "p_value": ...}
+    """
+    if "ndjson" in content_type:
+        # 拼成一个 JSON 数组一次解析，比逐行 json.loads 快
+        lines = [line for line in body.splitlines() if line.strip()]
+        rows = json.loads(b"[" + b",".join(lines) + b"]")
+        campaign_ids = [row["campaign_id"] for row in rows]
+        p_values = [row["p_value"] for row in rows]
+    else:
+        data = json.loads(body)
+        campaign_ids, p_values = data["campaign_id"], data["p_value"]
+    campaign_ids = np.asarray(campaign_ids, dtype=np.int64)
+    p_values = np.asarray(p_values, dtype=np.float64)
+    if campaign_ids.ndim != 1 or campaign_ids.shape != p_values.shape:
+        raise ValueError("campaign_id 与 p_value 必须是等长的一维数组")
+    if not np.isfinite(p_values).all():
+        raise ValueError("p_value 必须是有限数")
+    return campaign_ids, p_values
+
+@app.post("/api/bidding/calculate/batch", tags=["Bidding"])
+async def calculate_bid_batch(request: Request):
+    """
+    批量计算竞价出价 (多个广告计划 × 多次曝光)
+    
+    请求体为列式 JSON 或 NDJSON（见 parse_bid_batch），按行向量化计算，返回列式结果：
+    {"count", "bid_price": [...], "win_probability": [...], "estimated_conversion": [...],
+     "unknown_campaign_ids": [...]}；不存在的广告计划所在行三列均为 0。
+    请求与响应都不经过逐行的 pydantic 模型；解析、计算与序列化在线程池中执行，不阻塞事件循环。
+    """
+    body = await request.body()
+    content = await run_in_threadpool(bid_batch_content, body, request.headers.get("content-type", ""))
+    return Response(content=content, media_type="application/json")
+
+def bid_batch_content(body: bytes, content_type: str) -> str:
+    """批量出价请求体 -> 响应 JSON；请求体无效时 400，行数超限时 413"""
+    try:
+        campaign_ids, p_values = parse_bid_batch(body, content_type)
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch body: {e}")
+    if len(campaign_ids) > MAX_BATCH_BIDS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_BIDS} bids per request")
+    
+    # 广告计划 id 排序后用 searchsorted 为每行找到出价系数（bids() 按存储版本号缓存）
+    known_ids, alphas = campaign_store.bids()
+    position = np.searchsorted(known_ids, campaign_ids)
+    found = position < len(known_ids)
+    found[found] = known_ids[position[found]] == campaign_ids[found]
+    alpha = np.zeros(len(campaign_ids))
+    alpha[found] = alphas[position[found]]
+    
+    bid_price, win_probability, estimated_conversion = bid_estimates(alpha, p_values)
+    win_probability = np.where(found, win_probability, 0.0)
+    estimated_conversion = np.where(found, estimated_conversion, 0.0)
+    
+    # 大数组直接 json.dumps，不经过 FastAPI 的 jsonable_encoder 逐项转换
+    return json.dumps({
+        "count": len(campaign_ids),
+        "bid_price": np.round(bid_price, 4).tolist(),
+        "win_probability": np.round(win_probability, 4).tolist(),
+        "estimated_conversion": np.round(estimated_conversion, 6).tolist(),
+        "unknown_campaign_ids": np.unique(campaign_ids[~found]).tolist()
+    }, separators=(",", ":"))
+
+def history_records(columns: Dict[str, np.ndarray], budget: float,
+                    totals: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """
+    逐步列 (alpha/traffic/wins/cost/conversions/remaining_budget，可选 step) -> 竞价模拟 history 记录
+    
+    流式输出时逐块调用，totals 保存此前各块的累计 cost/wins/conversions 并原地更新
+    """
+    if totals is None:
+        totals = {"cost": 0.0, "wins": 0, "conversions": 0}
+    # 整列计算累计指标并取整，再逐步组装
+    total_cost = totals["cost"] + np.cumsum(columns["cost"])
+    total_wins = totals["wins"] + np.cumsum(columns["wins"])
+    total_conversions = totals["conversions"] + np.cumsum(columns["conversions"])
+    if len(total_cost):
+        totals.update(cost=float(total_cost[-1]), wins=int(total_wins[-1]), conversions=int(total_conversions[-1]))
+    history = {
+        "step": columns.get("step", np.arange(len(columns["cost"]))),
+        "alpha": np.round(columns["alpha"], 2),
+        "traffic": columns["traffic"],
+        "wins": columns["wins"],
+        "cost": np.round(columns["cost"], 2),
+        "conversions": columns["conversions"],
+        "total_cost": np.round(total_cost, 2),
+        "total_wins": total_wins,
+        "total_conversions": total_conversions,
+        "real_cpa": np.round(total_cost / np.maximum(total_conversions, 1), 2),
+        "remaining_budget": np.round(columns["remaining_budget"], 2),
+        "budget_percentage": np.round((budget - columns["remaining_budget"]) / budget * 100, 1),
+        "roi": np.round(total_conversions * 150 / np.maximum(total_cost, 1), 2)  # 假设客单价 150
+    }
+    keys = list(history)
+    return [dict(zip(keys, values)) for values in zip(*(history[key].tolist() for key in keys))]
+
+# 流式模拟每块的流量行数：块小则首个时间步到达快
+STREAM_CHUNK_ROWS = 1 << 12
+
+# 关闭代理 (nginx) 缓冲，事件逐条到达客户端
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def sse_event(event: str, data: Any) -> str:
+    """一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def simulation_cache_key(campaign: "Campaign", steps: int, seed: Optional[int], traffic_scale: float) -> tuple:
+    """
+    同一广告计划下区分结果的参数；预算、出价与 updated_at 也在 key 中，
+    其他 worker 修改过的计划（本进程的 invalidate 看不到）不会命中旧结果
+    """
+    return (steps, campaign.budget, campaign.bid, campaign.updated_at, seed, traffic_scale, ENGINE_VERSION)
+
+def simulation_meta(campaign_id: int, campaign: "Campaign") -> Dict[str, Any]:
+    return {
+        "campaign_id": campaign_id,
+        "name": campaign.name,
+        "budget": campaign.budget,
+        "cpa_constraint": round(campaign.bid * 1.5, 2)  # 模拟 CPA 约束
+    }
 
 @app.post("/api/bidding/simulate", tags=["Bidding"])
-async def simulate_auction(campaign_id: int, steps: int = Query(48, ge=1, le=100)):
-    """模拟竞价过程"""
-    if campaign_id not in MOCK_CAMPAIGNS:
-        raise HTTPException(status_code=404, detail=f"Campaign {campaign_id} not found")
-    
-    campaign = MOCK_CAMPAIGNS[campaign_id]
-    results = []
-    
-    total_cost = 0
-    total_conversions = 0
-    total_wins = 0
-    remaining_budget = campaign.budget
-    cpa_constraint = campaign.bid * 1.5  # 模拟 CPA 约束
-    
-    # 模拟 alpha 变化曲线 (先升后降或波动)
-    base_alpha = campaign.bid
-    
-    for step in range(steps):
-        # 模拟 Alpha 动态调整
-        progress = step / steps
-        alpha_factor = 1.0 + 0.3 * math.sin(progress * math.pi * 2) + random.uniform(-0.1, 0.1)
-        current_alpha = base_alpha * alpha_factor
-        
-        # 模拟每个时间步的流量
-        # 早高峰(8-10点)和晚高峰(19-22点)流量大
-        hour_equiv = (step / steps) * 24
-        is_peak = (8 <= hour_equiv <= 10) or (19 <= hour_equiv <= 22)
-        traffic_count = random.randint(150, 300) if is_peak else random.randint(50, 120)
-        
-        step_cost = 0
-        step_conversions = 0
-        step_wins = 0
-        
-        for _ in range(traffic_count):
-            p_value = random.uniform(0.001, 0.08)
-            bid_price = current_alpha * p_value
-            
-            # 模拟市场竞争价格
-            market_price = random.uniform(0.5, bid_price * 1.3)
-            
-            if bid_price >= market_price:
-                # 预算控制
-                if step_cost + market_price <= remaining_budget:
-                    step_wins += 1
-                    step_cost += market_price
-                    
-                    # 模拟转化
-                    if random.random() < p_value:
-                        step_conversions += 1
-        
-        remaining_budget -= step_cost
-        total_cost += step_cost
-        total_conversions += step_conversions
-        total_wins += step_wins
-        
-        real_cpa = total_cost / max(total_conversions, 1)
-        
-        results.append({
-            "step": step,
-            "alpha": round(current_alpha, 2),
-            "traffic": traffic_count,
-            "wins": step_wins,
-            "cost": round(step_cost, 2),
-            "conversions": step_conversions,
-            "total_cost": round(total_cost, 2),
-            "total_wins": total_wins,
-            "total_conversions": total_conversions,
-            "real_cpa": round(real_cpa, 2),
-            "remaining_budget": round(remaining_budget, 2),
-            "budget_percentage": round((campaign.budget - remaining_budget) / campaign.budget * 100, 1),
-            "roi": round((total_conversions * 150) / max(total_cost, 1), 2)  # 假设客单价 150
-        })
+def simulate_auction(
+    campaign_id: int,
+    steps: int = Query(48, ge=1, le=1000),
+    seed: Optional[int] = Query(None, description="随机种子，相同种子结果可复现"),
+    traffic_scale: float = Query(1.0, gt=0, le=20, description="每步流量数倍率")
+):
+    """
+    模拟竞价过程 (同步路由，在线程池中执行，不阻塞事件循环)
+    
+    指定 seed 时结果按广告计划与参数缓存，相同参数的并发请求只计算一次；
+    未指定 seed 时每次都是一次新的随机模拟，不读写缓存。
+    """
+    campaign = load_campaign(campaign_id)
+    
+    def compute():
+        columns = simulate_mock_auction(campaign.budget, campaign.bid, steps, seed, traffic_scale)
+        return {
+            "meta": simulation_meta(campaign_id, campaign),
+            "history": history_records(columns, campaign.budget)
+        }
     
+    if seed is None:
+        return compute()
+    return simulation_cache.get_or_compute(
+        campaign_id, simulation_cache_key(campaign, steps, seed, traffic_scale), compute
+    )
+
+@app.get("/api/bidding/simulate/cache", tags=["Bidding"])
+async def simulation_cache_stats():
+    """竞价模拟缓存的命中 / 未命中 / 合并 / 淘汰 / 过期 / 失效计数"""
+    return simulation_cache.stats()
+
+@app.get("/api/bidding/simulate/stream", tags=["Bidding"])
+async def simulate_auction_stream(
+    request: Request,
+    campaign_id: int,
+    steps: int = Query(48, ge=1, le=1000),
+    seed: Optional[int] = Query(None, description="随机种子，与 /api/bidding/simulate 结果一致"),
+    traffic_scale: float = Query(1.0, gt=0, le=20, description="每步流量数倍率")
+):
+    """
+    以 Server-Sent Events 逐步推送竞价模拟：event meta → 每个时间步一条 step → done
+    
+    模拟按块在线程池中计算，上一块发送完毕才计算下一块；客户端断开后停止计算。
+    指定 seed 时与 /api/bidding/simulate 共用结果缓存：命中时直接推送缓存的结果，完整推送后写入缓存。
+    """
+    campaign = await run_in_threadpool(load_campaign, campaign_id)
+    meta = simulation_meta(campaign_id, campaign)
+    cache_key = simulation_cache_key(campaign, steps, seed, traffic_scale)
+    generation = simulation_cache.generation(campaign_id)
+    cached = simulation_cache.get(campaign_id, cache_key) if seed is not None else None
+    
+    async def replay_cached():
+        yield sse_event("meta", cached["meta"])
+        for record in cached["history"]:
+            yield sse_event("step", record)
+        yield sse_event("done", {"steps": steps})
+    
+    async def events():
+        yield sse_event("meta", meta)
+        chunks = iter_mock_auction(campaign.budget, campaign.bid, steps, seed, traffic_scale,
+                                   chunk_rows=STREAM_CHUNK_ROWS)
+        history = []
+        totals = {"cost": 0.0, "wins": 0, "conversions": 0}
+        while True:
+            columns = await run_in_threadpool(next, chunks, None)
+            if columns is None:
+                break
+            records = history_records(columns, campaign.budget, totals)
+            history.extend(records)
+            for record in records:
+                yield sse_event("step", record)
+            if await request.is_disconnected():
+                return
+        if seed is not None:
+            simulation_cache.put(campaign_id, cache_key, {"meta": meta, "history": history}, generation)
+        yield sse_event("done", {"steps": steps})
+    
+    if cached is not None:
+        return StreamingResponse(replay_cached(), media_type="text/event-stream", headers=SSE_HEADERS)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+# ---------- 真实流量回放 ----------
+
+@app.get("/api/replay/periods", tags=["Replay"])
+async def list_replay_periods():
+    """可回放的 period"""
+    return {"periods": list(replay_service.periods())}
+
+@app.post("/api/replay/simulate", tags=["Replay"])
+async def replay_simulate(
+    period: str = Query(..., description="period 名称，如 period-7"),
+    advertiser_number: Optional[int] = Query(None, description="只回放该广告主；为空时回放整个 period"),
+    replicates: int = Query(1, ge=1, le=100),
+    seed: Optional[int] = Query(None),
+    budget_mode: str = Query("proportional", pattern="^(proportional|replay)$"),
+    substeps: int = Query(1, ge=1, le=16),
+    strategy: str = Query("onlineLp", description="策略名[:参数=值,...]")
+):
+    """在回放进程池中用真实流量回放 OnlineLp 等出价策略"""
+    try:
+        result = await replay_service.replay(period, advertiser_number, replicates, seed,
+                                             budget_mode, substeps, strategy)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    meta = {
+        "period": period,
+        "strategy": strategy,
+        "replicates": replicates,
+        "seed": seed,
+        "budget_mode": budget_mode
+    }
+    if result["columns"] is None:
+        return {"meta": meta, "advertisers": result["advertisers"]}
+    
+    summary = result["advertisers"][0]
+    meta.update(
+        advertiser_number=summary["advertiser_number"],
+        budget=summary["budget"],
+        cpa_constraint=summary["cpa_constraint"]
+    )
     return {
-        "meta": {
-            "campaign_id": campaign_id,
-            "name": campaign.name,
-            "budget": campaign.budget,
-            "cpa_constraint": round(cpa_constraint, 2)
-        },
-        "history": results
+        "meta": meta,
+        "summary": summary,
+        "history": history_records(result["columns"], summary["budget"])
     }
 
+@app.get("/api/replay/stream", tags=["Replay"])
+async def replay_stream(
+    request: Request,
+    period: str = Query(..., description="period 名称，如 period-7"),
+    advertiser_number: int = Query(..., description="回放的广告主"),
+    replicates: int = Query(1, ge=1, le=100),
+    seed: Optional[int] = Query(None),
+    budget_mode: str = Query("proportional", pattern="^(proportional|replay)$"),
+    substeps: int = Query(1, ge=1, le=16),
+    strategy: str = Query("onlineLp", description="策略名[:参数=值,...]")
+):
+    """
+    以 Server-Sent Events 逐步推送单个广告主的真实流量回放：event meta → step → done
+    
+    回放进程每结算一步放入有界队列，客户端读得慢时回放进程等待；客户端断开后回放停止。
+    流式回放使用单独的回放进程，名额已满时返回 503；开始推送后出现的错误以 event failed 给出。
+    """
+    try:
+        steps = replay_service.stream(period, advertiser_number, replicates, seed, budget_mode, substeps, strategy)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ReplayBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    
+    meta = {
+        "period": period,
+        "strategy": strategy,
+        "replicates": replicates,
+        "seed": seed,
+        "budget_mode": budget_mode
+    }
+    
+    async def events():
+        budget = None
+        totals = {"cost": 0.0, "wins": 0, "conversions": 0}
+        try:
+            async for kind, payload in steps:
+                if kind == "meta":
+                    budget = payload["budget"]
+                    meta.update(
+                        advertiser_number=payload["advertiser_number"],
+                        budget=budget,
+                        cpa_constraint=payload["cpa_constraint"]
+                    )
+                    yield sse_event("meta", meta)
+                else:
+                    for record in history_records(payload, budget, totals):
+                        yield sse_event("step", record)
+                if await request.is_disconnected():
+                    return
+            yield sse_event("done", {"total_cost": round(totals["cost"], 2),
+                                     "total_conversions": totals["conversions"]})
+        except KeyError as e:
+            yield sse_event("failed", {"status": 404, "detail": str(e.args[0])})
+        except FileNotFoundError as e:
+            yield sse_event("failed", {"status": 503, "detail": str(e)})
+        except ValueError as e:
+            yield sse_event("failed", {"status": 400, "detail": str(e)})
+        finally:
+            await steps.aclose()
+    
+    # 响应体没开始迭代就断开时 events() 的 finally 不会执行，由 background 归还名额
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS,
+                             background=BackgroundTask(steps.aclose))
+
 # ---------- AI 诊断服务 ----------
 
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match 是否命中：逗号分隔的列表或 *，按弱比较（忽略 W/ 前缀）"""
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
 @app.get("/api/diagnosis", response_model=List[DiagnosticItem], tags=["AI Diagnosis"])
-async def get_diagnosis():
-    """获取智能诊断建议"""
-    campaigns = list(MOCK_CAMPAIGNS.values())
-    diagnostics = []
-    
-    for campaign in campaigns:
-        # 检测学习失败
-        if campaign.learning_stage == "failed":
-            diagnostics.append(DiagnosticItem(
-                type="warning",
-                title=f"计划 [{campaign.name[:15]}...] 学习失败",
-                description=f"该计划冷启动失败，当前 CTR {campaign.ctr}% 低于行业均值。建议检查定向人群或提高出价。",
-                action="一键优化设置",
-                priority=1
-            ))
-        
-        # 检测 ROI 过低
-        if campaign.roi < 1.0 and campaign.status == "active":
-            diagnostics.append(DiagnosticItem(
-                type="warning",
-                title=f"计划 [{campaign.name[:15]}...] ROI 低于盈亏线",
-                description=f"当前 ROI 仅为 {campaign.roi}，低于 1.0 盈亏平衡点。持续投放将造成亏损。",
-                action="暂停计划",
-                priority=1
-            ))
-        
-        # 发现高潜力
-        if campaign.roi > 4.0 and campaign.spend < campaign.budget * 0.5:
-            diagnostics.append(DiagnosticItem(
-                type="opportunity",
-                title=f"高潜力计划 [{campaign.name[:15]}...]",
-                description=f"该计划 ROI 达到 {campaign.roi}，但预算消耗仅 {campaign.spend/campaign.budget*100:.1f}%，存在起量空间。",
-                action="提升出价 +15%",
-                priority=2
-            ))
-    
-    # 通用建议
-    if not diagnostics:
-        diagnostics.append(DiagnosticItem(
-            type="success",
-            title="投放状态良好",
-            description="当前所有计划运行正常，暂无异常需要处理。",
-            action="查看详细报告",
-            priority=3
-        ))
-    
-    return sorted(diagnostics, key=lambda x: x.priority)
+def get_diagnosis(request: Request):
+    """
+    获取智能诊断建议 (按优先级排序)
+    
+    结果由 diagnosis_engine 缓存，只在广告计划变化后重算变化的计划；
+    带 If-None-Match 且结果未变时返回 304
+    """
+    etag, body = diagnosis_engine.current()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 # ---------- AI 助手 ----------
 
@@ -0,0 +1,537 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+整期批量模拟引擎
+================
+一次加载 period-N.csv（或其列式分区），按时间步对全部广告主同时回放 OnlineLp 策略：
+- 流量只分组一次（按 (timeStepIndex, 广告主) 稳定排序，组内保持到达顺序）
+- 每个广告主的剩余预算 / alpha / 累计消耗 / 累计转化保存在 NumPy 数组中
+- 每个时间步的出价、胜出、转化与按广告主汇总均为向量化计算
+
+预算结算支持两种模式：
+- proportional: 与 OnlineLpSimulator.simulate 一致，超预算时按比例缩放胜出与转化
+- replay: 按到达顺序回放，用分段累加和找到预算耗尽的那一条曝光，之后的曝光不再胜出
+
+substeps > 1 时每个时间步按到达顺序切成若干片，每片开始前重新计算 alpha。
+
+StreamingPeriodSimulator 不整体载入流量，每个时间步开始时才从磁盘读取该步的流量，
+内存上限为广告主状态加上最大的单个时间步，结果与 PeriodSimulator 一致。
+
+run(checkpoint_steps=...) 在指定时间步开始前保存 SimulationCheckpoint（剩余预算、
+累计指标、随机数状态与历史）；resume / branch 从检查点继续回放，what-if 分析只需
+重新计算检查点之后的时间步。
+
+出价来自 strategies.py 中的批量策略接口，默认是 OnlineLp。OnlineLp 的参数
+（CPA 上限倍数 cpa_cap、查表时剩余预算的缩放 budget_factor）可以按轨迹给出
+不同取值，参数搜索时所有候选参数在同一次回放中以数组方式批量评估。
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence, Union
+
+from alpha_index import AlphaIndex
+from traffic_store import DEFAULT_STORE_DIR, open_period, open_step_stream
+from strategies import DEFAULT_BUDGET_FACTOR, DEFAULT_CPA_CAP, BiddingStrategy, BidState, OnlineLpStrategy
+
+def calculate_scores(rewards, cpas, cpa_constraints, beta: float = 2) -> np.ndarray:
+    """向量化的 NeurIPS 比赛得分，与 OnlineLpSimulator.calculate_score 一致"""
+    rewards = np.asarray(rewards, dtype=np.float64)
+    cpas = np.asarray(cpas, dtype=np.float64)
+    cpa_constraints = np.asarray(cpa_constraints, dtype=np.float64)
+    penalty = np.where(cpas > cpa_constraints, (cpa_constraints / (cpas + 1e-10)) ** beta, 1.0)
+    return penalty * rewards
+
+
+class PeriodResult:
+    """整期模拟结果：每个广告主（每个重复实验）的逐步历史与汇总得分"""
+
+    HISTORY_FIELDS = ["alpha", "cost", "conversion", "wins", "traffic"]
+    METRICS = ["total_cost", "total_conversion", "real_cpa", "score"]
+
+    def __init__(self, advertisers: pd.DataFrame, history: Dict[str, np.ndarray], active: np.ndarray,
+                 checkpoints: Optional[Dict[int, "SimulationCheckpoint"]] = None):
+        self.advertisers = advertisers
+        # history[field] 形状为 (重复次数, 广告主数, 时间步数)；active 标记该步是否有流量
+        self.history_arrays = history
+        self.active = active
+        # 时间步 -> 该步开始前的检查点
+        self.checkpoints = checkpoints or {}
+
+    @property
+    def n_replicates(self) -> int:
+        return self.history_arrays["cost"].shape[0]
+
+    def lane_totals(self) -> Dict[str, np.ndarray]:
+        """每个 (重复, 广告主) 的累计指标，形状 (重复次数, 广告主数)"""
+        totals = {
+            "total_cost": self.history_arrays["cost"].sum(axis=2),
+            "total_conversion": self.history_arrays["conversion"].sum(axis=2),
+            "total_wins": self.history_arrays["wins"].sum(axis=2),
+            "total_traffic": self.history_arrays["traffic"].sum(axis=2),
+        }
+        totals["real_cpa"] = totals["total_cost"] / (totals["total_conversion"] + 1e-10)
+        totals["score"] = calculate_scores(
+            totals["total_conversion"], totals["real_cpa"], self.advertisers["cpa_constraint"].to_numpy()
+        )
+        return totals
+
+    def summary(self) -> pd.DataFrame:
+        """
+        每个广告主一行的汇总表（多次重复时为均值）；real_cpa 为平均消耗 / 平均转化，
+        不是逐次 CPA 的均值（某次没有转化时那次的 CPA 约为 1e10 量级，会淹没均值）
+        """
+        totals = self.lane_totals()
+        summary = self.advertisers.copy()
+        for name in ["total_cost", "total_conversion", "total_wins", "total_traffic"]:
+            summary[name] = totals[name].mean(axis=0)
+        summary["real_cpa"] = summary["total_cost"] / (summary["total_conversion"] + 1e-10)
+        summary["budget_utilization"] = summary["total_cost"] / summary["budget"]
+        summary["score"] = totals["score"].mean(axis=0)
+        return summary
+
+    def replicate_totals(self) -> pd.DataFrame:
+        """长表：每个 (重复, 广告主) 一行"""
+        totals = self.lane_totals()
+        n_rep, n_adv = totals["total_cost"].shape
+        frame = pd.DataFrame({
+            "replicate": np.repeat(np.arange(n_rep), n_adv),
+            "advertiser_number": np.tile(self.advertisers["advertiser_number"].to_numpy(), n_rep),
+        })
+        for name, values in totals.items():
+            frame[name] = values.ravel()
+        return frame
+
+    def confidence(self, percentiles=(5, 50, 95)) -> pd.DataFrame:
+        """
+        按广告主统计各指标在重复实验间的均值、标准差与分位数；
+        real_cpa 只统计有转化的重复（都没有转化时为 NaN）
+        """
+        totals = self.lane_totals()
+        rows = []
+        for adv, number in enumerate(self.advertisers["advertiser_number"]):
+            for metric in self.METRICS:
+                values = totals[metric][:, adv]
+                if metric == "real_cpa":
+                    values = values[totals["total_conversion"][:, adv] > 0]
+                row = {"advertiser_number": number, "metric": metric,
+                       "mean": values.mean() if len(values) else np.nan,
+                       "std": values.std(ddof=1) if len(values) > 1 else (0.0 if len(values) else np.nan)}
+                bands = np.percentile(values, percentiles) if len(values) else [np.nan] * len(percentiles)
+                for q, value in zip(percentiles, bands):
+                    row[f"p{q}"] = value
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+    def history(self, advertiser_number: int, replicate: int = 0) -> List[Dict]:
+        """单个广告主的逐步历史，格式与 OnlineLpSimulator.simulate 的 history 相同"""
+        matches = np.flatnonzero(self.advertisers["advertiser_number"].to_numpy() == advertiser_number)
+        if len(matches) == 0:
+            raise ValueError(f"广告主 {advertiser_number} 没有数据！")
+        row = matches[0]
+        records = []
+        for time_step in np.flatnonzero(self.active[row]):
+            records.append({
+                "time_step": int(time_step),
+                "alpha": float(self.history_arrays["alpha"][replicate, row, time_step]),
+                "cost": float(self.history_arrays["cost"][replicate, row, time_step]),
+                "conversion": int(self.history_arrays["conversion"][replicate, row, time_step]),
+                "wins": int(self.history_arrays["wins"][replicate, row, time_step]),
+                "traffic": int(self.history_arrays["traffic"][replicate, row, time_step]),
+            })
+        return records
+
+
+class SimulationCheckpoint:
+    """
+    时间步 time_step 开始前的模拟状态
+
+    从检查点继续回放（相同策略）与不中断的回放逐步一致；数组均为保存时的副本。
+    """
+
+    def __init__(self, time_step: int, remaining_budget: np.ndarray, history: Dict[str, np.ndarray],
+                 active: np.ndarray, rng_state: Dict, common_random_numbers: bool):
+        self.time_step = time_step
+        # 形状 (重复次数, 广告主数)
+        self.remaining_budget = remaining_budget
+        self.history = history
+        self.active = active
+        self.rng_state = rng_state
+        self.common_random_numbers = common_random_numbers
+        # 截至检查点的累计指标，形状 (重复次数, 广告主数)
+        self.totals = {
+            "total_cost": history["cost"].sum(axis=2),
+            "total_conversion": history["conversion"].sum(axis=2),
+            "total_wins": history["wins"].sum(axis=2),
+        }
+
+    @classmethod
+    def capture(cls, time_step: int, remaining_budget: np.ndarray, history: Dict[str, np.ndarray],
+                active: np.ndarray, rng: np.random.Generator, common_random_numbers: bool) -> "SimulationCheckpoint":
+        return cls(
+            time_step,
+            remaining_budget.copy(),
+            {field: values.copy() for field, values in history.items()},
+            active.copy(),
+            rng.bit_generator.state,
+            common_random_numbers,
+        )
+
+    @property
+    def n_replicates(self) -> int:
+        return self.remaining_budget.shape[0]
+
+
+class PeriodSimulator:
+    """对一个 period 内的全部广告主同时进行 OnlineLp 回放"""
+
+    BUDGET_MODES = ("proportional", "replay")
+
+    def __init__(self, traffic: Union[str, pd.DataFrame], model: Union[str, AlphaIndex],
+                 total_steps: int = 48, seed: Optional[int] = None,
+                 budget_mode: str = "proportional", substeps: int = 1):
+        if budget_mode not in self.BUDGET_MODES:
+            raise ValueError(f"未知的预算结算模式: {budget_mode}")
+        if substeps < 1:
+            raise ValueError("substeps 必须 >= 1")
+        self.total_steps = total_steps
+        self.seed = seed
+        self.budget_mode = budget_mode
+        self.substeps = substeps
+        self.alpha_index = model if isinstance(model, AlphaIndex) else AlphaIndex.from_csv(model)
+        self._prepare(traffic)
+
+    def _prepare(self, traffic: Union[str, pd.DataFrame]):
+        """按广告主编码、按时间步分组，只做一次"""
+        if isinstance(traffic, str):
+            traffic = open_period(traffic).load()
+        advertiser_numbers, adv_index = np.unique(
+            traffic["advertiserNumber"].to_numpy(), return_inverse=True
+        )
+        first_rows = np.unique(adv_index, return_index=True)[1]
+        self.advertisers = pd.DataFrame({
+            "advertiser_number": advertiser_numbers,
+            "category": traffic["advertiserCategoryIndex"].to_numpy()[first_rows],
+            "budget": traffic["budget"].to_numpy(dtype=np.float64)[first_rows],
+            "cpa_constraint": traffic["CPAConstraint"].to_numpy(dtype=np.float64)[first_rows],
+        })
+
+        # 每个时间步内按广告主连续存放，广告主内部保持到达顺序
+        steps = traffic["timeStepIndex"].to_numpy()
+        order = np.lexsort((adv_index, steps))
+        self.adv_index = adv_index[order]
+        self.p_values = traffic["pValue"].to_numpy(dtype=np.float64)[order]
+        self.least_winning_costs = traffic["leastWinningCost"].to_numpy(dtype=np.float64)[order]
+        self.step_offsets = np.searchsorted(steps[order], np.arange(self.total_steps + 1), side="left")
+
+    @property
+    def n_advertisers(self) -> int:
+        return len(self.advertisers)
+
+    def _iter_steps(self, first_step: int):
+        """
+        依次给出 (时间步, 该步流量)
+
+        流量为 列名 -> 数组 的字典（adv / p_values / least_winning_costs），
+        行按 (广告主下标, 到达顺序) 排列；广告主下标对应 self.advertisers 的行。
+        """
+        for time_step in range(first_step, self.total_steps):
+            start, end = self.step_offsets[time_step], self.step_offsets[time_step + 1]
+            yield time_step, {
+                "adv": self.adv_index[start:end],
+                "p_values": self.p_values[start:end],
+                "least_winning_costs": self.least_winning_costs[start:end],
+            }
+
+    @staticmethod
+    def _segment_starts(adv: np.ndarray) -> np.ndarray:
+        """每一行所在广告主分段的起始位置（adv 已按广告主连续排列）"""
+        is_start = np.ones(len(adv), dtype=bool)
+        is_start[1:] = adv[1:] != adv[:-1]
+        return np.maximum.accumulate(np.where(is_start, np.arange(len(adv)), 0))
+
+    def _slice_ids(self, step: Dict[str, np.ndarray]) -> np.ndarray:
+        """把每个广告主在本步的流量按到达顺序均分为 substeps 片"""
+        adv = step["adv"]
+        seg_start = self._segment_starts(adv)
+        seg_len = np.bincount(adv, minlength=self.n_advertisers)[adv]
+        return (np.arange(len(adv)) - seg_start) * self.substeps // seg_len
+
+    def _lane_sum(self, values: np.ndarray, adv: np.ndarray) -> np.ndarray:
+        """把 (重复次数, 流量数) 的逐曝光数值汇总为 (重复次数, 广告主数)"""
+        n_replicates = values.shape[0]
+        n_adv = self.n_advertisers
+        lanes = ((np.arange(n_replicates) * n_adv)[:, None] + adv).ravel()
+        sums = np.bincount(lanes, weights=values.ravel(), minlength=n_replicates * n_adv)
+        return sums.reshape(n_replicates, n_adv)
+
+    def _effective_alpha(self, bids: np.ndarray, adv: np.ndarray, p_values: np.ndarray) -> np.ndarray:
+        """每个 (重复, 广告主) 的 Σ出价 / ΣpValue；无流量的广告主记为 0"""
+        p_sum = np.bincount(adv, weights=p_values, minlength=self.n_advertisers)
+        return self._lane_sum(bids, adv) / np.where(p_sum > 0, p_sum, np.inf)
+
+    def _auction(self, rows: Dict[str, np.ndarray], bids: np.ndarray, remaining_budget: np.ndarray):
+        """每个广告主单独对固定的 leastWinningCost 竞价：出价不低于它即胜出，支付 leastWinningCost"""
+        least_winning_costs = rows["least_winning_costs"]
+        is_win = bids >= least_winning_costs
+        return is_win, least_winning_costs * is_win
+
+    def _settle(self, rows: Dict[str, np.ndarray], bids: np.ndarray, remaining_budget: np.ndarray,
+                rng: np.random.Generator, common_random_numbers: bool = False):
+        """结算一批曝光，返回每个 (重复, 广告主) 的消耗 / 转化 / 胜出数"""
+        n_replicates = remaining_budget.shape[0]
+        adv = rows["adv"]
+        p_values = rows["p_values"]
+
+        # 竞价结果，形状 (重复次数, 流量数)
+        is_win, costs = self._auction(rows, bids, remaining_budget)
+
+        if self.budget_mode == "replay":
+            # 分段累加和：每个广告主在本批内按到达顺序的累计消耗，超过剩余预算之后不再胜出
+            # 行不按广告主连续排列时（如竞争模式按曝光排列）先按广告主稳定排序
+            grouped = np.all(adv[1:] >= adv[:-1])
+            order = slice(None) if grouped else np.argsort(adv, kind="stable")
+            cum_cost = np.cumsum(costs[:, order], axis=1)
+            seg_start = self._segment_starts(adv[order])
+            before = np.where(seg_start > 0, cum_cost[:, np.maximum(seg_start - 1, 0)], 0.0)
+            within = np.empty_like(cum_cost)
+            within[:, order] = cum_cost - before
+            is_win &= within <= remaining_budget[:, adv]
+            costs = costs * is_win
+
+        n_draws = 1 if common_random_numbers else n_replicates
+        conversions = (rng.random((n_draws, len(adv))) < p_values) & is_win
+
+        # 按 (重复, 广告主) 汇总
+        step_cost = self._lane_sum(costs, adv)
+        step_conversion = self._lane_sum(conversions, adv)
+        step_wins = self._lane_sum(is_win, adv)
+
+        if self.budget_mode == "proportional":
+            # 超预算时按比例缩放
+            over = step_cost > remaining_budget
+            ratio = np.where(over, remaining_budget / np.where(over, step_cost, 1.0), 1.0)
+            step_cost = np.where(over, remaining_budget, step_cost)
+            step_wins = np.floor(step_wins * ratio)
+            step_conversion = np.floor(step_conversion * ratio)
+
+        return step_cost, step_conversion, step_wins
+
+    def run(self, n_replicates: int = 1, cpa_cap=DEFAULT_CPA_CAP, budget_factor=DEFAULT_BUDGET_FACTOR,
+            common_random_numbers: bool = False, strategy: Optional[BiddingStrategy] = None,
+            checkpoint_steps: Optional[Sequence[int]] = None) -> PeriodResult:
+        """
+        回放整期流量
+
+        n_replicates > 1 时同时运行 K 条独立随机轨迹：每步抽取 (K, 流量数) 的随机矩阵，
+        预算、alpha 等状态均为 (K, 广告主数) 数组，一次向量化完成全部重复实验。
+        history 中的 alpha 记录每个时间步第一片的有效 alpha（Σ出价 / ΣpValue），
+        对线性出价策略即为策略给出的 alpha。
+
+        strategy 默认为 OnlineLpStrategy(cpa_cap, budget_factor)；cpa_cap / budget_factor
+        可以是长度为 K 的数组，每条轨迹使用各自的策略参数。common_random_numbers=True 时
+        所有轨迹共用同一组随机数；相同 seed 下不同策略的回放也使用同一组随机数。
+
+        checkpoint_steps 中的每个时间步开始前保存一个检查点，见 result.checkpoints。
+        """
+        if strategy is None:
+            strategy = OnlineLpStrategy(self.alpha_index, cpa_cap, budget_factor)
+        n_adv = self.n_advertisers
+        remaining_budget = np.tile(self.advertisers["budget"].to_numpy(), (n_replicates, 1))
+        history = {
+            field: np.zeros((n_replicates, n_adv, self.total_steps)) for field in PeriodResult.HISTORY_FIELDS
+        }
+        active = np.zeros((n_adv, self.total_steps), dtype=bool)
+        rng = np.random.default_rng(self.seed)
+
+        checkpoints = self._replay(strategy, 0, remaining_budget, history, active, rng,
+                                   common_random_numbers, checkpoint_steps)
+        return PeriodResult(self.advertisers, history, active, checkpoints)
+
+    def resume(self, checkpoint: SimulationCheckpoint, strategy: Optional[BiddingStrategy] = None,
+               cpa_cap=DEFAULT_CPA_CAP, budget_factor=DEFAULT_BUDGET_FACTOR,
+               checkpoint_steps: Optional[Sequence[int]] = None) -> PeriodResult:
+        """
+        从检查点继续回放到期末，返回整期结果（检查点之前的历史原样保留）
+
+        strategy / cpa_cap / budget_factor 与 run 相同，可以与生成检查点时不同；
+        随机数从检查点保存的状态继续，因此同一检查点的不同续跑使用同一组随机数。
+        """
+        if checkpoint.remaining_budget.shape[1] != self.n_advertisers or \
+                checkpoint.active.shape[1] != self.total_steps:
+            raise ValueError("检查点与当前模拟器的广告主或时间步不一致")
+        if strategy is None:
+            strategy = OnlineLpStrategy(self.alpha_index, cpa_cap, budget_factor)
+        remaining_budget = checkpoint.remaining_budget.copy()
+        history = {field: values.copy() for field, values in checkpoint.history.items()}
+        active = checkpoint.active.copy()
+        rng = np.random.default_rng()
+        rng.bit_generator.state = checkpoint.rng_state
+
+        checkpoints = self._replay(strategy, checkpoint.time_step, remaining_budget, history, active, rng,
+                                   checkpoint.common_random_numbers, checkpoint_steps)
+        return PeriodResult(self.advertisers, history, active, checkpoints)
+
+    def branch(self, checkpoint: SimulationCheckpoint,
+               strategies: Dict[str, Optional[BiddingStrategy]]) -> Dict[str, PeriodResult]:
+        """从同一个检查点分别用多个策略续跑（共享检查点之前的回放），None 表示默认策略"""
+        return {name: self.resume(checkpoint, strategy) for name, strategy in strategies.items()}
+
+    def iter_run(self, n_replicates: int = 1, cpa_cap=DEFAULT_CPA_CAP, budget_factor=DEFAULT_BUDGET_FACTOR,
+                 common_random_numbers: bool = False, strategy: Optional[BiddingStrategy] = None):
+        """
+        逐步回放：每个时间步结算后给出 (时间步, {字段: (重复次数, 广告主数) 数组})
+
+        参数与 run 相同，相同 seed 下逐步结果与 run 一致；供流式输出使用，
+        提前停止迭代即放弃剩余时间步的回放。
+        """
+        if strategy is None:
+            strategy = OnlineLpStrategy(self.alpha_index, cpa_cap, budget_factor)
+        remaining_budget = np.tile(self.advertisers["budget"].to_numpy(), (n_replicates, 1))
+        history = {
+            field: np.zeros((n_replicates, self.n_advertisers, self.total_steps))
+            for field in PeriodResult.HISTORY_FIELDS
+        }
+        active = np.zeros((self.n_advertisers, self.total_steps), dtype=bool)
+        rng = np.random.default_rng(self.seed)
+
+        for time_step in self._replay_steps(strategy, 0, remaining_budget, history, active, rng,
+                                            common_random_numbers, None, {}):
+            yield time_step, {field: history[field][:, :, time_step].copy() for field in PeriodResult.HISTORY_FIELDS}
+
+    def _replay(self, strategy: BiddingStrategy, first_step: int, remaining_budget: np.ndarray,
+                history: Dict[str, np.ndarray], active: np.ndarray, rng: np.random.Generator,
+                common_random_numbers: bool, checkpoint_steps: Optional[Sequence[int]]) -> Dict[int, SimulationCheckpoint]:
+        """从 first_step 回放到期末，原地更新 remaining_budget / history / active"""
+        checkpoints = {}
+        for _ in self._replay_steps(strategy, first_step, remaining_budget, history, active, rng,
+                                    common_random_numbers, checkpoint_steps, checkpoints):
+            pass
+        return checkpoints
+
+    def _replay_steps(self, strategy: BiddingStrategy, first_step: int, remaining_budget: np.ndarray,
+                      history: Dict[str, np.ndarray], active: np.ndarray, rng: np.random.Generator,
+                      common_random_numbers: bool, checkpoint_steps: Optional[Sequence[int]],
+                      checkpoints: Dict[int, SimulationCheckpoint]):
+        """_replay 的逐步版本：每个时间步结算完成后给出该时间步，检查点写入 checkpoints"""
+        n_replicates = remaining_budget.shape[0]
+        n_adv = self.n_advertisers
+        categories = self.advertisers["category"].to_numpy()
+        budgets = self.advertisers["budget"].to_numpy()
+        cpa_constraints = self.advertisers["cpa_constraint"].to_numpy()
+        wanted = set(checkpoint_steps or ())
+
+        for time_step, step in self._iter_steps(first_step):
+            if time_step in wanted:
+                checkpoints[time_step] = SimulationCheckpoint.capture(
+                    time_step, remaining_budget, history, active, rng, common_random_numbers
+                )
+            if len(step["adv"]) == 0:
+                yield time_step
+                continue
+            step_traffic = np.bincount(step["adv"], minlength=n_adv)
+            has_traffic = step_traffic > 0
+
+            if self.substeps > 1:
+                slice_ids = self._slice_ids(step)
+                batches = [slice_ids == s for s in range(self.substeps)]
+            else:
+                batches = [slice(None)]
+
+            for i, batch in enumerate(batches):
+                rows = {name: values[batch] for name, values in step.items()}
+                adv = rows["adv"]
+                if len(adv) == 0:
+                    continue
+                # 策略出价
+                p_values = rows["p_values"]
+                state = BidState(time_step, self.total_steps, categories, budgets, cpa_constraints, remaining_budget)
+                bids = np.broadcast_to(strategy.bid(p_values, adv, state), (n_replicates, len(adv)))
+                if i == 0:
+                    history["alpha"][:, :, time_step] = self._effective_alpha(bids, adv, p_values)
+
+                step_cost, step_conversion, step_wins = self._settle(
+                    rows, bids, remaining_budget, rng, common_random_numbers
+                )
+                np.maximum(remaining_budget - step_cost, 0, out=remaining_budget)
+
+                history["cost"][:, :, time_step] += step_cost
+                history["conversion"][:, :, time_step] += step_conversion
+                history["wins"][:, :, time_step] += step_wins
+
+            active[:, time_step] = has_traffic
+            history["traffic"][:, :, time_step] = step_traffic
+            yield time_step
+
+class StreamingPeriodSimulator(PeriodSimulator):
+    """
+    流式 PeriodSimulator：适用于内存放不下整期流量的 period
+
+    构造时只读取广告主表（CSV 需要分块扫描一遍并按时间步写入临时文件），
+    回放时逐个时间步从列式分区或临时文件读取流量；每步的行顺序与
+    PeriodSimulator 相同，相同 seed 下结果逐步一致。
+    """
+
+    def __init__(self, traffic: str, model: Union[str, AlphaIndex],
+                 total_steps: int = 48, seed: Optional[int] = None,
+                 budget_mode: str = "proportional", substeps: int = 1,
+                 store_dir: str = DEFAULT_STORE_DIR, chunksize: int = 1_000_000, spill_dir: Optional[str] = None):
+        self.store_dir = store_dir
+        self.chunksize = chunksize
+        self.spill_dir = spill_dir
+        super().__init__(traffic, model, total_steps, seed, budget_mode, substeps)
+
+    def _prepare(self, traffic: str):
+        self.stream = open_step_stream(traffic, self.store_dir, self.total_steps, self.chunksize, self.spill_dir)
+        self.advertisers = self.stream.advertisers
+
+    def _iter_steps(self, first_step: int):
+        for time_step, adv, p_values, least_winning_costs in self.stream.iter_steps(first_step):
+            yield time_step, {"adv": adv, "p_values": p_values, "least_winning_costs": least_winning_costs}
+
+    def close(self):
+        """删除 CSV 扫描时生成的临时文件"""
+        self.stream.close()
+
+
+def main():
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="整期批量 OnlineLp 模拟")
+    parser.add_argument("--data", default=os.path.join(BASE_DIR, "data/traffic/period-7.csv"))
+    parser.add_argument("--model", default=os.path.join(BASE_DIR, "saved_model/onlineLpTest/period.csv"))
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--replicates", type=int, default=1, help="蒙特卡洛重复次数")
+    parser.add_argument("--budget-mode", choices=PeriodSimulator.BUDGET_MODES, default="proportional")
+    parser.add_argument("--substeps", type=int, default=1, help="每个时间步内重新计算 alpha 的次数")
+    parser.add_argument("--output", default=None, help="汇总结果 CSV 输出路径")
+    parser.add_argument("--streaming", action="store_true", help="逐时间步从磁盘读取流量，适用于超出内存的 period")
+    parser.add_argument("--chunksize", type=int, default=1_000_000, help="流式模式下 CSV 分块读取的行数")
+    args = parser.parse_args()
+
+    if args.streaming:
+        simulator = StreamingPeriodSimulator(args.data, args.model, seed=args.seed, budget_mode=args.budget_mode,
+                                             substeps=args.substeps, chunksize=args.chunksize)
+    else:
+        simulator = PeriodSimulator(args.data, args.model, seed=args.seed,
+                                    budget_mode=args.budget_mode, substeps=args.substeps)
+    try:
+        result = simulator.run(n_replicates=args.replicates)
+    finally:
+        if args.streaming:
+            simulator.close()
+    summary = result.summary()
+    print(summary.to_string(index=False))
+    if args.replicates > 1:
+        print(f"\n{args.replicates} 次重复实验统计:")
+        print(result.confidence().to_string(index=False))
+    print(f"\n广告主数: {len(summary)}  总得分: {summary['score'].sum():.2f}")
+
+    if args.output:
+        summary.to_csv(args.output, index=False)
+        print(f"✓ 已保存至: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+广告计划存储 (SQLite)
+=====================
+/api/campaigns 等接口背后的持久化存储。同一台机器上的多个 worker（gunicorn -w N /
+uvicorn --workers N）打开同一个数据库文件，看到的是同一份广告计划，重启后数据仍在。
+
+- WAL 模式：读不阻塞写、写不阻塞读；synchronous=NORMAL，提交不逐次 fsync
+- 每个进程一个连接池，连接复用，并缓存编译好的 SQL（sqlite3 的 cached_statements），
+  全部 SQL 都是带参数占位符的固定语句
+- 二级索引：status、bid_type、learning_stage 过滤，spend / roi / cpa 排序（另有
+  status + 排序列的组合索引）；列表按 (排序列, id) 游标分页，任意深度的一页都只沿索引
+  读一页的行，不像 OFFSET 那样先跳过前面全部行；top-k 同样沿索引读前 k 行
+- 新建 id、启停切换、更新都在一条带 RETURNING 的语句里完成，多个 worker 并发写不会冲突
+- 批量写入（upsert_many）用 executemany 在一个事务里完成
+- 投放事件的增量（apply_deltas）在一条 UPDATE 中累加 spend / impressions / clicks /
+  conversions / gmv，并由累加后的值重算 ctr / cvr / cpa / roi
+- 汇总表 campaign_rollups 由触发器随每次增删改更新（任何 worker、任何写入路径），
+  按 all / status / bid_type / category 维护计划数、启用数、消耗、GMV 等累计值，
+  读实时指标只需按主键取一行
+- 版本表 campaign_versions 由触发器随每次增删改记录该广告计划的全局递增版本号（删除留下
+  标记），changes() 按版本号取出某个版本之后变化的计划，供诊断等派生结果增量更新
+- 空库第一次打开时从 generate_mock_data.py 生成的 data/campaigns.json 导入
+
+环境变量:
+    GROWENGINE_DB_PATH         数据库文件，默认 data/growengine.db
+    GROWENGINE_CAMPAIGN_SEED   初始广告计划，默认 data/campaigns.json
+"""
+
+import os
+import json
+import base64
+import queue
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.environ.get("GROWENGINE_DB_PATH", os.path.join(BASE_DIR, "data/growengine.db"))
+SEED_PATH = os.environ.get("GROWENGINE_CAMPAIGN_SEED", os.path.join(BASE_DIR, "data/campaigns.json"))
+
+# 与 api.Campaign 的字段一一对应
+COLUMNS = (
+    "id", "name", "status", "budget", "bid", "spend", "impressions", "clicks", "conversions",
+    "ctr", "cvr", "cpa", "roi", "gmv", "learning_stage", "bid_type", "category", "created_at", "updated_at",
+)
+# 记录中缺失时的取值（其余数值列为 0）
+DEFAULTS = {"status": "learning", "budget": 5000, "bid": 65, "learning_stage": "learning", "bid_type": "oCPM",
+            "category": None, "created_at": None, "updated_at": None}
+# 允许通过 update() 修改的字段
+UPDATABLE = ("name", "budget", "bid", "status")
+# 列表可用的过滤与排序字段（都有索引）
+FILTERS = ("status", "bid_type", "learning_stage")
+SORT_KEYS = ("id", "spend", "roi", "cpa")
+# apply_deltas 累加的计数列
+DELTA_COLUMNS = ("spend", "impressions", "clicks", "conversions", "gmv")
+# 由计数列重算的比率：列名 -> (分子, 分母, 倍数)，与 data/campaigns.json 一样保留两位小数
+RATIOS = {
+    "ctr": ("clicks", "impressions", 100),
+    "cvr": ("conversions", "clicks", 100),
+    "cpa": ("spend", "conversions", 1),
+    "roi": ("gmv", "spend", 1),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'learning',
+    budget REAL NOT NULL DEFAULT 5000,
+    bid REAL NOT NULL DEFAULT 65,
+    spend REAL NOT NULL DEFAULT 0,
+    impressions INTEGER NOT NULL DEFAULT 0,
+    clicks INTEGER NOT NULL DEFAULT 0,
+    conversions INTEGER NOT NULL DEFAULT 0,
+    ctr REAL NOT NULL DEFAULT 0,
+    cvr REAL NOT NULL DEFAULT 0,
+    cpa REAL NOT NULL DEFAULT 0,
+    roi REAL NOT NULL DEFAULT 0,
+    gmv REAL NOT NULL DEFAULT 0,
+    learning_stage TEXT NOT NULL DEFAULT 'learning',
+    bid_type TEXT NOT NULL DEFAULT 'oCPM',
+    category TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_campaigns_status ON campaigns (status);
+CREATE INDEX IF NOT EXISTS idx_campaigns_bid_type_stage ON campaigns (bid_type, learning_stage);
+CREATE INDEX IF NOT EXISTS idx_campaigns_learning_stage ON campaigns (learning_stage);
+CREATE INDEX IF NOT EXISTS idx_campaigns_spend ON campaigns (spend);
+CREATE INDEX IF NOT EXISTS idx_campaigns_roi ON campaigns (roi);
+CREATE INDEX IF NOT EXISTS idx_campaigns_cpa ON campaigns (cpa);
+CREATE INDEX IF NOT EXISTS idx_campaigns_status_spend ON campaigns (status, spend);
+CREATE INDEX IF NOT EXISTS idx_campaigns_status_roi ON campaigns (status, roi);
+CREATE INDEX IF NOT EXISTS idx_campaigns_status_cpa ON campaigns (status, cpa);
+"""
+
+# ---------- 汇总表 ----------
+
+ROLLUP_DIMENSIONS = ("status", "bid_type", "category")
+# 累计的指标：列名 -> 单个广告计划的取值（NEW / OLD 为触发器中的行）
+ROLLUP_MEASURES = {
+    "campaigns": "1",
+    "active": "({row}.status = 'active')",
+    "budget": "{row}.budget",
+    "spend": "{row}.spend",
+    "gmv": "{row}.gmv",
+    "impressions": "{row}.impressions",
+    "clicks": "{row}.clicks",
+}
+UNKNOWN_CATEGORY = "unknown"
+
+ROLLUP_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS campaign_rollups (
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    {', '.join(f'{measure} REAL NOT NULL DEFAULT 0' for measure in ROLLUP_MEASURES)},
+    PRIMARY KEY (dimension, value)
+) WITHOUT ROWID;
+"""
+
+
+def _rollup_upserts(row: str, sign: str) -> str:
+    """把一行（NEW 或 OLD）按 sign 计入各维度汇总的语句"""
+    groups = [("'all'", "''")] + [(f"'{dimension}'", f"COALESCE({row}.{dimension}, '{UNKNOWN_CATEGORY}')")
+                                  for dimension in ROLLUP_DIMENSIONS]
+    measures = ", ".join(ROLLUP_MEASURES)
+    values = ", ".join(f"{sign}{expression.format(row=row)}" for expression in ROLLUP_MEASURES.values())
+    updates = ", ".join(f"{measure} = {measure} + excluded.{measure}" for measure in ROLLUP_MEASURES)
+    return "\n".join(
+        f"    INSERT INTO campaign_rollups (dimension, value, {measures}) VALUES ({dimension}, {value}, {values}) "
+        f"ON CONFLICT (dimension, value) DO UPDATE SET {updates};"
+        for dimension, value in groups
+    )
+
+
+_ROLLUP_COLUMNS = ", ".join(dict.fromkeys(["status", *ROLLUP_DIMENSIONS, "budget", "spend", "gmv",
+                                           "impressions", "clicks"]))
+ROLLUP_TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS campaigns_rollup_insert AFTER INSERT ON campaigns BEGIN
+{_rollup_upserts("NEW", "")}
+END;
+CREATE TRIGGER IF NOT EXISTS campaigns_rollup_delete AFTER DELETE ON campaigns BEGIN
+{_rollup_upserts("OLD", "-")}
+END;
+CREATE TRIGGER IF NOT EXISTS campaigns_rollup_update AFTER UPDATE OF {_ROLLUP_COLUMNS} ON campaigns BEGIN
+{_rollup_upserts("OLD", "-")}
+{_rollup_upserts("NEW", "")}
+END;
+"""
+
+# ---------- 版本表 ----------
+
+VERSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaign_versions (
+    campaign_id INTEGER PRIMARY KEY,
+    revision INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_campaign_versions_revision ON campaign_versions (revision);
+"""
+
+
+def _version_upsert(row: str, deleted: int) -> str:
+    # 写事务是 BEGIN IMMEDIATE，MAX(revision) + 1 不会被并发写入重复取到
+    return (f"    INSERT INTO campaign_versions (campaign_id, revision, deleted) "
+            f"VALUES ({row}.id, (SELECT COALESCE(MAX(revision), 0) + 1 FROM campaign_versions), {deleted}) "
+            f"ON CONFLICT (campaign_id) DO UPDATE SET revision = excluded.revision, deleted = excluded.deleted;")
+
+
+VERSION_TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS campaigns_version_insert AFTER INSERT ON campaigns BEGIN
+{_version_upsert("NEW", 0)}
+END;
+CREATE TRIGGER IF NOT EXISTS campaigns_version_update AFTER UPDATE ON campaigns BEGIN
+{_version_upsert("NEW", 0)}
+END;
+CREATE TRIGGER IF NOT EXISTS campaigns_version_delete AFTER DELETE ON campaigns BEGIN
+{_version_upsert("OLD", 1)}
+END;
+"""
+
+_SELECT = f"SELECT {', '.join(COLUMNS)} FROM campaigns"
+# ON CONFLICT DO UPDATE 而不是 INSERT OR REPLACE：REPLACE 删除旧行时默认不触发 DELETE 触发器
+_UPSERT = (f"INSERT INTO campaigns ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+           f"ON CONFLICT (id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in COLUMNS[1:])}")
+# id 取当前最大 id + 1（空表从 101 开始），与插入在同一条语句中
+_INSERT = (f"INSERT INTO campaigns ({', '.join(COLUMNS)}) "
+           f"VALUES ((SELECT COALESCE(MAX(id), 100) + 1 FROM campaigns), {', '.join('?' * (len(COLUMNS) - 1))}) "
+           f"RETURNING {', '.join(COLUMNS)}")
+# 增量在一条语句里完成：SET 右侧引用的列都是更新前的值
+_APPLY = ("UPDATE campaigns SET "
+          + ", ".join(f"{column} = {column} + :{column}" for column in DELTA_COLUMNS) + ", "
+          + ", ".join(f"{ratio} = CASE WHEN {denominator} + :{denominator} > 0 "
+                      f"THEN ROUND(({numerator} + :{numerator}) * {scale}.0 / ({denominator} + :{denominator}), 2) "
+                      f"ELSE 0 END"
+                      for ratio, (numerator, denominator, scale) in RATIOS.items())
+          + ", updated_at = :updated_at WHERE id = :id")
+_TOGGLE = ("UPDATE campaigns SET status = CASE WHEN status = 'paused' THEN 'active' ELSE 'paused' END, "
+           f"updated_at = ? WHERE id = ? RETURNING {', '.join(COLUMNS)}")
+
+
+class CampaignStore:
+    """SQLite 广告计划存储；方法返回字段与 COLUMNS 相同的 dict"""
+
+    def __init__(self, db_path: str = DB_PATH, seed_path: Optional[str] = SEED_PATH, pool_size: int = 8):
+        self.db_path = db_path
+        self.seed_path = seed_path
+        self.pool_size = pool_size
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._pid = os.getpid()
+        # (版本号, id 数组, bid 数组)
+        self._bids: Optional[Tuple[int, np.ndarray, np.ndarray]] = None
+        self._init_db()
+
+    # ---------- 连接池 ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None：读语句自动提交，写事务显式 BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.db_path, timeout=10.0, isolation_level=None,
+                               check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        if self._pid != os.getpid():
+            # fork 后（gunicorn --preload）不复用父进程的连接
+            self._pool = queue.LifoQueue()
+            self._pid = os.getpid()
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if self._pool.qsize() < self.pool_size:
+                self._pool.put(conn)
+            else:
+                conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """写事务；BEGIN IMMEDIATE 一开始就拿写锁，避免多个 worker 读后写时死锁"""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA + ROLLUP_SCHEMA + ROLLUP_TRIGGERS + VERSION_SCHEMA + VERSION_TRIGGERS)
+        with self._transaction() as conn:
+            # 在写锁内检查，多个 worker 同时启动时只有一个导入
+            empty = conn.execute("SELECT NOT EXISTS (SELECT 1 FROM campaigns)").fetchone()[0]
+            if empty and self.seed_path and os.path.exists(self.seed_path):
+                with open(self.seed_path, encoding="utf-8") as f:
+                    conn.executemany(_UPSERT, [self._values(record) for record in json.load(f)])
+
+    @staticmethod
+    def _values(record: Dict[str, Any]) -> Tuple:
+        """dict -> COLUMNS 顺序的参数；多余字段忽略"""
+        return tuple(record.get(column, DEFAULTS.get(column, 0)) for column in COLUMNS)
+
+    # ---------- 读 ----------
+
+    def get(self, campaign_id: int) -> Optional[Dict[str, Any]]:
+        with self._connection() as conn:
+            row = conn.execute(f"{_SELECT} WHERE id = ?", (campaign_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list(self, status: Optional[str] = None, limit: int = -1, offset: int = 0, sort: str = "id",
+             descending: bool = False, after: Optional[Tuple[Any, int]] = None, **filters) -> List[Dict[str, Any]]:
+        """
+        按 (sort, id) 排序的广告计划；limit=-1 表示不限
+
+        过滤字段见 FILTERS（status 及 bid_type=、learning_stage= 关键字参数）。
+        after 为上一页最后一行的 (sort 列的值, id)，从其后继续（游标分页）。
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        filters["status"] = status
+        where, params = [], []
+        for column in FILTERS:
+            if filters.get(column) is not None:
+                # 按 spend / roi / cpa 排序时只有 status 有组合索引；其余过滤条件加一元 +，
+                # 让 SQLite 沿排序索引读取并逐行过滤，凑满一页即停，而不是取出全部匹配行再排序
+                unindexed = sort != "id" and column != "status"
+                where.append(f"{'+' if unindexed else ''}{column} = ?")
+                params.append(filters[column])
+        op, direction = ("<", "DESC") if descending else (">", "ASC")
+        if after is not None:
+            if sort == "id":
+                where.append(f"id {op} ?")
+                params.append(after[1])
+            else:
+                # 行值比较，沿 (sort, rowid) 索引定位到游标之后
+                where.append(f"({sort}, id) {op} (?, ?)")
+                params.extend(after)
+        order = f"id {direction}" if sort == "id" else f"{sort} {direction}, id {direction}"
+        sql = f"{_SELECT}{' WHERE ' + ' AND '.join(where) if where else ''} ORDER BY {order} LIMIT ? OFFSET ?"
+        with self._connection() as conn:
+            rows = conn.execute(sql, (*params, limit, offset)).fetchall()
+        return [dict(row) for row in rows]
+
+    def top(self, metric: str, k: int, descending: bool = True, **filters) -> List[Dict[str, Any]]:
+        """metric 最大（descending=False 时最小）的 k 个广告计划"""
+        return self.list(limit=k, sort=metric, descending=descending, **filters)
+
+    def totals(self) -> Dict[str, float]:
+        """全部广告计划的累计值（汇总表的一行）"""
+        with self._connection() as conn:
+            row = conn.execute(f"SELECT {', '.join(ROLLUP_MEASURES)} FROM campaign_rollups "
+                               "WHERE dimension = 'all' AND value = ''").fetchone()
+        return dict(row) if row is not None else dict.fromkeys(ROLLUP_MEASURES, 0.0)
+
+    def breakdown(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """{维度: {取值: 累计值}}，只含仍有广告计划的取值"""
+        with self._connection() as conn:
+            rows = conn.execute(f"SELECT dimension, value, {', '.join(ROLLUP_MEASURES)} FROM campaign_rollups "
+                                "WHERE dimension != 'all' AND campaigns > 0 ORDER BY dimension, value").fetchall()
+        result = {dimension: {} for dimension in ROLLUP_DIMENSIONS}
+        for row in rows:
+            result[row["dimension"]][row["value"]] = {measure: row[measure] for measure in ROLLUP_MEASURES}
+        return result
+
+    def revision(self) -> int:
+        """最近一次增删改后的版本号（没有记录过变化时为 0）"""
+        with self._connection() as conn:
+            return conn.execute("SELECT COALESCE(MAX(revision), 0) FROM campaign_versions").fetchone()[0]
+
+    def changes(self, since: Optional[int] = None) -> Tuple[int, List[Dict[str, Any]], List[int]]:
+        """
+        (当前版本号, since 之后新建或修改的广告计划, since 之后删除的 id)；
+        since=None 时给出全部广告计划。三者取自同一个读快照
+        """
+        with self._connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                revision = conn.execute("SELECT COALESCE(MAX(revision), 0) FROM campaign_versions").fetchone()[0]
+                if since is None:
+                    return revision, [dict(row) for row in conn.execute(f"{_SELECT} ORDER BY id")], []
+                changed = conn.execute("SELECT campaign_id, deleted FROM campaign_versions WHERE revision > ?",
+                                       (since,)).fetchall()
+                deleted = [row[0] for row in changed if row[1]]
+                rows = conn.execute(f"{_SELECT} WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id",
+                                    (json.dumps([row[0] for row in changed if not row[1]]),)).fetchall()
+                return revision, [dict(row) for row in rows], deleted
+            finally:
+                conn.execute("COMMIT")
+
+    def bids(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按 id 升序的 (id 数组, bid 数组)，供批量出价按 searchsorted 查找；
+        按版本号缓存，没有增删改（任何 worker）时不重读
+        """
+        revision = self.revision()
+        cached = self._bids
+        if cached is not None and cached[0] == revision:
+            return cached[1], cached[2]
+        # 先读版本号再读行：期间的写入最多让下次多读一次
+        with self._connection() as conn:
+            rows = conn.execute("SELECT id, bid FROM campaigns ORDER BY id").fetchall()
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        bids = np.array([row[1] for row in rows], dtype=np.float64)
+        self._bids = (revision, ids, bids)
+        return ids, bids
+
+    # ---------- 写 ----------
+
+    def create(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """新建广告计划（忽略 record 中的 id），返回含新 id 的完整记录"""
+        with self._transaction() as conn:
+            return dict(conn.execute(_INSERT, self._values(record)[1:]).fetchone())
+
+    def update(self, campaign_id: int, fields: Dict[str, Any], updated_at: str) -> Optional[Dict[str, Any]]:
+        """修改 UPDATABLE 中的字段；广告计划不存在时返回 None"""
+        columns = [column for column in UPDATABLE if column in fields]
+        assignments = ", ".join(f"{column} = ?" for column in [*columns, "updated_at"])
+        with self._transaction() as conn:
+            row = conn.execute(
+                f"UPDATE campaigns SET {assignments} WHERE id = ? RETURNING {', '.join(COLUMNS)}",
+                (*(fields[column] for column in columns), updated_at, campaign_id),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def toggle_status(self, campaign_id: int, updated_at: str) -> Optional[Dict[str, Any]]:
+        """paused <-> active（其他状态切换为 paused）；广告计划不存在时返回 None"""
+        with self._transaction() as conn:
+            row = conn.execute(_TOGGLE, (updated_at, campaign_id)).fetchone()
+        return dict(row) if row is not None else None
+
+    def delete(self, campaign_id: int) -> bool:
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM campaigns WHERE id = ?", (campaign_id,)).rowcount > 0
+
+    def upsert_many(self, records: Iterable[Dict[str, Any]]) -> int:
+        """批量写入（按 id 覆盖），一个事务"""
+        values = [self._values(record) for record in records]
+        with self._transaction() as conn:
+            conn.executemany(_UPSERT, values)
+        return len(values)
+
+    def apply_deltas(self, campaign_ids: Sequence[int], deltas: Dict[str, Sequence[float]],
+                     updated_at: str) -> int:
+        """
+        按广告计划累加 DELTA_COLUMNS 的增量（缺失的列记 0）并重算 RATIOS，一个事务；
+        返回实际更新的广告计划数（不存在的 id 跳过）
+        """
+        columns = {column: np.asarray(deltas[column], dtype=np.float64).tolist() if column in deltas
+                   else [0.0] * len(campaign_ids) for column in DELTA_COLUMNS}
+        params = [{"id": campaign_id, "updated_at": updated_at, **dict(zip(DELTA_COLUMNS, row))}
+                  for campaign_id, *row in zip(np.asarray(campaign_ids).tolist(), *columns.values())]
+        with self._transaction() as conn:
+            return conn.executemany(_APPLY, params).rowcount
+
+    @staticmethod
+    def encode_cursor(record: Dict[str, Any], sort: str, descending: bool) -> str:
+        """一页最后一行 -> 不透明游标"""
+        payload = json.dumps([sort, descending, record[sort], record["id"]], separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str, sort: str, descending: bool) -> Tuple[Any, int]:
+        """游标 -> list() 的 after；游标无效或与排序方式不一致时 ValueError"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            cursor_sort, cursor_descending, value, campaign_id = json.loads(base64.urlsafe_b64decode(padded))
+        except (ValueError, TypeError) as e:
+            raise ValueError("无效的游标") from e
+        if cursor_sort != sort or cursor_descending != descending:
+            raise ValueError("游标与当前排序方式不一致")
+        return value, int(campaign_id)
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多广告主竞争竞价模拟
+====================
+PeriodSimulator 中每个广告主单独与固定的 leastWinningCost 比较，广告主之间互不影响。
+CompetitiveSimulator 让同一 period 的全部广告主竞争同一批曝光：
+
+- 曝光对齐：有 pvIndex 列时按 (timeStepIndex, pvIndex) 对齐；否则同一时间步内
+  各广告主按到达顺序的第 k 条流量视为同一次曝光。每个 (曝光, 广告主) 至多一行
+- 每批曝光的出价组成 (轨迹数, 曝光数, 广告主数) 矩阵，用 argpartition 取出前
+  slots 名胜出；广义第二价格：第 i 名支付第 i+1 名的出价
+- reserve=True 时曝光的 leastWinningCost（该曝光各行的最小值）作为外部竞争底价：
+  出价低于底价不能胜出，支付价格不低于底价
+- 剩余预算为 0 的广告主不再出价；预算按 budget_mode 共同扣减，substeps > 1 时
+  每片曝光结算后更新，预算耗尽的广告主在下一片退出竞争
+
+只有一个广告主且 slots=1 时与 PeriodSimulator 的结果一致。检查点、续跑与出价策略
+接口均与 PeriodSimulator 相同。
+
+用法:
+    python competitive.py --data data/traffic/period-7.csv --slots 3
+    python competitive.py --strategy onlineLp:cpa_cap=2.0 --replicates 20 --substeps 4
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Union
+
+from alpha_index import AlphaIndex
+from batch_simulator import PeriodSimulator
+from head_to_head import parse_strategy_spec
+from strategies import available_strategies, create_strategy
+from traffic_store import TRAFFIC_COLUMNS, CsvPeriodReader, open_period, resolve_data_path
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, "saved_model/onlineLpTest/period.csv")
+
+IMPRESSION_COLUMN = "pvIndex"
+
+
+def load_competitive_traffic(data_path: str) -> pd.DataFrame:
+    """读取一个 period；原始文件带 pvIndex 时一并读取（列式分区不保存 pvIndex）"""
+    header = pd.read_csv(resolve_data_path(data_path), nrows=0).columns
+    if IMPRESSION_COLUMN in header:
+        return CsvPeriodReader(data_path).load(columns=TRAFFIC_COLUMNS + [IMPRESSION_COLUMN])
+    return open_period(data_path).load()
+
+
+class CompetitiveSimulator(PeriodSimulator):
+    """全部广告主在共享曝光上竞价的整期模拟"""
+
+    def __init__(self, traffic: Union[str, pd.DataFrame], model: Union[str, AlphaIndex],
+                 total_steps: int = 48, seed: Optional[int] = None,
+                 budget_mode: str = "proportional", substeps: int = 1,
+                 slots: int = 1, reserve: bool = True):
+        if slots < 1:
+            raise ValueError("slots 必须 >= 1")
+        self.slots = slots
+        self.reserve = reserve
+        super().__init__(traffic, model, total_steps, seed, budget_mode, substeps)
+
+    def _prepare(self, traffic: Union[str, pd.DataFrame]):
+        """在基类分组的基础上给每行编曝光号，并按 (时间步, 曝光, 广告主) 重新排列"""
+        if isinstance(traffic, str):
+            traffic = load_competitive_traffic(traffic)
+        super()._prepare(traffic)
+
+        # 与基类相同的 (时间步, 广告主) 稳定排序，用于对齐 pvIndex
+        adv_index = np.searchsorted(self.advertisers["advertiser_number"].to_numpy(),
+                                    traffic["advertiserNumber"].to_numpy())
+        steps = traffic["timeStepIndex"].to_numpy()
+        order = np.lexsort((adv_index, steps))
+        steps = steps[order]
+        n_rows = len(steps)
+
+        if IMPRESSION_COLUMN in traffic.columns:
+            impressions = traffic[IMPRESSION_COLUMN].to_numpy()[order]
+        else:
+            # (时间步, 广告主) 段内的到达序号
+            is_start = np.ones(n_rows, dtype=bool)
+            is_start[1:] = (steps[1:] != steps[:-1]) | (self.adv_index[1:] != self.adv_index[:-1])
+            impressions = np.arange(n_rows) - np.maximum.accumulate(np.where(is_start, np.arange(n_rows), 0))
+
+        regroup = np.lexsort((self.adv_index, impressions, steps))
+        self.adv_index = self.adv_index[regroup]
+        self.p_values = self.p_values[regroup]
+        self.least_winning_costs = self.least_winning_costs[regroup]
+        steps = steps[regroup]
+        impressions = impressions[regroup]
+
+        # 全局连续的曝光编号，同一时间步内递增
+        is_new = np.ones(n_rows, dtype=bool)
+        is_new[1:] = (steps[1:] != steps[:-1]) | (impressions[1:] != impressions[:-1])
+        self.impression_index = np.cumsum(is_new) - 1
+        self.n_impressions = int(is_new.sum())
+
+    def _iter_steps(self, first_step: int):
+        """基类的逐步流量之外再给出每行的曝光编号；行按 (曝光, 广告主) 排列"""
+        for time_step, step in super()._iter_steps(first_step):
+            start = self.step_offsets[time_step]
+            step["impression"] = self.impression_index[start:start + len(step["adv"])]
+            yield time_step, step
+
+    def _slice_ids(self, step: Dict[str, np.ndarray]) -> np.ndarray:
+        """按曝光把本步均分为 substeps 片，同一曝光的全部出价总在同一片"""
+        impressions = step["impression"] - step["impression"][0]
+        return impressions * self.substeps // (impressions[-1] + 1)
+
+    def _auction(self, rows: Dict[str, np.ndarray], bids: np.ndarray, remaining_budget: np.ndarray):
+        """在 (轨迹, 曝光, 广告主) 出价矩阵上按曝光决出前 slots 名，返回每行的胜出与支付价格"""
+        adv = rows["adv"]
+        impressions = rows["impression"] - rows["impression"][0]
+        n_lanes = bids.shape[0]
+        n_imp = impressions[-1] + 1
+        n_adv = self.n_advertisers
+
+        # 未参与该曝光或预算耗尽的广告主记为 -1（出价均 >= 0）
+        matrix = np.full((n_lanes, n_imp, n_adv), -1.0)
+        matrix[:, impressions, adv] = np.where(remaining_budget[:, adv] > 0, bids, -1.0)
+
+        if self.reserve:
+            first_rows = np.flatnonzero(np.diff(impressions, prepend=-1))
+            floor = np.minimum.reduceat(rows["least_winning_costs"], first_rows)
+        else:
+            floor = np.zeros(n_imp)
+
+        # 前 slots + 1 名（多出的一名用于定价），按出价降序排列
+        n_ranked = min(self.slots + 1, n_adv)
+        if n_ranked < n_adv:
+            ranked = np.argpartition(-matrix, n_ranked - 1, axis=2)[:, :, :n_ranked]
+        else:
+            ranked = np.broadcast_to(np.arange(n_adv), matrix.shape)
+        ranked_bids = np.take_along_axis(matrix, ranked, axis=2)
+        by_bid = np.argsort(-ranked_bids, axis=2, kind="stable")
+        ranked = np.take_along_axis(ranked, by_bid, axis=2)
+        ranked_bids = np.take_along_axis(ranked_bids, by_bid, axis=2)
+
+        n_winners = min(self.slots, n_adv)
+        winners = ranked[:, :, :n_winners]
+        winner_bids = ranked_bids[:, :, :n_winners]
+        next_bids = np.zeros_like(winner_bids)
+        next_bids[:, :, :n_ranked - 1] = np.maximum(ranked_bids[:, :, 1:n_ranked], 0.0)
+        prices = np.maximum(next_bids, floor[None, :, None])
+        won = (winner_bids >= 0) & (winner_bids >= floor[None, :, None])
+
+        # 回填到每一行
+        lanes = np.arange(n_lanes)[:, None, None]
+        slots = np.arange(n_imp)[None, :, None]
+        win_matrix = np.zeros(matrix.shape, dtype=bool)
+        win_matrix[lanes, slots, winners] = won
+        price_matrix = np.zeros(matrix.shape)
+        price_matrix[lanes, slots, winners] = np.where(won, prices, 0.0)
+        return win_matrix[:, impressions, adv], price_matrix[:, impressions, adv]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多广告主竞争竞价模拟")
+    parser.add_argument("--data", default=os.path.join(BASE_DIR, "data/traffic/period-7.csv"))
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--strategy", default="onlineLp",
+                        help=f"策略名[:参数=值,...]，可选: {', '.join(available_strategies())}")
+    parser.add_argument("--slots", type=int, default=1, help="每次曝光的广告位数")
+    parser.add_argument("--no-reserve", action="store_true", help="忽略 leastWinningCost 底价")
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--budget-mode", choices=PeriodSimulator.BUDGET_MODES, default="proportional")
+    parser.add_argument("--substeps", type=int, default=1)
+    parser.add_argument("--output", default=None, help="汇总结果 CSV 输出路径")
+    args = parser.parse_args()
+
+    alpha_index = AlphaIndex.from_csv(args.model)
+    traffic = load_competitive_traffic(args.data)
+    name, params = parse_strategy_spec(args.strategy)
+    strategy = create_strategy(name, alpha_index, **params)
+
+    isolated = PeriodSimulator(traffic, alpha_index, seed=args.seed,
+                               budget_mode=args.budget_mode, substeps=args.substeps)
+    competitive = CompetitiveSimulator(traffic, alpha_index, seed=args.seed, budget_mode=args.budget_mode,
+                                       substeps=args.substeps, slots=args.slots, reserve=not args.no_reserve)
+    isolated_summary = isolated.run(n_replicates=args.replicates, strategy=strategy).summary()
+    summary = competitive.run(n_replicates=args.replicates, strategy=strategy).summary()
+    summary["isolated_score"] = isolated_summary["score"]
+    print(summary.to_string(index=False))
+    print(f"\n广告主数: {competitive.n_advertisers}  曝光数: {competitive.n_impressions}  "
+          f"竞争总得分: {summary['score'].sum():.2f}  独立回放总得分: {isolated_summary['score'].sum():.2f}")
+
+    if args.output:
+        summary.to_csv(args.output, index=False)
+        print(f"✓ 已保存至: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+智能诊断规则引擎 (/api/diagnosis)
+================================
+诊断规则在广告计划的列上向量化求值，结果按广告计划缓存，只重算变化过的计划：
+
+    engine = DiagnosisEngine(campaign_store)
+    etag, body = engine.current()    # body 为按优先级排好序的 JSON 字节
+
+- 每条规则给出 matches(columns) -> 布尔数组（一次判断一批计划），命中的计划才格式化文案
+- campaign_store 的版本表由触发器随任何增删改（接口 CRUD、事件写入、批量导入，任何 worker）
+  记录变化的计划；current() 先读当前版本号（一次索引查询），未变化时直接返回缓存，
+  变化时只取出该版本之后变化的计划重新求值
+- 每个诊断项在求值时序列化一次；结果按 (优先级, 计划 id, 规则顺序) 排序后拼接，
+  ETag 是结果内容的哈希，内容相同的结果在各 worker 上 ETag 相同
+- 每次请求的开销与规则数、计划数无关；新增规则只增加变化计划重算时的一次数组判断
+
+新增规则：继承 DiagnosisRule 并用 @register_rule 注册，注册顺序即同优先级内的顺序。
+"""
+
+import json
+import hashlib
+import threading
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+# 规则用到的列，求值时转为数组
+RULE_COLUMNS = ("status", "learning_stage", "spend", "budget", "ctr", "roi")
+
+
+class DiagnosisRule:
+    """诊断规则基类"""
+
+    name: str = ""
+    type: str = "warning"  # warning, opportunity, success
+    priority: int = 1
+    action: str = ""
+
+    def matches(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """columns 为 RULE_COLUMNS 的等长数组，返回命中的布尔数组"""
+        raise NotImplementedError
+
+    def title(self, campaign: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def description(self, campaign: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def item(self, campaign: Dict[str, Any]) -> Dict[str, Any]:
+        """与 api.DiagnosticItem 字段相同的 dict"""
+        return {"type": self.type, "title": self.title(campaign), "description": self.description(campaign),
+                "action": self.action, "priority": self.priority}
+
+
+RULE_REGISTRY: Dict[str, DiagnosisRule] = {}
+
+
+def register_rule(cls):
+    """类装饰器：注册规则实例"""
+    RULE_REGISTRY[cls.name] = cls()
+    return cls
+
+
+@register_rule
+class LearningFailedRule(DiagnosisRule):
+    """冷启动学习失败"""
+
+    name = "learning_failed"
+    action = "一键优化设置"
+
+    def matches(self, columns):
+        return columns["learning_stage"] == "failed"
+
+    def title(self, campaign):
+        return f"计划 [{campaign['name'][:15]}...] 学习失败"
+
+    def description(self, campaign):
+        return f"该计划冷启动失败，当前 CTR {campaign['ctr']}% 低于行业均值。建议检查定向人群或提高出价。"
+
+
+@register_rule
+class LowRoiRule(DiagnosisRule):
+    """投放中且 ROI 低于盈亏线"""
+
+    name = "low_roi"
+    action = "暂停计划"
+
+    def matches(self, columns):
+        return (columns["roi"] < 1.0) & (columns["status"] == "active")
+
+    def title(self, campaign):
+        return f"计划 [{campaign['name'][:15]}...] ROI 低于盈亏线"
+
+    def description(self, campaign):
+        return f"当前 ROI 仅为 {campaign['roi']}，低于 1.0 盈亏平衡点。持续投放将造成亏损。"
+
+
+@register_rule
+class HighPotentialRule(DiagnosisRule):
+    """ROI 高但预算消耗不足一半"""
+
+    name = "high_potential"
+    type = "opportunity"
+    priority = 2
+    action = "提升出价 +15%"
+
+    def matches(self, columns):
+        return (columns["roi"] > 4.0) & (columns["spend"] < columns["budget"] * 0.5)
+
+    def title(self, campaign):
+        return f"高潜力计划 [{campaign['name'][:15]}...]"
+
+    def description(self, campaign):
+        return (f"该计划 ROI 达到 {campaign['roi']}，"
+                f"但预算消耗仅 {campaign['spend'] / campaign['budget'] * 100:.1f}%，存在起量空间。")
+
+
+# 没有任何规则命中时的结果
+ALL_CLEAR = {
+    "type": "success",
+    "title": "投放状态良好",
+    "description": "当前所有计划运行正常，暂无异常需要处理。",
+    "action": "查看详细报告",
+    "priority": 3,
+}
+
+
+def _encode(item: Dict[str, Any]) -> bytes:
+    return json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def evaluate(rules: List[DiagnosisRule], campaigns: List[Dict[str, Any]]) -> Dict[int, List[Tuple[Tuple, bytes]]]:
+    """
+    对一批广告计划求值全部规则，返回 {计划 id: [(排序键, 诊断项 JSON), ...]}（只含有命中的计划），
+    排序键为 (优先级, 计划 id, 规则下标)
+    """
+    findings: Dict[int, List[Tuple[Tuple, bytes]]] = {}
+    if not campaigns:
+        return findings
+    columns = {column: np.array([campaign[column] for campaign in campaigns]) for column in RULE_COLUMNS}
+    for index, rule in enumerate(rules):
+        for row in np.flatnonzero(rule.matches(columns)).tolist():
+            campaign = campaigns[row]
+            findings.setdefault(campaign["id"], []).append(
+                ((rule.priority, campaign["id"], index), _encode(rule.item(campaign))))
+    return findings
+
+
+class DiagnosisEngine:
+    """按广告计划缓存诊断结果，随 campaign_store 的版本号增量更新"""
+
+    def __init__(self, campaign_store, rules: Optional[List[DiagnosisRule]] = None):
+        self.campaign_store = campaign_store
+        self.rules = list(RULE_REGISTRY.values()) if rules is None else list(rules)
+        self._findings: Dict[int, List[Tuple[Tuple, bytes]]] = {}
+        self._revision: Optional[int] = None
+        self._etag = ""
+        self._body = b""
+        self._lock = threading.Lock()
+
+    def current(self) -> Tuple[str, bytes]:
+        """(ETag, JSON 结果)；存储有变化时先增量更新"""
+        revision = self.campaign_store.revision()
+        with self._lock:
+            if self._revision is None or revision != self._revision:
+                self._refresh()
+            return self._etag, self._body
+
+    def _refresh(self):
+        """调用方持有锁"""
+        revision, campaigns, deleted = self.campaign_store.changes(self._revision)
+        if self._revision is None:
+            self._findings = {}
+        for campaign_id in [*deleted, *(campaign["id"] for campaign in campaigns)]:
+            self._findings.pop(campaign_id, None)
+        self._findings.update(evaluate(self.rules, campaigns))
+        self._revision = revision
+
+        ranked = sorted(entry for entries in self._findings.values() for entry in entries)
+        items = [item for _, item in ranked] if ranked else [_encode(ALL_CLEAR)]
+        self._body = b"[" + b",".join(items) + b"]"
+        self._etag = f'"{hashlib.sha1(self._body).hexdigest()}"'
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+投放事件写入
+============
+/api/events/ingest 接收曝光 / 点击 / 转化 / 消耗事件，事件不逐条写库：
+
+    ingestor = EventIngestor(campaign_store, metrics_store, flush_interval=1.0)
+    await ingestor.start()
+    ingestor.submit(batch)      # 请求处理中调用：只入队，立即返回
+    await ingestor.stop()       # 写出队列中剩余的事件
+
+- 请求解析出的列式批次（campaign_id / type / value / timestamp 数组）放入 asyncio 队列
+- 写入任务每 flush_interval 秒取出队列中全部批次，拼接后按广告计划 np.unique + bincount
+  汇总为每个计划一行增量，在线程池中以一个事务写入 campaign_store（累加计数并重算
+  ctr / cvr / cpa / roi），同时按事件时间计入 metrics_store 的时序
+- 一次写事务只更新有事件的广告计划各一行，与事件数无关；WAL 下读请求不受写入阻塞
+- 待写事件数超过 max_pending 时 submit 抛出 IngestQueueFull（接口返回 503），不无限堆积
+- 写库失败的批次保留到下一次写入重试；写库已提交后计入时序失败的批次不重试（重试会重复累加计数），
+  只计入 failed_metrics
+- stats() 给出队列深度、累计事件数与写入耗时
+
+事件类型与 value 的含义见 EVENT_TYPES。多 worker 部署时每个 worker 各有一个队列与写入任务，
+增量是可累加的，各 worker 写同一个数据库文件互不覆盖。
+
+环境变量:
+    GROWENGINE_INGEST_FLUSH_INTERVAL  写入间隔（秒），默认 1
+    GROWENGINE_INGEST_MAX_PENDING     每个 worker 待写事件数上限，默认 2000000
+"""
+
+import os
+import time
+import asyncio
+import numpy as np
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+DEFAULT_FLUSH_INTERVAL = float(os.environ.get("GROWENGINE_INGEST_FLUSH_INTERVAL", "1"))
+DEFAULT_MAX_PENDING = int(os.environ.get("GROWENGINE_INGEST_MAX_PENDING", "2000000"))
+
+# 事件类型（下标即类型编码）：
+#   impression  一次曝光
+#   click       一次点击
+#   conversion  一次转化，value 为成交金额 (GMV)，可为 0
+#   cost        一笔消耗，value 为金额
+EVENT_TYPES = ("impression", "click", "conversion", "cost")
+IMPRESSION, CLICK, CONVERSION, COST = range(len(EVENT_TYPES))
+
+BATCH_COLUMNS = ("campaign_id", "type", "value", "timestamp")
+
+
+class IngestQueueFull(Exception):
+    """待写事件过多"""
+
+
+def event_batch(campaign_ids: Sequence[int], types: Sequence[str], values: Optional[Sequence[float]] = None,
+                timestamps: Optional[Sequence[Optional[float]]] = None) -> Dict[str, np.ndarray]:
+    """
+    等长的列 -> 校验后的列式批次；types 为 EVENT_TYPES 中的名称，
+    values 缺省为 0，timestamps（Unix 秒）缺省或为空的行取当前时间
+    """
+    campaign_ids = np.asarray(campaign_ids, dtype=np.int64)
+    names = np.asarray(types, dtype=str)
+    n = len(campaign_ids)
+    codes = np.full(n, -1, dtype=np.int8)
+    for code, name in enumerate(EVENT_TYPES):
+        codes[names == name] = code
+    values = np.zeros(n) if values is None else np.asarray(values, dtype=np.float64)
+    if timestamps is None:
+        timestamps = np.full(n, time.time())
+    else:
+        timestamps = np.asarray([np.nan if t is None else t for t in timestamps], dtype=np.float64)
+        timestamps[np.isnan(timestamps)] = time.time()
+
+    if campaign_ids.ndim != 1 or not (names.shape == values.shape == timestamps.shape == (n,)):
+        raise ValueError("campaign_id、type、value、timestamp 必须是等长的一维数组")
+    unknown = np.unique(names[codes < 0])
+    if len(unknown):
+        raise ValueError(f"未知事件类型: {', '.join(unknown[:5].tolist())}（可选 {', '.join(EVENT_TYPES)}）")
+    if not (np.isfinite(values).all() and np.isfinite(timestamps).all()):
+        raise ValueError("value 与 timestamp 必须是有限数")
+    if (values < 0).any():
+        raise ValueError("value 不能为负")
+    return {"campaign_id": campaign_ids, "type": codes, "value": values, "timestamp": timestamps}
+
+
+def aggregate(batch: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    列式事件 -> 按广告计划汇总的增量：
+    campaign_id（升序去重）与 spend / impressions / clicks / conversions / gmv 等长数组
+    """
+    campaign_ids, rows = np.unique(batch["campaign_id"], return_inverse=True)
+    types, values = batch["type"], batch["value"]
+    n = len(campaign_ids)
+    return {
+        "campaign_id": campaign_ids,
+        "spend": np.bincount(rows, weights=np.where(types == COST, values, 0.0), minlength=n),
+        "impressions": np.bincount(rows[types == IMPRESSION], minlength=n),
+        "clicks": np.bincount(rows[types == CLICK], minlength=n),
+        "conversions": np.bincount(rows[types == CONVERSION], minlength=n),
+        "gmv": np.bincount(rows, weights=np.where(types == CONVERSION, values, 0.0), minlength=n),
+    }
+
+
+class EventIngestor:
+    """asyncio 队列 + 定时批量写入"""
+
+    def __init__(self, campaign_store, metrics_store=None, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_pending: int = DEFAULT_MAX_PENDING):
+        self.campaign_store = campaign_store
+        self.metrics_store = metrics_store
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._queue: "asyncio.Queue[Dict[str, np.ndarray]]" = asyncio.Queue()
+        self._retry: List[Dict[str, np.ndarray]] = []
+        self._pending = 0
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.counters = {"accepted": 0, "rejected": 0, "written": 0, "unknown_campaign": 0,
+                         "flushes": 0, "failed_flushes": 0, "failed_metrics": 0}
+        self._latencies: List[float] = []
+        self._last_flush: Optional[Dict[str, Any]] = None
+        self._last_error: Optional[str] = None
+
+    # ---------- 生命周期 ----------
+
+    async def start(self):
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止定时写入并写出剩余事件"""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    # ---------- 入队 ----------
+
+    def submit(self, batch: Dict[str, np.ndarray]) -> int:
+        """放入一个 event_batch()，返回事件数；待写事件超过 max_pending 时 IngestQueueFull"""
+        n = len(batch["campaign_id"])
+        if self._pending + n > self.max_pending:
+            self.counters["rejected"] += n
+            raise IngestQueueFull(f"待写事件 {self._pending} 条，已达上限 {self.max_pending}")
+        self._queue.put_nowait(batch)
+        self._pending += n
+        self.counters["accepted"] += n
+        return n
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    # ---------- 写入 ----------
+
+    async def flush(self) -> int:
+        """写出当前排队的全部事件，返回写出的事件数"""
+        async with self._flush_lock or asyncio.Lock():
+            batches, self._retry = self._retry, []
+            while not self._queue.empty():
+                batches.append(self._queue.get_nowait())
+            if not batches:
+                return 0
+            n_events = sum(len(batch["campaign_id"]) for batch in batches)
+            started = time.perf_counter()
+            try:
+                written, unknown, campaigns, metrics_error = await asyncio.to_thread(self._write, batches)
+            except Exception as e:
+                self._retry = batches
+                self.counters["failed_flushes"] += 1
+                self._last_error = f"{type(e).__name__}: {e}"
+                return 0
+            latency = time.perf_counter() - started
+            if metrics_error is not None:
+                self.counters["failed_metrics"] += 1
+                self._last_error = metrics_error
+
+            self._pending -= n_events
+            self.counters["flushes"] += 1
+            self.counters["written"] += written
+            self.counters["unknown_campaign"] += unknown
+            self._latencies = (self._latencies + [latency])[-100:]
+            self._last_flush = {"at": datetime.now().isoformat(), "events": n_events,
+                                "campaigns": campaigns, "latency_ms": round(latency * 1000, 3)}
+            return n_events
+
+    def _write(self, batches: List[Dict[str, np.ndarray]]):
+        """
+        在线程池中执行：拼接、汇总、写库、计入时序；
+        返回 (写入事件数, 未知计划事件数, 更新计划数, 计入时序的错误或 None)，只有写库失败时抛出异常
+        """
+        batch = {column: np.concatenate([b[column] for b in batches]) for column in BATCH_COLUMNS}
+        # 不存在的广告计划的事件丢弃
+        known_ids, _ = self.campaign_store.bids()
+        known = np.isin(batch["campaign_id"], known_ids)
+        unknown = int(len(known) - known.sum())
+        if unknown:
+            batch = {column: values[known] for column, values in batch.items()}
+        if not len(batch["campaign_id"]):
+            return 0, unknown, 0, None
+
+        deltas = aggregate(batch)
+        campaigns = self.campaign_store.apply_deltas(deltas.pop("campaign_id"), deltas,
+                                                     datetime.now().isoformat())
+        metrics_error = None
+        if self.metrics_store is not None:
+            types, values = batch["type"], batch["value"]
+            try:
+                self.metrics_store.record(batch["timestamp"], {
+                    "spend": np.where(types == COST, values, 0.0),
+                    "gmv": np.where(types == CONVERSION, values, 0.0),
+                    "impressions": types == IMPRESSION,
+                    "clicks": types == CLICK,
+                    "conversions": types == CONVERSION,
+                }, campaign_ids=batch["campaign_id"])
+            except Exception as e:
+                # 计数已提交，不能让整批重试
+                metrics_error = f"{type(e).__name__}: {e}"
+        return len(batch["campaign_id"]), unknown, campaigns, metrics_error
+
+    # ---------- 状态 ----------
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = np.array(self._latencies) * 1000
+        return {
+            "queue_batches": self._queue.qsize() + len(self._retry),
+            "queue_events": self._pending,
+            "max_pending": self.max_pending,
+            "flush_interval": self.flush_interval,
+            **self.counters,
+            "last_flush": self._last_flush,
+            "flush_latency_ms": {
+                "avg": round(float(latencies.mean()), 3),
+                "p95": round(float(np.percentile(latencies, 95)), 3),
+                "max": round(float(latencies.max()), 3),
+            } if len(latencies) else None,
+            "last_error": self._last_error,
+        }
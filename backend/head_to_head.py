@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+出价策略对比 (common random numbers)
+====================================
+在同一份预加载的流量数组上依次回放多个出价策略，所有策略使用相同的 seed，
+因此每一步的转化随机数完全一致。策略间的差异按 (重复, 广告主) 成对比较，
+随机噪声在差值中相互抵消，达到同样显著性所需的重复次数更少。
+
+用法:
+    python head_to_head.py --strategies onlineLp fixedCpa budgetPacing:gain=2
+    python head_to_head.py --strategies onlineLp onlineLp:cpa_cap=2.0 --replicates 50
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+from alpha_index import AlphaIndex
+from batch_simulator import PeriodSimulator
+from strategies import BiddingStrategy, available_strategies, create_strategy
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, "saved_model/onlineLpTest/period.csv")
+
+
+def parse_strategy_spec(spec: str) -> Tuple[str, Dict[str, float]]:
+    """'budgetPacing:gain=2,high=1.8' -> ('budgetPacing', {'gain': 2.0, 'high': 1.8})"""
+    name, _, params = spec.partition(":")
+    kwargs = {}
+    for item in filter(None, params.split(",")):
+        key, _, value = item.partition("=")
+        kwargs[key.strip()] = float(value)
+    return name, kwargs
+
+
+def compare_strategies(simulator: PeriodSimulator, strategies: Dict[str, BiddingStrategy],
+                       n_replicates: int = 1, baseline: Optional[str] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    在同一个 PeriodSimulator 上回放全部策略
+
+    返回 (summary, paired)：
+    - summary: 每个策略的总得分、总转化、CPA 超约束数、预算使用率
+    - paired: 每个策略相对 baseline 的成对得分差（均值、标准误、t 值）
+    """
+    baseline = baseline or next(iter(strategies))
+    scores = {}
+    rows = []
+    cpa_constraints = simulator.advertisers["cpa_constraint"].to_numpy()
+    total_budget = simulator.advertisers["budget"].sum()
+
+    for name, strategy in strategies.items():
+        totals = simulator.run(n_replicates=n_replicates, strategy=strategy).lane_totals()
+        scores[name] = totals["score"]
+        rows.append({
+            "strategy": name,
+            "mean_total_score": totals["score"].sum(axis=1).mean(),
+            "mean_total_conversion": totals["total_conversion"].sum(axis=1).mean(),
+            "cpa_violations": (totals["real_cpa"] > cpa_constraints).sum(axis=1).mean(),
+            "budget_utilization": totals["total_cost"].sum(axis=1).mean() / total_budget,
+        })
+    summary = pd.DataFrame(rows).sort_values("mean_total_score", ascending=False).reset_index(drop=True)
+
+    paired_rows = []
+    for name in strategies:
+        if name == baseline:
+            continue
+        diff = (scores[name] - scores[baseline]).ravel()
+        std_err = diff.std(ddof=1) / np.sqrt(len(diff)) if len(diff) > 1 else np.nan
+        paired_rows.append({
+            "strategy": name,
+            "baseline": baseline,
+            "pairs": len(diff),
+            "mean_diff": diff.mean(),
+            "std_err": std_err,
+            "t_stat": diff.mean() / std_err if std_err and std_err > 0 else np.nan,
+        })
+    return summary, pd.DataFrame(paired_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="出价策略对比")
+    parser.add_argument("--data", default=os.path.join(BASE_DIR, "data/traffic/period-7.csv"))
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--strategies", nargs="+", default=["onlineLp", "fixedCpa"],
+                        help=f"策略名[:参数=值,...]，可选: {', '.join(available_strategies())}")
+    parser.add_argument("--replicates", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--budget-mode", choices=PeriodSimulator.BUDGET_MODES, default="proportional")
+    parser.add_argument("--substeps", type=int, default=1)
+    args = parser.parse_args()
+
+    alpha_index = AlphaIndex.from_csv(args.model)
+    simulator = PeriodSimulator(args.data, alpha_index, seed=args.seed,
+                                budget_mode=args.budget_mode, substeps=args.substeps)
+    strategies = {}
+    for spec in args.strategies:
+        name, params = parse_strategy_spec(spec)
+        strategies[spec] = create_strategy(name, alpha_index, **params)
+
+    summary, paired = compare_strategies(simulator, strategies, n_replicates=args.replicates)
+    print(f"广告主数: {simulator.n_advertisers}  重复次数: {args.replicates}\n")
+    print(summary.to_string(index=False))
+    if not paired.empty:
+        print("\n成对比较:")
+        print(paired.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
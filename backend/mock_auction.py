@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+合成流量竞价模拟 (/api/bidding/simulate)
+========================================
+按广告计划的预算与出价生成合成流量并模拟竞价，规则与原先的逐曝光循环相同：
+
+- alpha = bid × (1 + 0.3·sin(2π·进度) + U(-0.1, 0.1))
+- 每步流量数：早高峰(8-10点)、晚高峰(19-22点) 150~300，其余 50~120（可按 traffic_scale 放大）
+- 每条流量 pValue ~ U(0.001, 0.08)，出价 = alpha × pValue，
+  市场价 ~ U(0.5, 出价 × 1.3)，出价 >= 市场价即胜出，按市场价扣费
+- 预算控制：步内按到达顺序累计胜出花费，累计超出剩余预算后的流量不再计入
+- 胜出流量以 pValue 为概率转化
+
+全部随机数按块一次性生成为数组；跨步只有剩余预算是串行的：预算足够的连续多步
+整段计入，预算截断的步用累计和上的 searchsorted 求出截断位置。
+
+iter_mock_auction 按块依次给出结果，供流式输出使用。pValue、市场价与转化各用独立的
+随机数流，结果与分块大小无关：seed 相同时整体模拟与流式模拟逐步一致。
+"""
+
+import numpy as np
+from typing import Dict, Iterator, Optional
+
+# 模拟规则或随机数用法改变时递增：缓存的结果（simulation_cache）随之失效
+ENGINE_VERSION = 2
+
+# 每块最多生成的流量行数，限制大 steps / traffic_scale 下的内存
+CHUNK_ROWS = 1 << 20
+
+STEP_COLUMNS = ("alpha", "traffic", "wins", "cost", "conversions", "remaining_budget")
+
+
+def simulate_mock_auction(budget: float, base_alpha: float, steps: int = 48,
+                          seed: Optional[int] = None, traffic_scale: float = 1.0) -> Dict[str, np.ndarray]:
+    """
+    模拟 steps 个时间步，返回逐步列：alpha, traffic, wins, cost, conversions, remaining_budget
+    """
+    chunks = list(iter_mock_auction(budget, base_alpha, steps, seed, traffic_scale))
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in STEP_COLUMNS}
+
+
+def iter_mock_auction(budget: float, base_alpha: float, steps: int = 48, seed: Optional[int] = None,
+                      traffic_scale: float = 1.0, chunk_rows: int = CHUNK_ROWS) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    按块模拟：每块覆盖连续若干时间步（流量行数不超过 chunk_rows，至少一步），
+    给出与 simulate_mock_auction 相同的逐步列，另加 "step"（时间步编号）
+    """
+    step_rng, p_rng, price_rng, conversion_rng = (
+        np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(4)
+    )
+
+    # 逐步参数：alpha 曲线与流量数
+    progress = np.arange(steps) / steps
+    alpha = base_alpha * (1.0 + 0.3 * np.sin(progress * np.pi * 2) + step_rng.uniform(-0.1, 0.1, steps))
+    hour_equiv = progress * 24
+    is_peak = ((hour_equiv >= 8) & (hour_equiv <= 10)) | ((hour_equiv >= 19) & (hour_equiv <= 22))
+    traffic = np.where(is_peak, step_rng.integers(150, 301, steps), step_rng.integers(50, 121, steps))
+    if traffic_scale != 1.0:
+        traffic = np.maximum(np.rint(traffic * traffic_scale), 1).astype(np.int64)
+
+    remaining = float(budget)
+
+    # 按流量行数分块，块内一次生成全部随机数
+    offsets = np.concatenate([[0], np.cumsum(traffic)])
+    chunk_start = 0
+    while chunk_start < steps:
+        chunk_end = max(int(np.searchsorted(offsets, offsets[chunk_start] + chunk_rows, side="right")) - 1,
+                        chunk_start + 1)
+        rows = offsets[chunk_start:chunk_end + 1] - offsets[chunk_start]
+        n_rows = int(rows[-1])
+
+        p_values = p_rng.uniform(0.001, 0.08, n_rows)
+        bids = np.repeat(alpha[chunk_start:chunk_end], traffic[chunk_start:chunk_end]) * p_values
+        # random.uniform(a, b) = a + (b - a) * U，b < a 时同样成立
+        market_prices = 0.5 + (bids * 1.3 - 0.5) * price_rng.random(n_rows)
+        is_win = bids >= market_prices
+        is_conversion = is_win & (conversion_rng.random(n_rows) < p_values)
+
+        # 块内累计和（首位补 0），任意一段流量的累计 = 差分
+        cum_cost = np.concatenate([[0.0], np.cumsum(np.where(is_win, market_prices, 0.0))])
+        cum_wins = np.concatenate([[0], np.cumsum(is_win)])
+        cum_conversions = np.concatenate([[0], np.cumsum(is_conversion)])
+        step_cum_cost = cum_cost[rows]
+
+        # 每步第一笔胜出的花费（无胜出为 inf）：剩余预算低于它时该步什么也买不到
+        n_chunk = chunk_end - chunk_start
+        win_rows = np.flatnonzero(is_win)
+        first_win = np.minimum(np.searchsorted(win_rows, rows[:-1]), max(len(win_rows) - 1, 0))
+        first_cost = np.full(n_chunk, np.inf)
+        if len(win_rows):
+            has_win = win_rows[first_win] < rows[1:]
+            first_cost[has_win] = market_prices[win_rows[first_win[has_win]]]
+
+        # 预算充足的连续若干步整段计入；只在预算截断的步上做步内截断，
+        # 之后跳到第一笔胜出仍买得起的步。循环次数 = 截断的步数
+        spent_before = float(budget) - remaining
+        accepted_end = rows[1:].copy()
+        t = 0
+        while t < n_chunk:
+            base = step_cum_cost[t]
+            k = t + int(np.searchsorted(step_cum_cost[t + 1:], base + remaining, side="right"))
+            remaining -= step_cum_cost[k] - base
+            if k == n_chunk:
+                break
+            # 第 k 步：步内累计花费不超过剩余预算的前缀
+            start, end = rows[k], rows[k + 1]
+            cutoff = start + int(np.searchsorted(cum_cost[start + 1:end + 1], cum_cost[start] + remaining,
+                                                 side="right"))
+            accepted_end[k] = cutoff
+            remaining = max(remaining - (cum_cost[cutoff] - cum_cost[start]), 0.0)
+            affordable = np.flatnonzero(first_cost[k + 1:] <= remaining)
+            t = k + 1 + (int(affordable[0]) if len(affordable) else n_chunk - k - 1)
+            accepted_end[k + 1:t] = rows[k + 1:t]
+
+        chunk_steps = slice(chunk_start, chunk_end)
+        cost = cum_cost[accepted_end] - cum_cost[rows[:-1]]
+        yield {
+            "step": np.arange(chunk_start, chunk_end),
+            "alpha": alpha[chunk_steps],
+            "traffic": traffic[chunk_steps],
+            "wins": cum_wins[accepted_end] - cum_wins[rows[:-1]],
+            "cost": cost,
+            "conversions": cum_conversions[accepted_end] - cum_conversions[rows[:-1]],
+            "remaining_budget": np.maximum(budget - spent_before - np.cumsum(cost), 0.0),
+        }
+        chunk_start = chunk_end
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+OnlineLp 模型构建
+=================
+直接从流量文件计算 simulator.py 使用的 saved_model/onlineLpTest/period.csv：
+
+    realCPA  = round(leastWinningCost / (pValue + 1e-4), 2)
+    对每个时间步 t、每个行业：取 timeStepIndex >= t 的剩余流量，按 realCPA 升序
+    累加 leastWinningCost 得到 cum_cost
+
+构建分两层：
+1. 每个 period 流式扫描一次（CSV 分块或列式分区），聚合为
+   (行业, 时间步, realCPA) -> 消耗 的部分结果，保存到 partials/<period>.csv
+2. 合并全部部分结果（按 period 数取平均，cum_cost 表示一天的流量），
+   用向量化的反向累加 + 分组累加生成模型表
+
+新到的 period 只需要扫描它自己，已有 period 的部分结果直接复用。
+
+用法:
+    python model_builder.py                         # 增量构建 data/traffic 下全部 period
+    python model_builder.py --periods period-7      # 只使用指定 period
+    python model_builder.py --rebuild               # 忽略已有部分结果，全部重算
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+from traffic_store import (
+    CSV_DTYPES, DEFAULT_STORE_DIR, DEFAULT_TRAFFIC_DIR, TOTAL_STEPS,
+    StorePeriodReader, find_period_files, open_period, resolve_data_path,
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_DIR = os.path.join(BASE_DIR, "saved_model/onlineLpTest")
+MODEL_FILE = "period.csv"
+PARTIALS_DIR = "partials"
+MANIFEST_FILE = "manifest.json"
+
+GROUP_KEYS = ["advertiserCategoryIndex", "timeStepIndex", "realCPA"]
+
+
+def _aggregate_chunk(categories, steps, p_values, least_winning_costs, cpa_decimals: int) -> pd.DataFrame:
+    """单个数据块 -> (行业, 时间步, realCPA) 消耗"""
+    valid = (p_values > 0) & (least_winning_costs > 0)
+    real_cpa = np.round(least_winning_costs[valid].astype(np.float64) / (p_values[valid] + 1e-4), cpa_decimals)
+    frame = pd.DataFrame({
+        "advertiserCategoryIndex": categories[valid],
+        "timeStepIndex": steps[valid],
+        "realCPA": real_cpa,
+        "cost": least_winning_costs[valid].astype(np.float64),
+    })
+    return frame.groupby(GROUP_KEYS, sort=False, as_index=False)["cost"].sum()
+
+
+def _reduce(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    return pd.concat(parts, ignore_index=True).groupby(GROUP_KEYS, sort=False, as_index=False)["cost"].sum()
+
+
+def aggregate_period(data_path: str, store_dir: str = DEFAULT_STORE_DIR, chunksize: int = 1_000_000,
+                     cpa_decimals: int = 2, reduce_every: int = 8) -> pd.DataFrame:
+    """流式扫描一个 period，内存只保留当前数据块和已聚合的部分结果"""
+    reader = open_period(data_path, store_dir)
+    parts: List[pd.DataFrame] = []
+
+    if isinstance(reader, StorePeriodReader):
+        # 列式分区：按广告主分区读取，行业来自分区表
+        for adv in reader.meta["advertisers"]:
+            for start in range(adv["start"], adv["end"], chunksize):
+                end = min(start + chunksize, adv["end"])
+                parts.append(_aggregate_chunk(
+                    np.full(end - start, adv["category"], dtype=np.int16),
+                    np.asarray(reader.column("timeStepIndex")[start:end]),
+                    np.asarray(reader.column("pValue")[start:end]),
+                    np.asarray(reader.column("leastWinningCost")[start:end]),
+                    cpa_decimals,
+                ))
+                if len(parts) >= reduce_every:
+                    parts = [_reduce(parts)]
+    else:
+        usecols = ["advertiserCategoryIndex", "timeStepIndex", "pValue", "leastWinningCost"]
+        dtypes = {column: CSV_DTYPES[column] for column in usecols}
+        for chunk in pd.read_csv(reader.source, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+            parts.append(_aggregate_chunk(
+                chunk["advertiserCategoryIndex"].to_numpy(),
+                chunk["timeStepIndex"].to_numpy(),
+                chunk["pValue"].to_numpy(),
+                chunk["leastWinningCost"].to_numpy(),
+                cpa_decimals,
+            ))
+            if len(parts) >= reduce_every:
+                parts = [_reduce(parts)]
+
+    if not parts:
+        return pd.DataFrame(columns=GROUP_KEYS + ["cost"])
+    return _reduce(parts)
+
+
+def build_model_table(partials: List[pd.DataFrame], total_steps: int = TOTAL_STEPS) -> pd.DataFrame:
+    """
+    合并各 period 的部分结果，生成模型表
+
+    部分结果按 (行业, realCPA, 时间步) 排序后只在存在的行上计算：同一 (行业, realCPA) 内
+    沿时间步反向分组累加得到 "t 及之后" 的剩余流量，展开到该 realCPA 仍有流量的每个时间步，
+    再按 (时间步, 行业) 分组沿 realCPA 升序累加得到 cum_cost。内存与输出行数成正比，
+    不随 (行业, realCPA) 数 × 时间步数增长。
+    """
+    n_periods = len(partials)
+    merged = _reduce(partials)
+    merged = merged.sort_values(["advertiserCategoryIndex", "realCPA", "timeStepIndex"], kind="stable")
+    categories = merged["advertiserCategoryIndex"].to_numpy()
+    real_cpa = merged["realCPA"].to_numpy()
+    steps = merged["timeStepIndex"].to_numpy().astype(np.int64)
+    cost = merged["cost"].to_numpy() / n_periods
+    n = len(merged)
+
+    # 每个 (行业, realCPA) 的第一行
+    key_start = np.ones(n, dtype=bool)
+    key_start[1:] = (categories[1:] != categories[:-1]) | (real_cpa[1:] != real_cpa[:-1])
+
+    # t 及之后的剩余流量：组内反向累加
+    key_id = np.cumsum(key_start) - 1
+    remaining = pd.Series(cost[::-1]).groupby(key_id[::-1]).cumsum().to_numpy()[::-1]
+
+    # 每行覆盖 (同组上一行的时间步, 本行时间步] 的各个时间步
+    previous = np.where(key_start, -1, np.append(-1, steps[:-1]))
+    counts = steps - previous
+    rows = np.repeat(np.arange(n), counts)
+    expanded_steps = previous[rows] + 1 + np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    keep = remaining[rows] > 0
+    rows, expanded_steps = rows[keep], expanded_steps[keep]
+
+    # 按 (时间步, 行业, realCPA) 排序后按 (时间步, 行业) 分组累加
+    order = np.lexsort((real_cpa[rows], categories[rows], expanded_steps))
+    rows, expanded_steps = rows[order], expanded_steps[order]
+    least_winning_costs = remaining[rows]
+    group_start = np.ones(len(rows), dtype=bool)
+    group_start[1:] = (expanded_steps[1:] != expanded_steps[:-1]) | (categories[rows][1:] != categories[rows][:-1])
+    cum_cost = pd.Series(least_winning_costs).groupby(np.cumsum(group_start)).cumsum().to_numpy()
+
+    return pd.DataFrame({
+        "timeStepIndex": expanded_steps,
+        "advertiserCategoryIndex": categories[rows],
+        "realCPA": real_cpa[rows],
+        "leastWinningCost": least_winning_costs,
+        "cum_cost": cum_cost,
+    })
+
+
+class ModelBuilder:
+    """增量维护 partials/ 与模型表"""
+
+    def __init__(self, model_dir: str = DEFAULT_MODEL_DIR, store_dir: str = DEFAULT_STORE_DIR,
+                 chunksize: int = 1_000_000, cpa_decimals: int = 2):
+        self.model_dir = model_dir
+        self.store_dir = store_dir
+        self.chunksize = chunksize
+        self.cpa_decimals = cpa_decimals
+        self.partials_dir = os.path.join(model_dir, PARTIALS_DIR)
+        self.manifest_path = os.path.join(model_dir, MANIFEST_FILE)
+        os.makedirs(self.partials_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict:
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("cpa_decimals") == self.cpa_decimals:
+                return manifest
+        return {"cpa_decimals": self.cpa_decimals, "periods": {}}
+
+    def _save_manifest(self):
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+
+    def _partial_path(self, period: str) -> str:
+        return os.path.join(self.partials_dir, f"{period}.csv")
+
+    def is_current(self, period: str, data_path: str) -> bool:
+        """部分结果存在且源文件未变化"""
+        entry = self.manifest["periods"].get(period)
+        if entry is None or not os.path.exists(self._partial_path(period)):
+            return False
+        return entry["source_mtime"] == os.path.getmtime(resolve_data_path(data_path))
+
+    def add_period(self, period: str, data_path: str, force: bool = False) -> bool:
+        """扫描一个 period 并保存部分结果；已是最新时跳过，返回是否重新计算"""
+        if not force and self.is_current(period, data_path):
+            return False
+        partial = aggregate_period(data_path, self.store_dir, self.chunksize, self.cpa_decimals)
+        partial.to_csv(self._partial_path(period), index=False)
+        self.manifest["periods"][period] = {
+            "source": os.path.abspath(resolve_data_path(data_path)),
+            "source_mtime": os.path.getmtime(resolve_data_path(data_path)),
+            "rows": int(len(partial)),
+        }
+        self._save_manifest()
+        return True
+
+    def remove_period(self, period: str):
+        self.manifest["periods"].pop(period, None)
+        if os.path.exists(self._partial_path(period)):
+            os.remove(self._partial_path(period))
+        self._save_manifest()
+
+    def write_model(self, periods: Optional[List[str]] = None) -> str:
+        """合并部分结果并写出 period.csv"""
+        periods = periods or sorted(self.manifest["periods"])
+        if not periods:
+            raise ValueError("没有可用的 period 部分结果")
+        partials = [pd.read_csv(self._partial_path(p)) for p in periods]
+        model = build_model_table(partials)
+        model_path = os.path.join(self.model_dir, MODEL_FILE)
+        model.to_csv(model_path, index=False)
+        return model_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="构建 OnlineLp 模型 (period.csv)")
+    parser.add_argument("--traffic-dir", default=DEFAULT_TRAFFIC_DIR)
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--periods", nargs="*", default=None, help="只使用这些 period，例如 period-7")
+    parser.add_argument("--rebuild", action="store_true", help="忽略已有部分结果，全部重算")
+    parser.add_argument("--chunksize", type=int, default=1_000_000)
+    parser.add_argument("--cpa-decimals", type=int, default=2, help="realCPA 保留的小数位")
+    args = parser.parse_args()
+
+    files = find_period_files(args.traffic_dir)
+    if args.periods:
+        files = {name: path for name, path in files.items() if name in args.periods}
+    if not files:
+        print(f"未找到流量文件: {args.traffic_dir}")
+        return
+
+    builder = ModelBuilder(args.model_dir, args.store_dir, args.chunksize, args.cpa_decimals)
+    for name, path in files.items():
+        updated = builder.add_period(name, path, force=args.rebuild)
+        print(f"  {'✓ 已计算' if updated else '- 已是最新'}: {name}")
+
+    model_path = builder.write_model(list(files))
+    print(f"✓ 模型已保存至: {model_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分阶段计时
+==========
+记录模拟器各阶段（加载模型、读取流量、按时间步筛选、get_alpha、竞价计算……）
+的耗时、处理行数与内存峰值，导出为 JSON：
+
+    profiler = PhaseTimer(enabled=True)
+    with profiler.phase("load_traffic") as p:
+        data = reader.load(advertiser_number)
+        p.rows = len(data)
+    with profiler.phase("auction", step=time_step, rows=len(step_data)):
+        ...
+    profiler.save("profile.json")
+
+默认关闭：enabled=False 时 phase() 返回共享的空上下文，几乎没有开销。
+trace_memory=True 时用 tracemalloc 记录每个阶段的 Python 内存峰值（开销较大，
+只在排查内存问题时打开）。
+"""
+
+import sys
+import json
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class _NullPhase:
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ("timer", "name", "step", "rows", "start", "child_peak")
+
+    def __init__(self, timer: "PhaseTimer", name: str, step: Optional[int], rows: Optional[int]):
+        self.timer = timer
+        self.name = name
+        self.step = step
+        self.rows = rows
+        self.child_peak = 0
+
+    def __enter__(self):
+        if self.timer.trace_memory:
+            tracemalloc.reset_peak()
+        self.timer._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        self.timer._stack.pop()
+        peak = None
+        if self.timer.trace_memory:
+            # 内层阶段会重置峰值，这里取本阶段剩余部分与内层峰值的较大者
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            if self.timer._stack:
+                parent = self.timer._stack[-1]
+                parent.child_peak = max(parent.child_peak, peak)
+        self.timer._record(self.name, self.step, seconds, self.rows, peak)
+        return False
+
+
+class PhaseTimer:
+    """按阶段 / 时间步累计耗时、行数与内存峰值"""
+
+    def __init__(self, enabled: bool = True, trace_memory: bool = False):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.phases: "OrderedDict[str, Dict]" = OrderedDict()
+        self.steps: List[Dict] = []
+        self._stack: List[_Phase] = []
+        self._created = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def phase(self, name: str, step: Optional[int] = None, rows: Optional[int] = None):
+        """计时上下文；step 不为空时同时记录逐步明细"""
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name, step, rows)
+
+    def _record(self, name: str, step: Optional[int], seconds: float, rows: Optional[int], peak: Optional[int]):
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = {"calls": 0, "seconds": 0.0, "rows": 0, "peak_bytes": None}
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        if rows is not None:
+            stats["rows"] += int(rows)
+        if peak is not None:
+            stats["peak_bytes"] = max(stats["peak_bytes"] or 0, int(peak))
+        if step is not None:
+            self.steps.append({"step": int(step), "phase": name, "seconds": seconds,
+                               "rows": None if rows is None else int(rows), "peak_bytes": peak})
+
+    def to_dict(self) -> Dict:
+        phases = OrderedDict()
+        for name, stats in self.phases.items():
+            phases[name] = dict(stats, mean_ms=stats["seconds"] * 1000 / stats["calls"])
+        max_rss = None
+        if resource is not None:
+            # Linux 上单位为 KB，macOS 上为字节
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            max_rss = rss if sys.platform == "darwin" else rss * 1024
+        return {
+            "enabled": self.enabled,
+            "trace_memory": self.trace_memory,
+            "wall_seconds": time.perf_counter() - self._created,
+            "max_rss_bytes": max_rss,
+            "phases": phases,
+            "steps": self.steps,
+        }
+
+    def save(self, path: str) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def report(self) -> str:
+        """按总耗时降序的文本表"""
+        lines = [f"{'阶段':<20} {'次数':>8} {'总耗时(s)':>12} {'平均(ms)':>10} {'行数':>12}"]
+        for name, stats in sorted(self.to_dict()["phases"].items(), key=lambda kv: -kv[1]["seconds"]):
+            lines.append(f"{name:<20} {stats['calls']:>8} {stats['seconds']:>12.4f} "
+                         f"{stats['mean_ms']:>10.3f} {stats['rows']:>12}")
+        return "\n".join(lines)
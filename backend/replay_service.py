@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+真实流量回放服务
+================
+供 api.py 的 /api/replay/* 使用：在进程池中用 batch_simulator 回放 data/traffic 下的
+真实 period，API 的事件循环只等待结果。
+
+多 worker 部署（gunicorn -w N / uvicorn --workers N）时流量与 alpha 模型不在每个进程里
+各加载一份：
+- 流量：traffic_store 的列式分区（.npy），以 mmap_mode="r" 打开
+- alpha 模型：AlphaIndex.save 写出的 .npy 目录，同样以 mmap 打开
+同一台机器上全部 API worker 及其回放进程映射的是同一批文件，物理内存中只有操作系统
+页缓存里的一份。把 GROWENGINE_STORE_DIR 指向 /dev/shm 下的目录即可让数据常驻内存。
+
+分区缺失或源文件更新后由回放进程重新生成：写在临时目录中，完成后替换旧目录
+（仍在映射旧文件的进程不受影响），文件锁保证同一台机器上只有一个进程在写。
+部署时也可以预先生成：
+
+    python replay_service.py --prepare
+
+环境变量:
+    GROWENGINE_TRAFFIC_DIR     流量 CSV 目录，默认 data/traffic
+    GROWENGINE_STORE_DIR       列式分区与 alpha 索引目录，默认 data/traffic_store
+    GROWENGINE_MODEL_PATH      OnlineLp 模型，默认 saved_model/onlineLpTest/period.csv
+    GROWENGINE_REPLAY_WORKERS  每个 API worker 的回放进程数，默认 2
+    GROWENGINE_REPLAY_STREAMS  每个 API worker 同时进行的流式回放数，默认 2
+
+流式回放（/api/replay/stream）在客户端读得慢时会一直占着回放进程，因此使用单独的进程池，
+最多 GROWENGINE_REPLAY_STREAMS 个；名额用完时 stream() 抛出 ReplayBusy（接口返回 503），
+不占用 /api/replay/simulate 的回放进程。
+"""
+
+import os
+import queue
+import shutil
+import asyncio
+import argparse
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from alpha_index import AlphaIndex
+from batch_simulator import PeriodSimulator, StreamingPeriodSimulator
+from head_to_head import parse_strategy_spec
+from strategies import create_strategy
+from traffic_store import (
+    DEFAULT_STORE_DIR, DEFAULT_TRAFFIC_DIR, StorePeriodReader,
+    find_period_files, ingest_period, period_name, resolve_data_path, store_is_current,
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRAFFIC_DIR = os.environ.get("GROWENGINE_TRAFFIC_DIR", DEFAULT_TRAFFIC_DIR)
+STORE_DIR = os.environ.get("GROWENGINE_STORE_DIR", DEFAULT_STORE_DIR)
+MODEL_PATH = os.environ.get("GROWENGINE_MODEL_PATH",
+                            os.path.join(BASE_DIR, "saved_model/onlineLpTest/period.csv"))
+REPLAY_WORKERS = int(os.environ.get("GROWENGINE_REPLAY_WORKERS", "2"))
+REPLAY_STREAMS = int(os.environ.get("GROWENGINE_REPLAY_STREAMS", "2"))
+
+# 流式回放时每个请求最多缓冲的时间步数；客户端读得慢时回放进程在 put 上等待
+STREAM_QUEUE_SIZE = 8
+
+ALPHA_INDEX_DIR = "alpha_index"
+LOCK_FILE = ".lock"
+
+
+# ==================== 共享数据目录 ====================
+
+@contextmanager
+def _store_lock(store_dir: str):
+    """同一台机器上的进程间互斥（无 fcntl 的平台上不加锁）"""
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, LOCK_FILE), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _replace_dir(new_dir: str, target_dir: str):
+    """用 new_dir 替换 target_dir；旧文件只被 unlink，已有的 mmap 仍然有效"""
+    if os.path.exists(target_dir):
+        stale_dir = f"{target_dir}.stale-{os.getpid()}"
+        os.rename(target_dir, stale_dir)
+        os.rename(new_dir, target_dir)
+        shutil.rmtree(stale_dir, ignore_errors=True)
+    else:
+        os.rename(new_dir, target_dir)
+
+
+def ensure_period(data_path: str, store_dir: str = STORE_DIR) -> str:
+    """保证 period 的列式分区存在且不过期，返回分区目录"""
+    source = resolve_data_path(data_path)
+    period_dir = os.path.join(store_dir, period_name(data_path))
+    if store_is_current(period_dir, source):
+        return period_dir
+    with _store_lock(store_dir):
+        if not store_is_current(period_dir, source):
+            tmp_store = os.path.join(store_dir, f".tmp-{os.getpid()}")
+            shutil.rmtree(tmp_store, ignore_errors=True)
+            _replace_dir(ingest_period(source, tmp_store), period_dir)
+            shutil.rmtree(tmp_store, ignore_errors=True)
+    return period_dir
+
+
+def ensure_alpha_index(model_path: str = MODEL_PATH, store_dir: str = STORE_DIR) -> str:
+    """保证 alpha 模型的 .npy 索引存在且不过期，返回索引目录"""
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"模型文件未找到: {model_path}")
+    index_dir = os.path.join(store_dir, ALPHA_INDEX_DIR)
+    if store_is_current(index_dir, model_path):
+        return index_dir
+    with _store_lock(store_dir):
+        if not store_is_current(index_dir, model_path):
+            tmp_dir = f"{index_dir}.tmp-{os.getpid()}"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            AlphaIndex.from_csv(model_path).save(tmp_dir, source=model_path)
+            _replace_dir(tmp_dir, index_dir)
+    return index_dir
+
+
+def prepare_shared_data(traffic_dir: str = TRAFFIC_DIR, store_dir: str = STORE_DIR,
+                        model_path: str = MODEL_PATH) -> List[str]:
+    """预先生成全部 period 分区与 alpha 索引"""
+    prepared = [ensure_period(path, store_dir) for path in find_period_files(traffic_dir).values()]
+    if os.path.exists(model_path):
+        prepared.append(ensure_alpha_index(model_path, store_dir))
+    return prepared
+
+
+# ==================== 回放进程 ====================
+
+# (meta.json 修改时间, 索引)；模型更新后重新映射
+_ALPHA_INDEX: Optional[Tuple[int, AlphaIndex]] = None
+
+
+def _alpha_index(model_path: str, store_dir: str) -> AlphaIndex:
+    global _ALPHA_INDEX
+    index_dir = ensure_alpha_index(model_path, store_dir)
+    mtime = os.stat(os.path.join(index_dir, "meta.json")).st_mtime_ns
+    if _ALPHA_INDEX is None or _ALPHA_INDEX[0] != mtime:
+        _ALPHA_INDEX = (mtime, AlphaIndex.load(index_dir))
+    return _ALPHA_INDEX[1]
+
+
+def _records(frame) -> List[Dict]:
+    """DataFrame -> 只含 Python 原生类型的记录列表"""
+    return [{key: value.item() if hasattr(value, "item") else value for key, value in record.items()}
+            for record in frame.to_dict("records")]
+
+
+def _advertiser_simulator(data_path: str, store_dir: str, model_path: str, advertiser_number: int,
+                          seed: Optional[int], budget_mode: str, substeps: int) -> PeriodSimulator:
+    """只含单个广告主流量（从 mmap 中取其行范围）的 PeriodSimulator"""
+    traffic = StorePeriodReader(ensure_period(data_path, store_dir)).load(advertiser_number)
+    if traffic.empty:
+        raise KeyError(f"广告主 {advertiser_number} 没有数据")
+    return PeriodSimulator(traffic, _alpha_index(model_path, store_dir), seed=seed,
+                           budget_mode=budget_mode, substeps=substeps)
+
+
+def _create_strategy(strategy: str, alpha_index: AlphaIndex):
+    name, params = parse_strategy_spec(strategy)
+    return create_strategy(name, alpha_index, **params)
+
+
+def replay_period(data_path: str, store_dir: str, model_path: str, advertiser_number: Optional[int] = None,
+                  n_replicates: int = 1, seed: Optional[int] = None, budget_mode: str = "proportional",
+                  substeps: int = 1, strategy: str = "onlineLp") -> Dict:
+    """
+    在回放进程中执行：回放一个 period
+
+    给出 advertiser_number 时只回放该广告主，结果包含第 0 条轨迹的逐步列；
+    否则按时间步流式回放整个 period，只返回每个广告主的汇总。
+    """
+    if advertiser_number is None:
+        ensure_period(data_path, store_dir)
+        alpha_index = _alpha_index(model_path, store_dir)
+        bidding_strategy = _create_strategy(strategy, alpha_index)
+        simulator = StreamingPeriodSimulator(data_path, alpha_index, seed=seed, budget_mode=budget_mode,
+                                             substeps=substeps, store_dir=store_dir)
+        try:
+            result = simulator.run(n_replicates=n_replicates, strategy=bidding_strategy)
+        finally:
+            simulator.close()
+        return {"advertisers": _records(result.summary()), "columns": None}
+
+    simulator = _advertiser_simulator(data_path, store_dir, model_path, advertiser_number,
+                                      seed, budget_mode, substeps)
+    result = simulator.run(n_replicates=n_replicates,
+                           strategy=_create_strategy(strategy, simulator.alpha_index))
+    history = result.history_arrays
+    budget = float(result.advertisers["budget"].iloc[0])
+    columns = {
+        "alpha": history["alpha"][0, 0],
+        "traffic": history["traffic"][0, 0].astype(np.int64),
+        "wins": history["wins"][0, 0].astype(np.int64),
+        "cost": history["cost"][0, 0],
+        "conversions": history["conversion"][0, 0].astype(np.int64),
+        "remaining_budget": np.maximum(budget - np.cumsum(history["cost"][0, 0]), 0.0),
+    }
+    return {"advertisers": _records(result.summary()), "columns": columns}
+
+
+def _put(results, cancel, item) -> bool:
+    """放入有界队列；队列满时等待，取消后放弃并返回 False"""
+    while not cancel.is_set():
+        try:
+            results.put(item, timeout=0.2)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def stream_replay(results, cancel, data_path: str, store_dir: str, model_path: str, advertiser_number: int,
+                  n_replicates: int = 1, seed: Optional[int] = None, budget_mode: str = "proportional",
+                  substeps: int = 1, strategy: str = "onlineLp"):
+    """
+    在回放进程中执行：逐步回放单个广告主，依次放入 ("meta", 广告主信息)、
+    每个时间步的 ("step", 长度为 1 的逐步列)、("done", None)；cancel 置位后停止
+    """
+    simulator = _advertiser_simulator(data_path, store_dir, model_path, advertiser_number,
+                                      seed, budget_mode, substeps)
+    bidding_strategy = _create_strategy(strategy, simulator.alpha_index)
+    advertiser = _records(simulator.advertisers)[0]
+    if not _put(results, cancel, ("meta", advertiser)):
+        return
+    remaining = advertiser["budget"]
+    for time_step, step in simulator.iter_run(n_replicates=n_replicates, strategy=bidding_strategy):
+        remaining = max(remaining - float(step["cost"][0, 0]), 0.0)
+        columns = {
+            "step": np.array([time_step]),
+            "alpha": step["alpha"][0, :1],
+            "traffic": step["traffic"][0, :1].astype(np.int64),
+            "wins": step["wins"][0, :1].astype(np.int64),
+            "cost": step["cost"][0, :1],
+            "conversions": step["conversion"][0, :1].astype(np.int64),
+            "remaining_budget": np.array([remaining]),
+        }
+        if not _put(results, cancel, ("step", columns)):
+            return
+    _put(results, cancel, ("done", None))
+
+
+# ==================== API 端 ====================
+
+class ReplayBusy(Exception):
+    """流式回放名额已满"""
+
+
+class ReplayStream:
+    """一次流式回放：async for 逐步取结果；aclose() 取消回放并归还名额（可重复调用）"""
+
+    def __init__(self, service: "ReplayService", steps: AsyncIterator[Tuple[str, Any]]):
+        self._service = service
+        self._steps = steps
+        self._closed = False
+
+    def __aiter__(self):
+        return self._steps
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+        await self._steps.aclose()
+        self._service._active_streams -= 1
+
+
+class ReplayService:
+    """API 进程持有的回放进程池与流式回放进程池；第一次请求时才启动"""
+
+    def __init__(self, traffic_dir: str = TRAFFIC_DIR, store_dir: str = STORE_DIR,
+                 model_path: str = MODEL_PATH, workers: int = REPLAY_WORKERS, streams: int = REPLAY_STREAMS):
+        self.traffic_dir = traffic_dir
+        self.store_dir = store_dir
+        self.model_path = model_path
+        self.workers = workers
+        self.streams = streams
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._stream_executor: Optional[ProcessPoolExecutor] = None
+        # 每个流式回放一个线程等待结果队列，与流式回放进程数相同
+        self._stream_threads: Optional[ThreadPoolExecutor] = None
+        self._active_streams = 0
+        self._manager = None
+
+    def periods(self) -> Dict[str, str]:
+        return find_period_files(self.traffic_dir)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn：不从带事件循环与线程的 API 进程 fork
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _stream_pool(self) -> ProcessPoolExecutor:
+        if self._stream_executor is None:
+            self._stream_executor = ProcessPoolExecutor(max_workers=self.streams,
+                                                        mp_context=multiprocessing.get_context("spawn"))
+            self._stream_threads = ThreadPoolExecutor(max_workers=self.streams,
+                                                      thread_name_prefix="replay-stream")
+        return self._stream_executor
+
+    async def replay(self, period: str, advertiser_number: Optional[int] = None, n_replicates: int = 1,
+                     seed: Optional[int] = None, budget_mode: str = "proportional", substeps: int = 1,
+                     strategy: str = "onlineLp") -> Dict:
+        periods = self.periods()
+        if period not in periods:
+            raise KeyError(f"period {period} 不存在")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool(), replay_period, periods[period], self.store_dir, self.model_path,
+            advertiser_number, n_replicates, seed, budget_mode, substeps, strategy,
+        )
+
+    def stream(self, period: str, advertiser_number: int, n_replicates: int = 1,
+               seed: Optional[int] = None, budget_mode: str = "proportional", substeps: int = 1,
+               strategy: str = "onlineLp") -> ReplayStream:
+        """
+        逐步给出 ("meta", 广告主信息) 与 ("step", 逐步列)；调用时即占用一个流式名额，
+        名额已满时 ReplayBusy；用完或提前结束都需要 aclose()，提前关闭即取消回放
+        """
+        periods = self.periods()
+        if period not in periods:
+            raise KeyError(f"period {period} 不存在")
+        if self._active_streams >= self.streams:
+            raise ReplayBusy(f"同时进行的流式回放已达上限 {self.streams}")
+        self._active_streams += 1
+        return ReplayStream(self, self._stream_steps(periods[period], advertiser_number, n_replicates, seed,
+                                                     budget_mode, substeps, strategy))
+
+    async def _stream_steps(self, data_path: str, advertiser_number: int, n_replicates: int,
+                            seed: Optional[int], budget_mode: str, substeps: int,
+                            strategy: str) -> AsyncIterator[Tuple[str, Any]]:
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        results = self._manager.Queue(maxsize=STREAM_QUEUE_SIZE)
+        cancel = self._manager.Event()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._stream_pool(), stream_replay, results, cancel, data_path, self.store_dir, self.model_path,
+            advertiser_number, n_replicates, seed, budget_mode, substeps, strategy,
+        )
+        try:
+            while True:
+                try:
+                    kind, payload = await loop.run_in_executor(self._stream_threads, results.get, True, 0.2)
+                except queue.Empty:
+                    if future.done():
+                        future.result()  # 回放进程中的异常在这里抛出
+                        return
+                    continue
+                if kind == "done":
+                    return
+                yield kind, payload
+        finally:
+            cancel.set()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        if self._stream_executor is not None:
+            self._stream_executor.shutdown(cancel_futures=True)
+            self._stream_threads.shutdown(cancel_futures=True)
+            self._stream_executor = self._stream_threads = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="真实流量回放服务的共享数据")
+    parser.add_argument("--prepare", action="store_true", help="生成全部 period 分区与 alpha 索引")
+    parser.add_argument("--traffic-dir", default=TRAFFIC_DIR)
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    parser.add_argument("--model", default=MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.prepare:
+        for path in prepare_shared_data(args.traffic_dir, args.store_dir, args.model):
+            print(f"✓ {path}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
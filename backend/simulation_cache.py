@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+竞价模拟结果缓存
+================
+指定了 seed 的 /api/bidding/simulate 结果按 (campaign_id, steps, budget, bid, updated_at, seed,
+traffic_scale, 引擎版本) 缓存，同一广告计划反复打开模拟弹窗时直接返回上次的结果：
+
+    cache = SimulationCache(maxsize=256, ttl=300)
+    result = cache.get_or_compute(campaign_id, key, lambda: simulate(...))
+    cache.invalidate(campaign_id)   # 广告计划被修改 / 启停 / 删除
+
+- 容量有界（LRU 淘汰），每项 ttl 秒后过期
+- 相同 key 的并发请求只计算一次，其余请求等待同一个结果
+- 失效时递增该广告计划的版本号：失效前已开始、失效后才算完的结果不会写入缓存；
+  版本号只为有正在计算的结果的广告计划保留，没有时即删除，不随计划数增长
+- invalidate() 只作用于本进程；多 worker 部署时调用方在 key 中带上广告计划的 updated_at，
+  其他 worker 修改过的计划不会命中旧结果
+- stats() 给出命中、未命中、合并、淘汰、过期、失效计数
+
+路由是同步函数（在线程池中执行），因此用线程锁与 concurrent.futures.Future。
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+DEFAULT_MAXSIZE = int(os.environ.get("GROWENGINE_SIM_CACHE_SIZE", "256"))
+DEFAULT_TTL = float(os.environ.get("GROWENGINE_SIM_CACHE_TTL", "300"))
+
+
+class SimulationCache:
+    """按广告计划分组、可整组失效的 LRU + TTL 缓存"""
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, ttl: float = DEFAULT_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        # (group, key) -> (过期时间, 结果)，按最近使用排序
+        self._entries: "OrderedDict[Tuple[Hashable, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple[Hashable, Hashable], Future] = {}
+        self._generations: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0,
+                         "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _lookup(self, entry_key) -> Optional[Any]:
+        """调用方持有锁；命中时移到末尾，过期时删除"""
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= self.clock():
+            del self._entries[entry_key]
+            self.counters["expirations"] += 1
+            return None
+        self._entries.move_to_end(entry_key)
+        return value
+
+    def _store(self, entry_key, value, generation: int):
+        """调用方持有锁；期间该组已失效则不写入"""
+        if self._generations.get(entry_key[0], 0) != generation or self.maxsize <= 0:
+            return
+        self._entries[entry_key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(entry_key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _release(self, group: Hashable):
+        """调用方持有锁；该组最后一个计算结束后删除其版本号"""
+        if group in self._generations and not any(entry_key[0] == group for entry_key in self._inflight):
+            del self._generations[group]
+
+    def generation(self, group: Hashable) -> int:
+        """当前版本号，传给 put() 以丢弃失效前开始计算的结果"""
+        with self._lock:
+            return self._generations.get(group, 0)
+
+    def get(self, group: Hashable, key: Hashable) -> Optional[Any]:
+        """只查缓存，不计算"""
+        with self._lock:
+            value = self._lookup((group, key))
+            self.counters["hits" if value is not None else "misses"] += 1
+            return value
+
+    def put(self, group: Hashable, key: Hashable, value: Any, generation: int):
+        with self._lock:
+            self._store((group, key), value, generation)
+
+    def get_or_compute(self, group: Hashable, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """命中则返回缓存；否则计算并缓存，同一 key 正在计算时等待该次计算"""
+        entry_key = (group, key)
+        with self._lock:
+            value = self._lookup(entry_key)
+            if value is not None:
+                self.counters["hits"] += 1
+                return value
+            future = self._inflight.get(entry_key)
+            owner = future is None
+            if owner:
+                self.counters["misses"] += 1
+                future = self._inflight[entry_key] = Future()
+                generation = self._generations.get(group, 0)
+            else:
+                self.counters["coalesced"] += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[entry_key]
+                self._release(group)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[entry_key]
+            self._store(entry_key, value, generation)
+            self._release(group)
+        future.set_result(value)
+        return value
+
+    def _bump(self, group: Hashable):
+        """调用方持有锁；该组有正在进行的计算时递增版本号，否则删除版本号"""
+        if any(entry_key[0] == group for entry_key in self._inflight):
+            self._generations[group] = self._generations.get(group, 0) + 1
+        else:
+            self._generations.pop(group, None)
+
+    def invalidate(self, group: Hashable) -> int:
+        """删除一个广告计划的全部结果，返回删除的条数"""
+        with self._lock:
+            self._bump(group)
+            stale = [entry_key for entry_key in self._entries if entry_key[0] == group]
+            for entry_key in stale:
+                del self._entries[entry_key]
+            self.counters["invalidations"] += 1
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            for group in {entry_key[0] for entry_key in self._inflight}:
+                self._bump(group)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"] + self.counters["coalesced"]
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "inflight": len(self._inflight),
+                "generations": len(self._generations),
+                **self.counters,
+                "hit_rate": round((self.counters["hits"] + self.counters["coalesced"]) / lookups, 4)
+                if lookups else 0.0,
+            }
@@ -7,6 +7,14 @@ import pandas as pd
 import numpy as np
 import sys
 import random
+import argparse
+
+from alpha_index import AlphaIndex
+from traffic_store import open_period
+from batch_simulator import PeriodSimulator
+from head_to_head import parse_strategy_spec
+from profiling import PhaseTimer
+from strategies import create_strategy
 
 # 尝试导入 tqdm 用于进度条，如果没有则使用简单打印
 try:
@@ -40,42 +48,41 @@ def print_banner():
     print(Colors.colorize("="*60, Colors.BLUE))
 
 class OnlineLpSimulator:
-    def __init__(self, data_path, model_path, advertiser_number=None, delay=0.5):
+    def __init__(self, data_path, model_path, advertiser_number=None, delay=0.5, profiler=None):
         self.data_path = data_path
         self.model_path = model_path
         self.delay = delay
         self.advertiser_number = advertiser_number
+        # 分阶段计时 (profiling.py)，默认关闭
+        self.profiler = profiler or PhaseTimer(enabled=False)
         
         # 加载模型
         print(f"正在加载模型: {model_path} ...")
         if not os.path.exists(model_path):
-            raise FileNotFoundError(f"模型文件未找到: {model_path}\n请先运行 main/main_onlineLp.py 进行训练。")
-        self.model = pd.read_csv(model_path)
+            raise FileNotFoundError(f"模型文件未找到: {model_path}\n请先运行 python model_builder.py 构建模型。")
+        with self.profiler.phase("load_model") as phase:
+            self.model = pd.read_csv(model_path)
+            self.alpha_index = AlphaIndex(self.model)
+            phase.rows = len(self.model)
         
         # 加载数据
         print(f"正在加载数据: {data_path} ...")
-        if not os.path.exists(data_path):
-             # 尝试查找转换后的数据
-            rl_data_path = data_path.replace(".csv", "-rlData.csv").replace("traffic/", "traffic/training_data_rlData_folder/")
-            if os.path.exists(rl_data_path):
-                 print(f"未找到原始数据，尝试使用转换后的数据: {rl_data_path}")
-                 self.data_path = rl_data_path
-            else:
-                 raise FileNotFoundError(f"数据文件未找到: {data_path}")
-        
-        # 读取数据（只读取一部分以加快速度，或者读取特定广告主）
-        # 这里我们读取整个文件，然后筛选
-        self.raw_data = pd.read_csv(self.data_path)
+        # 优先读取列式分区 (traffic_store.py)，否则只读取 CSV 中需要的列
+        reader = open_period(data_path)
+        if reader.source != data_path:
+            print(f"使用数据源: {reader.source}")
+        self.data_path = reader.source
         
-        # 如果未指定广告主，随机选择一个有足够数据的广告主
+        # 如果未指定广告主，默认选择第一个
         if self.advertiser_number is None:
-            valid_advertisers = self.raw_data['advertiserNumber'].unique()
-            # 简单筛选一下数据量较多的广告主
-            self.advertiser_number = valid_advertisers[0] # 默认第一个，或者随机
+            with self.profiler.phase("scan_advertisers"):
+                self.advertiser_number = reader.advertiser_numbers()[0]
             print(f"自动选择广告主: {self.advertiser_number}")
 
-        # 筛选特定广告主的数据
-        self.data = self.raw_data[self.raw_data['advertiserNumber'] == self.advertiser_number].copy()
+        # 只读取特定广告主的数据
+        with self.profiler.phase("load_traffic") as phase:
+            self.data = reader.load(self.advertiser_number)
+            phase.rows = len(self.data)
         
         if self.data.empty:
             raise ValueError(f"广告主 {self.advertiser_number} 没有数据！")
@@ -92,25 +99,20 @@ class OnlineLpSimulator:
 
     def get_alpha(self, time_step, remaining_budget):
         """根据 OnlineLp 策略获取 alpha (CPA阈值)"""
-        # 筛选当前时间步和类别的模型数据
-        tem = self.model[
-            (self.model["timeStepIndex"] == time_step) & 
-            (self.model["advertiserCategoryIndex"] == self.category)
-        ]
-        
-        alpha = self.cpa_constraint
-        
-        if len(tem) > 0:
-            # 查找累积成本大于剩余预算的第一行
-            filtered_df = tem[tem['cum_cost'] > remaining_budget]
-            if not filtered_df.empty:
-                alpha = filtered_df.iloc[0]['realCPA']
+        # 在 (行业, 时间步) 分组内二分查找累积成本大于剩余预算的第一行
+        alpha = self.alpha_index.lookup(self.category, time_step, remaining_budget, self.cpa_constraint)
         
         # 限制 alpha 不超过 CPA 约束的 1.5 倍
         alpha = min(self.cpa_constraint * 1.5, alpha)
         return alpha
 
-    def simulate(self):
+    def simulate(self, budget_mode="proportional"):
+        """
+        逐步回放并动态展示
+
+        budget_mode="replay" 时按到达顺序结算：累计消耗超过剩余预算的那一条曝光之后
+        不再胜出；默认 "proportional" 为超预算时按比例缩放胜出与转化
+        """
         clear_screen()
         print_banner()
         
@@ -124,61 +126,69 @@ class OnlineLpSimulator:
         # 按时间步遍历
         for time_step in range(self.total_steps):
             # 获取当前时间步的数据
-            step_data = self.data[self.data['timeStepIndex'] == time_step]
+            with self.profiler.phase("step_mask", step=time_step, rows=len(self.data)):
+                step_data = self.data[self.data['timeStepIndex'] == time_step]
             
             if step_data.empty:
                 continue
                 
             # 1. 策略计算：获取 CPA 阈值 (alpha)
-            alpha = self.get_alpha(time_step, self.remaining_budget)
+            with self.profiler.phase("get_alpha", step=time_step):
+                alpha = self.get_alpha(time_step, self.remaining_budget)
             
-            # 2. 计算出价
-            # bids = alpha * pValue
-            p_values = step_data['pValue'].values
-            bids = alpha * p_values
+            with self.profiler.phase("auction", step=time_step, rows=len(step_data)):
+                # 2. 计算出价
+                # bids = alpha * pValue
+                p_values = step_data['pValue'].values
+                bids = alpha * p_values
             
-            # 3. 模拟竞价结果
-            # 真实数据中有 leastWinningCost (最低获胜成本)
-            least_winning_costs = step_data['leastWinningCost'].values
+                # 3. 模拟竞价结果
+                # 真实数据中有 leastWinningCost (最低获胜成本)
+                least_winning_costs = step_data['leastWinningCost'].values
             
-            # 判断是否获胜: 出价 >= 最低获胜成本
-            is_win = bids >= least_winning_costs
+                # 判断是否获胜: 出价 >= 最低获胜成本
+                is_win = bids >= least_winning_costs
             
-            # 计算成本: 如果是广义第二价格拍卖(GSP)，成本通常是 leastWinningCost
-            # 但为了简化，这里假设支付 leastWinningCost
-            costs = least_winning_costs * is_win
+                # 计算成本: 如果是广义第二价格拍卖(GSP)，成本通常是 leastWinningCost
+                # 但为了简化，这里假设支付 leastWinningCost
+                costs = least_winning_costs * is_win
             
-            # 模拟转化 (使用真实数据中的概率进行伯努利采样，或者直接用真实数据的转化如果存在)
-            # 这里我们基于 pValue 模拟转化，因为真实转化是基于真实历史出价的
-            # 为了更接近真实评估，我们使用 pValue 模拟
-            conversions = np.zeros_like(costs)
-            # 只有获胜且曝光的才可能转化。这里简化假设获胜即曝光
-            # 生成随机数模拟转化
-            random_vals = np.random.rand(len(p_values))
-            conversions = (random_vals < p_values) & is_win
+                if budget_mode == "replay":
+                    # 按到达顺序回放：累计消耗超过剩余预算之后的曝光不再胜出
+                    is_win &= np.cumsum(costs) <= self.remaining_budget
+                    costs = least_winning_costs * is_win
             
-            # 统计本时间步结果
-            step_cost = np.sum(costs)
-            step_conversion = np.sum(conversions)
-            step_wins = np.sum(is_win)
-            step_traffic = len(step_data)
+                # 模拟转化 (使用真实数据中的概率进行伯努利采样，或者直接用真实数据的转化如果存在)
+                # 这里我们基于 pValue 模拟转化，因为真实转化是基于真实历史出价的
+                # 为了更接近真实评估，我们使用 pValue 模拟
+                conversions = np.zeros_like(costs)
+                # 只有获胜且曝光的才可能转化。这里简化假设获胜即曝光
+                # 生成随机数模拟转化
+                random_vals = np.random.rand(len(p_values))
+                conversions = (random_vals < p_values) & is_win
             
-            # 处理预算超支
-            if step_cost > self.remaining_budget:
-                ratio = self.remaining_budget / step_cost
-                step_cost = self.remaining_budget # 只能花这么多
-                step_wins = int(step_wins * ratio)
-                step_conversion = int(step_conversion * ratio)
-                # 实际逻辑可能更复杂，这里简化处理
+                # 统计本时间步结果
+                step_cost = np.sum(costs)
+                step_conversion = np.sum(conversions)
+                step_wins = np.sum(is_win)
+                step_traffic = len(step_data)
             
-            # 更新状态
-            self.remaining_budget -= step_cost
-            if self.remaining_budget < 0: self.remaining_budget = 0
+                # 处理预算超支
+                if budget_mode == "proportional" and step_cost > self.remaining_budget:
+                    ratio = self.remaining_budget / step_cost
+                    step_cost = self.remaining_budget # 只能花这么多
+                    step_wins = int(step_wins * ratio)
+                    step_conversion = int(step_conversion * ratio)
+                    # 实际逻辑可能更复杂，这里简化处理
             
-            total_cost += step_cost
-            total_conversion += step_conversion
-            total_wins += step_wins
-            total_impression += step_wins # 简化假设
+                # 更新状态
+                self.remaining_budget -= step_cost
+                if self.remaining_budget < 0: self.remaining_budget = 0
+            
+                total_cost += step_cost
+                total_conversion += step_conversion
+                total_wins += step_wins
+                total_impression += step_wins # 简化假设
             
             # 计算实时指标
             current_cpa = total_cost / (total_conversion + 1e-10)
@@ -246,6 +256,74 @@ class OnlineLpSimulator:
         print("\n(按任意键退出)")
         # input()
 
+    def simulate_replicates(self, n_replicates=100, seed=None, percentiles=(5, 50, 95),
+                            budget_mode="proportional", substeps=1):
+        """
+        蒙特卡洛重复模拟：一次向量化运行 K 条独立的随机轨迹，
+        返回 消耗 / 转化 / CPA / 得分 的均值、标准差与分位数
+        """
+        with self.profiler.phase("batch_prepare", rows=len(self.data)):
+            engine = PeriodSimulator(self.data, self.alpha_index, total_steps=self.total_steps, seed=seed,
+                                     budget_mode=budget_mode, substeps=substeps)
+        with self.profiler.phase("batch_run", rows=len(self.data) * n_replicates):
+            result = engine.run(n_replicates=n_replicates)
+        stats = result.confidence(percentiles).set_index("metric").drop(columns="advertiser_number")
+        self.show_replicate_summary(n_replicates, stats)
+        return stats
+
+    def simulate_what_if(self, from_step, variants, n_replicates=1, seed=None,
+                         budget_mode="proportional", substeps=1):
+        """
+        what-if 分析：默认策略回放一次并在 from_step 开始前保存检查点，
+        各变体策略从检查点续跑，只重新计算 from_step 之后的时间步
+
+        variants: {名称: BiddingStrategy}；所有续跑使用相同的随机数
+        """
+        engine = PeriodSimulator(self.data, self.alpha_index, total_steps=self.total_steps, seed=seed,
+                                 budget_mode=budget_mode, substeps=substeps)
+        base = engine.run(n_replicates=n_replicates, checkpoint_steps=[from_step])
+        results = {"baseline": base}
+        results.update(engine.branch(base.checkpoints[from_step], variants))
+
+        rows = []
+        for name, result in results.items():
+            totals = result.lane_totals()
+            total_cost, total_conversion = totals["total_cost"].mean(), totals["total_conversion"].mean()
+            rows.append({
+                "variant": name,
+                "total_cost": total_cost,
+                "total_conversion": total_conversion,
+                "real_cpa": total_cost / (total_conversion + 1e-10),
+                "score": totals["score"].mean(),
+            })
+        table = pd.DataFrame(rows).set_index("variant")
+        self.show_what_if_summary(from_step, n_replicates, table)
+        return results
+
+    def show_what_if_summary(self, from_step, n_replicates, table):
+        print_banner()
+        print(Colors.colorize(f"\n🔀 What-if: 从时间步 {from_step + 1} 开始切换策略 ({n_replicates} 次重复)", Colors.BOLD + Colors.GREEN))
+        print("=" * 60)
+        print(f"{'策略':<24} | {'总消耗':>10} | {'总转化':>8} | {'CPA':>8} | {'得分':>8}")
+        print("-" * 60)
+        for name, row in table.iterrows():
+            print(f"{name:<24} | {row['total_cost']:>10.2f} | {row['total_conversion']:>8.1f} | "
+                  f"{row['real_cpa']:>8.2f} | {row['score']:>8.2f}")
+        print("=" * 60)
+
+    def show_replicate_summary(self, n_replicates, stats):
+        print_banner()
+        print(Colors.colorize(f"\n📊 {n_replicates} 次重复模拟统计", Colors.BOLD + Colors.GREEN))
+        print("=" * 60)
+        labels = {"total_cost": "总消耗", "total_conversion": "总转化", "real_cpa": "CPA", "score": "综合得分"}
+        band_columns = [c for c in stats.columns if c.startswith("p")]
+        print(f"{'指标':<10} | {'均值':>10} | {'标准差':>10} | " + " | ".join(f"{c:>10}" for c in band_columns))
+        print("-" * 60)
+        for metric, row in stats.iterrows():
+            bands = " | ".join(f"{row[c]:>10.2f}" for c in band_columns)
+            print(f"{labels.get(metric, metric):<10} | {row['mean']:>10.2f} | {row['std']:>10.2f} | {bands}")
+        print("=" * 60)
+
     def calculate_score(self, reward, cpa, cpa_constraint):
         """计算 NeurIPS 比赛得分"""
         beta = 2
@@ -256,6 +334,20 @@ class OnlineLpSimulator:
         return penalty * reward
 
 def main():
+    parser = argparse.ArgumentParser(description="OnlineLp 实时竞价模拟器")
+    parser.add_argument("--replicates", type=int, default=0, help="蒙特卡洛重复次数 (>0 时输出置信区间)")
+    parser.add_argument("--seed", type=int, default=None, help="重复模拟的随机种子")
+    parser.add_argument("--budget-mode", choices=["proportional", "replay"], default="proportional",
+                        help="超预算处理: 按比例缩放 / 按到达顺序回放")
+    parser.add_argument("--substeps", type=int, default=1, help="重复模拟时每步内重新计算 alpha 的次数")
+    parser.add_argument("--what-if-step", type=int, default=None,
+                        help="从该时间步 (0 起) 开始切换为 --what-if 中的策略，之前的回放只运行一次")
+    parser.add_argument("--what-if", nargs="+", default=["onlineLp:cpa_cap=2.0"],
+                        help="what-if 策略，格式同 head_to_head.py，例如 onlineLp:cpa_cap=2.0 fixedCpa")
+    parser.add_argument("--profile", default=None, help="分阶段计时 JSON 输出路径 (默认不计时)")
+    parser.add_argument("--trace-memory", action="store_true", help="计时时同时用 tracemalloc 记录内存峰值")
+    args = parser.parse_args()
+
     # 默认路径配置
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     DATA_PATH = os.path.join(BASE_DIR, "data/traffic/period-7.csv")
@@ -271,8 +363,23 @@ def main():
                 DATA_PATH = os.path.join(traffic_dir, files[0])
     
     try:
-        simulator = OnlineLpSimulator(DATA_PATH, MODEL_PATH, delay=0.2) # delay=0.2秒，速度适中
-        simulator.simulate()
+        profiler = PhaseTimer(enabled=args.profile is not None, trace_memory=args.trace_memory)
+        simulator = OnlineLpSimulator(DATA_PATH, MODEL_PATH, delay=0.2, profiler=profiler) # delay=0.2秒，速度适中
+        if args.what_if_step is not None:
+            variants = {}
+            for spec in args.what_if:
+                name, params = parse_strategy_spec(spec)
+                variants[spec] = create_strategy(name, simulator.alpha_index, **params)
+            simulator.simulate_what_if(args.what_if_step, variants, n_replicates=max(args.replicates, 1),
+                                       seed=args.seed, budget_mode=args.budget_mode, substeps=args.substeps)
+        elif args.replicates > 0:
+            simulator.simulate_replicates(args.replicates, seed=args.seed,
+                                          budget_mode=args.budget_mode, substeps=args.substeps)
+        else:
+            simulator.simulate(budget_mode=args.budget_mode)
+        if args.profile:
+            print(profiler.report())
+            print(f"✓ 计时结果已保存至: {profiler.save(args.profile)}")
     except Exception as e:
         print(Colors.colorize(f"\n❌ 错误: {e}", Colors.FAIL))
         sys.exit(1)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量出价策略接口
+================
+策略一次接收一个时间步（或子步）的整批曝光，返回出价数组：
+
+    bids = strategy.bid(p_values, adv, state)
+
+- p_values: (流量数,) 预估转化率
+- adv: (流量数,) 每条曝光所属广告主在 state 中的下标
+- state: BidState，包含时间步与每个 (轨迹, 广告主) 的预算状态
+- 返回 (轨迹数, 流量数) 或可广播为该形状的出价
+
+通过 register_strategy 注册后可以按名称创建，PeriodSimulator 与 head_to_head.py
+均通过该接口取得出价。
+"""
+
+import inspect
+import numpy as np
+from typing import Dict, List, Optional, Type
+
+from alpha_index import AlphaIndex
+
+# OnlineLp 策略默认参数: alpha <= cpa_cap * CPA约束；查表条件 cum_cost > budget_factor * 剩余预算
+DEFAULT_CPA_CAP = 1.5
+DEFAULT_BUDGET_FACTOR = 1.0
+
+
+class BidState:
+    """一次出价调用时的预算状态；数组均按广告主下标排列"""
+
+    def __init__(self, time_step: int, total_steps: int, categories: np.ndarray, budgets: np.ndarray,
+                 cpa_constraints: np.ndarray, remaining_budget: np.ndarray):
+        self.time_step = time_step
+        self.total_steps = total_steps
+        self.categories = categories
+        self.budgets = budgets
+        self.cpa_constraints = cpa_constraints
+        # 形状 (轨迹数, 广告主数)
+        self.remaining_budget = remaining_budget
+
+
+class BiddingStrategy:
+    """出价策略基类"""
+
+    name: str = ""
+    # 为 True 时 create_strategy 会传入 alpha_index
+    needs_model: bool = False
+
+    def bid(self, p_values: np.ndarray, adv: np.ndarray, state: BidState) -> np.ndarray:
+        raise NotImplementedError
+
+
+STRATEGY_REGISTRY: Dict[str, Type[BiddingStrategy]] = {}
+
+
+def register_strategy(name: str):
+    """类装饰器：按名称注册策略"""
+    def decorator(cls):
+        cls.name = name
+        STRATEGY_REGISTRY[name] = cls
+        return cls
+    return decorator
+
+
+def available_strategies() -> List[str]:
+    return sorted(STRATEGY_REGISTRY)
+
+
+def create_strategy(name: str, alpha_index: Optional[AlphaIndex] = None, **params) -> BiddingStrategy:
+    """按名称创建策略实例"""
+    if name not in STRATEGY_REGISTRY:
+        raise ValueError(f"未知的出价策略: {name}，可选: {', '.join(available_strategies())}")
+    cls = STRATEGY_REGISTRY[name]
+    accepted = [param for param in inspect.signature(cls.__init__).parameters
+                if param not in ("self", "alpha_index")]
+    unknown = sorted(set(params) - set(accepted))
+    if unknown:
+        raise ValueError(f"策略 {name} 不支持参数: {', '.join(unknown)}，可选: {', '.join(accepted) or '无'}")
+    if cls.needs_model:
+        if alpha_index is None:
+            raise ValueError(f"策略 {name} 需要 OnlineLp 模型")
+        return cls(alpha_index, **params)
+    return cls(**params)
+
+
+# ==================== 内置策略 ====================
+
+@register_strategy("onlineLp")
+class OnlineLpStrategy(BiddingStrategy):
+    """
+    OnlineLp: bid = alpha * pValue
+
+    alpha 为模型中第一条 cum_cost > budget_factor × 剩余预算 的 realCPA，
+    且不超过 cpa_cap × CPA约束。cpa_cap / budget_factor 可以是按轨迹的数组。
+    """
+
+    needs_model = True
+
+    def __init__(self, alpha_index: AlphaIndex, cpa_cap=DEFAULT_CPA_CAP, budget_factor=DEFAULT_BUDGET_FACTOR):
+        self.alpha_index = alpha_index
+        self.cpa_cap = np.asarray(cpa_cap, dtype=np.float64)
+        self.budget_factor = np.asarray(budget_factor, dtype=np.float64)
+
+    def alpha(self, state: BidState) -> np.ndarray:
+        """每个 (轨迹, 广告主) 的 alpha"""
+        n_lanes = state.remaining_budget.shape[0]
+        cpa_caps = np.broadcast_to(self.cpa_cap, (n_lanes,))[:, None]
+        budget_factors = np.broadcast_to(self.budget_factor, (n_lanes,))[:, None]
+        alpha = self.alpha_index.lookup_batch(
+            state.categories, state.time_step, state.remaining_budget * budget_factors, state.cpa_constraints
+        )
+        return np.minimum(state.cpa_constraints * cpa_caps, alpha)
+
+    def bid(self, p_values, adv, state):
+        return self.alpha(state)[:, adv] * p_values
+
+
+@register_strategy("fixedCpa")
+class FixedCpaStrategy(BiddingStrategy):
+    """以 CPA 约束为固定 alpha：bid = ratio × CPA约束 × pValue"""
+
+    def __init__(self, ratio: float = 1.0):
+        self.ratio = float(ratio)
+
+    def bid(self, p_values, adv, state):
+        return (self.ratio * state.cpa_constraints[adv] * p_values)[None, :]
+
+
+@register_strategy("constantAlpha")
+class ConstantAlphaStrategy(BiddingStrategy):
+    """与 /api/bidding/calculate 相同的固定 alpha：bid = alpha × pValue"""
+
+    def __init__(self, alpha: float = 65.0):
+        self.alpha = float(alpha)
+
+    def bid(self, p_values, adv, state):
+        return (self.alpha * p_values)[None, :]
+
+
+@register_strategy("budgetPacing")
+class BudgetPacingStrategy(BiddingStrategy):
+    """
+    按预算消耗进度调节 CPA 约束：花得比时间进度快就降价，慢就加价
+
+    alpha = CPA约束 × clip(1 + gain × (时间进度 - 预算进度), low, high)
+    """
+
+    def __init__(self, gain: float = 1.0, low: float = 0.5, high: float = 1.5):
+        self.gain = float(gain)
+        self.low = float(low)
+        self.high = float(high)
+
+    def bid(self, p_values, adv, state):
+        time_progress = state.time_step / state.total_steps
+        # 预算为 0 的广告主不出价
+        has_budget = state.budgets > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            budget_progress = 1 - np.where(has_budget, state.remaining_budget / state.budgets, 1.0)
+        factor = np.clip(1 + self.gain * (time_progress - budget_progress), self.low, self.high)
+        return np.where(has_budget, state.cpa_constraints * factor, 0.0)[:, adv] * p_values
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+OnlineLp 全量评估 (period × 广告主)
+===================================
+把 data/traffic/period-*.csv 中每个 (period, 广告主) 作为一个任务分发到进程池：
+- 每个 worker 只加载一次 alpha 模型；period 数据按 LRU 缓存，同一 period 的
+  全部广告主复用同一份流量
+- 任务结果完成一个写一行到 results.jsonl，中断后重新运行会跳过已完成的任务
+- 最后按 period 和行业汇总出排行榜：总得分、CPA 超约束数、预算使用率
+
+用法:
+    python sweep.py --workers 8
+    python sweep.py --output-dir data/sweep --seed 42
+"""
+
+import os
+import re
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set, Tuple
+
+from alpha_index import AlphaIndex
+from batch_simulator import PeriodSimulator
+from traffic_store import DEFAULT_TRAFFIC_DIR, find_period_files, open_period
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, "saved_model/onlineLpTest/period.csv")
+DEFAULT_OUTPUT_DIR = os.path.join(BASE_DIR, "data/sweep")
+RESULTS_FILE = "results.jsonl"
+
+# ==================== Worker 端 ====================
+
+_ALPHA_INDEX: Optional[AlphaIndex] = None
+_PERIOD_CACHE: "OrderedDict[str, Dict[int, pd.DataFrame]]" = OrderedDict()
+_PERIOD_CACHE_SIZE = 2
+
+
+def _init_worker(model_path: str, period_cache_size: int):
+    global _ALPHA_INDEX, _PERIOD_CACHE_SIZE
+    _ALPHA_INDEX = AlphaIndex.from_csv(model_path)
+    _PERIOD_CACHE_SIZE = period_cache_size
+
+
+def _load_period(data_path: str) -> Dict[int, pd.DataFrame]:
+    """按广告主拆分后的 period 流量，每个 worker 每个 period 只读取一次"""
+    if data_path in _PERIOD_CACHE:
+        _PERIOD_CACHE.move_to_end(data_path)
+        return _PERIOD_CACHE[data_path]
+    frame = open_period(data_path).load()
+    groups = {int(number): group for number, group in frame.groupby("advertiserNumber", sort=False)}
+    _PERIOD_CACHE[data_path] = groups
+    while len(_PERIOD_CACHE) > _PERIOD_CACHE_SIZE:
+        _PERIOD_CACHE.popitem(last=False)
+    return groups
+
+
+def job_seed(seed: int, period: str, advertiser_number: int) -> int:
+    """每个任务的随机种子只由 (seed, period, 广告主) 决定，保证断点续跑可复现"""
+    period_number = int(re.sub(r"\D", "", period) or 0)
+    return int(np.random.SeedSequence([seed, period_number, advertiser_number]).generate_state(1)[0])
+
+
+def run_jobs(period: str, data_path: str, advertiser_numbers: List[int], seed: int) -> List[Dict]:
+    """在 worker 中评估同一 period 的一批广告主"""
+    groups = _load_period(data_path)
+    records = []
+    for number in advertiser_numbers:
+        simulator = PeriodSimulator(groups[number], _ALPHA_INDEX, seed=job_seed(seed, period, number))
+        row = simulator.run().summary().iloc[0]
+        records.append({
+            "period": period,
+            "advertiser_number": int(number),
+            "category": int(row["category"]),
+            "budget": float(row["budget"]),
+            "cpa_constraint": float(row["cpa_constraint"]),
+            "total_cost": float(row["total_cost"]),
+            "total_conversion": float(row["total_conversion"]),
+            "total_wins": float(row["total_wins"]),
+            "real_cpa": float(row["real_cpa"]),
+            "budget_utilization": float(row["budget_utilization"]),
+            "cpa_violation": bool(row["real_cpa"] > row["cpa_constraint"]),
+            "score": float(row["score"]),
+        })
+    return records
+
+
+# ==================== 调度端 ====================
+
+def load_records(results_path: str) -> List[Dict]:
+    """读取 results.jsonl 的全部记录；忽略中断时写了一半的行"""
+    records = []
+    if not os.path.exists(results_path):
+        return records
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def load_done(results_path: str) -> Set[Tuple[str, int]]:
+    """已完成的 (period, 广告主)"""
+    return {(record["period"], record["advertiser_number"]) for record in load_records(results_path)}
+
+
+def truncate_partial_line(results_path: str):
+    """截掉中断时写了一半的最后一行（截断到最后一个换行符），续写的记录从新行开始"""
+    if not os.path.exists(results_path):
+        return
+    with open(results_path, "rb+") as f:
+        size = end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(end - 65536, 0)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end != size:
+            f.truncate(end)
+
+
+def plan_jobs(period_files: Dict[str, str], done: Set[Tuple[str, int]],
+              chunk_size: int) -> List[Tuple[str, str, List[int]]]:
+    """按 period 顺序切分任务，同一 period 的广告主分块提交以复用缓存"""
+    jobs = []
+    for period, data_path in period_files.items():
+        pending = [n for n in open_period(data_path).advertiser_numbers() if (period, n) not in done]
+        for start in range(0, len(pending), chunk_size):
+            jobs.append((period, data_path, pending[start:start + chunk_size]))
+    return jobs
+
+
+def build_leaderboard(results: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """按 period / 行业汇总"""
+    boards = {}
+    for key in ["period", "category"]:
+        grouped = results.groupby(key)
+        board = pd.DataFrame({
+            "advertisers": grouped.size(),
+            "total_score": grouped["score"].sum(),
+            "cpa_violations": grouped["cpa_violation"].sum(),
+            "total_cost": grouped["total_cost"].sum(),
+            "budget_utilization": grouped["total_cost"].sum() / grouped["budget"].sum(),
+        })
+        boards[key] = board.sort_values("total_score", ascending=False).reset_index()
+    return boards
+
+
+def run_sweep(traffic_dir: str = DEFAULT_TRAFFIC_DIR, model_path: str = DEFAULT_MODEL_PATH,
+              output_dir: str = DEFAULT_OUTPUT_DIR, workers: Optional[int] = None,
+              seed: int = 0, chunk_size: int = 8, period_cache_size: int = 2) -> Dict[str, pd.DataFrame]:
+    os.makedirs(output_dir, exist_ok=True)
+    results_path = os.path.join(output_dir, RESULTS_FILE)
+
+    period_files = find_period_files(traffic_dir)
+    done = load_done(results_path)
+    jobs = plan_jobs(period_files, done, chunk_size)
+    n_pending = sum(len(numbers) for _, _, numbers in jobs)
+    print(f"period: {len(period_files)}  已完成: {len(done)}  待运行: {n_pending}")
+
+    if jobs:
+        truncate_partial_line(results_path)
+        with open(results_path, "a", encoding="utf-8") as out, ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(model_path, period_cache_size)
+        ) as pool:
+            futures = [pool.submit(run_jobs, period, path, numbers, seed) for period, path, numbers in jobs]
+            finished = 0
+            for future in as_completed(futures):
+                for record in future.result():
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                finished += 1
+                print(f"  [{finished}/{len(futures)}] 批次完成")
+
+    results = pd.DataFrame(load_records(results_path))
+    if results.empty:
+        return {}
+    boards = build_leaderboard(results)
+    for key, board in boards.items():
+        board.to_csv(os.path.join(output_dir, f"leaderboard_{key}.csv"), index=False)
+    return boards
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OnlineLp 全量 period × 广告主评估")
+    parser.add_argument("--traffic-dir", default=DEFAULT_TRAFFIC_DIR)
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认等于 CPU 核数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=8, help="每个任务包含的广告主数")
+    parser.add_argument("--period-cache-size", type=int, default=2, help="每个 worker 缓存的 period 数")
+    args = parser.parse_args()
+
+    boards = run_sweep(args.traffic_dir, args.model, args.output_dir, args.workers,
+                       args.seed, args.chunk_size, args.period_cache_size)
+    for key, board in boards.items():
+        print(f"\n排行榜 (按 {key}):")
+        print(board.to_string(index=False))
+    print(f"\n✓ 结果目录: {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+时序指标存储
+============
+/api/metrics/trend 背后的内存时序库：每个广告计划一组序列，另有全部计划的合计序列。
+
+- 每个序列按分钟 / 小时 / 天三档固定间隔存储，每档是定长的环形 NumPy 数组
+  （分钟 2 天、小时 35 天、天 2 年），写满后覆盖最旧的格子，内存占用固定
+- 写入时同时累加到三档（分钟 → 小时 → 天的汇总随写入维护），批量写入按格子
+  bincount 合并后一次写入
+- 存储可加的量（spend、gmv、impressions、clicks、conversions），roi / ctr / cvr
+  在查询时由合计值计算
+- 查询取一档中 [start, end] 覆盖的格子；点数超过 max_points 时用 LTTB
+  (Largest-Triangle-Three-Buckets) 按第一个指标选出保留形状的点，其余指标取相同的点
+
+    store = TimeSeriesStore()
+    store.record(timestamps, {"spend": [...], "gmv": [...]}, campaign_ids=[...])
+    store.query(start, end, resolution="hour", max_points=200)
+
+启动时从 generate_mock_data.py 生成的 data/metrics_timeseries.json（全部计划合计，
+每小时一条）导入，时间整体按整小时平移到以当前小时结束。
+"""
+
+import os
+import json
+import time
+import threading
+import numpy as np
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SEED_PATH = os.path.join(BASE_DIR, "data/metrics_timeseries.json")
+
+# 可加的指标
+METRICS = ("spend", "gmv", "impressions", "clicks", "conversions")
+# 由合计值计算的比率：名称 -> (分子, 分母, 倍数)
+DERIVED = {
+    "roi": ("gmv", "spend", 1.0),
+    "ctr": ("clicks", "impressions", 100.0),
+    "cvr": ("conversions", "clicks", 100.0),
+}
+# 分辨率 -> (间隔秒数, 格子数)
+RESOLUTIONS = {
+    "minute": (60, 2 * 24 * 60),
+    "hour": (3600, 35 * 24),
+    "day": (86400, 2 * 366),
+}
+
+TOTAL = None  # 全部计划合计序列的 key
+
+
+class RingSeries:
+    """固定间隔的环形数组；格子 i 保存绝对时间片 slots[i] 的各指标合计"""
+
+    def __init__(self, interval: int, capacity: int, n_metrics: int = len(METRICS)):
+        self.interval = interval
+        self.capacity = capacity
+        self.values = np.zeros((n_metrics, capacity))
+        self.slots = np.full(capacity, -1, dtype=np.int64)
+        self.latest = -1
+
+    def add(self, slot_ids: np.ndarray, values: np.ndarray):
+        """按时间片累加；slot_ids 升序且唯一，values 形状 (指标数, len(slot_ids))"""
+        if len(slot_ids) == 0:
+            return
+        self.latest = max(self.latest, int(slot_ids[-1]))
+        # 已滑出保留范围的时间片丢弃
+        keep = slot_ids > self.latest - self.capacity
+        slot_ids, values = slot_ids[keep], values[:, keep]
+        cells = slot_ids % self.capacity
+        # 格子里是更早的时间片：清零后复用；是更晚的时间片：这条写入已过期
+        newer = slot_ids > self.slots[cells]
+        self.values[:, cells[newer]] = 0.0
+        self.slots[cells[newer]] = slot_ids[newer]
+        current = slot_ids == self.slots[cells]
+        self.values[:, cells[current]] += values[:, current]
+
+    def range(self, first_slot: int, last_slot: int) -> Tuple[np.ndarray, np.ndarray]:
+        """[first_slot, last_slot] 的 (时间片, 各指标)；没有数据的时间片为 0"""
+        slot_ids = np.arange(first_slot, last_slot + 1, dtype=np.int64)
+        cells = slot_ids % self.capacity
+        hit = self.slots[cells] == slot_ids
+        return slot_ids, np.where(hit, self.values[:, cells], 0.0)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets 降采样，返回保留点的下标（含首尾）"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # 首尾之外的点均分为 n_out - 2 个桶
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # 下一个桶的平均点（最后一个桶用末点）
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        # 与上一个选中点、下一个桶平均点组成的三角形面积最大的点
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+class TimeSeriesStore:
+    """按广告计划（及合计）保存分钟 / 小时 / 天三档环形序列"""
+
+    def __init__(self, resolutions: Dict[str, Tuple[int, int]] = RESOLUTIONS):
+        self.resolutions = resolutions
+        self._series: Dict[Optional[int], Dict[str, RingSeries]] = {}
+        self._lock = threading.Lock()
+
+    def _get_series(self, key: Optional[int]) -> Dict[str, RingSeries]:
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = {name: RingSeries(interval, capacity)
+                                          for name, (interval, capacity) in self.resolutions.items()}
+        return series
+
+    def record(self, timestamps: Sequence[float], values: Dict[str, Sequence[float]],
+               campaign_ids: Optional[Sequence[int]] = None):
+        """
+        批量写入：timestamps 为 Unix 秒，values 为各指标的等长数组（缺失的指标记 0）；
+        给出 campaign_ids 时同时计入各计划的序列，合计序列总是计入
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        columns = np.zeros((len(METRICS), len(timestamps)))
+        for i, metric in enumerate(METRICS):
+            if metric in values:
+                columns[i] = values[metric]
+        groups = [(TOTAL, np.arange(len(timestamps)))]
+        if campaign_ids is not None:
+            # 按计划排序后切分，每个计划一段行号
+            campaign_ids = np.asarray(campaign_ids, dtype=np.int64)
+            order = np.argsort(campaign_ids, kind="stable")
+            keys, starts = np.unique(campaign_ids[order], return_index=True)
+            groups += list(zip(keys.tolist(), np.split(order, starts[1:])))
+
+        with self._lock:
+            for key, rows in groups:
+                series = self._get_series(key)
+                for ring in series.values():
+                    slot_ids, inverse = np.unique((timestamps[rows] // ring.interval).astype(np.int64),
+                                                  return_inverse=True)
+                    sums = np.stack([np.bincount(inverse, weights=column, minlength=len(slot_ids))
+                                     for column in columns[:, rows]])
+                    ring.add(slot_ids, sums)
+
+    def query(self, start: float, end: float, resolution: str = "hour", campaign_id: Optional[int] = TOTAL,
+              metrics: Iterable[str] = ("spend", "gmv", "roi"), max_points: Optional[int] = None
+              ) -> Dict[str, np.ndarray]:
+        """
+        [start, end] 内按 resolution 分桶的指标，另含 "timestamp"（每桶起点，Unix 秒）；
+        范围超出该档保留时长时 ValueError
+        """
+        if resolution not in self.resolutions:
+            raise ValueError(f"不支持的分辨率: {resolution}")
+        interval, capacity = self.resolutions[resolution]
+        first_slot, last_slot = int(start // interval), int(end // interval)
+        if last_slot - first_slot + 1 > capacity:
+            raise ValueError(f"{resolution} 分辨率最多保留 {capacity} 个时间点")
+        metrics = list(metrics)
+        unknown = [metric for metric in metrics if metric not in METRICS and metric not in DERIVED]
+        if unknown:
+            raise ValueError(f"未知指标: {', '.join(unknown)}")
+
+        with self._lock:
+            series = self._series.get(campaign_id)
+            if series is None:
+                slot_ids = np.arange(first_slot, last_slot + 1, dtype=np.int64)
+                sums = np.zeros((len(METRICS), len(slot_ids)))
+            else:
+                slot_ids, sums = series[resolution].range(first_slot, last_slot)
+
+        columns = dict(zip(METRICS, sums))
+        result = {"timestamp": slot_ids * float(interval)}
+        for metric in metrics:
+            if metric in DERIVED:
+                numerator, denominator, scale = DERIVED[metric]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    ratio = columns[numerator] / columns[denominator] * scale
+                result[metric] = np.where(columns[denominator] > 0, ratio, 0.0)
+            else:
+                result[metric] = columns[metric]
+
+        if max_points is not None and len(slot_ids) > max_points and metrics:
+            keep = lttb(result["timestamp"], result[metrics[0]], max_points)
+            result = {name: column[keep] for name, column in result.items()}
+        return result
+
+    def seed_from_json(self, path: str = SEED_PATH, now: Optional[float] = None) -> int:
+        """导入 metrics_timeseries.json 到合计序列，整体平移到以当前小时结束，返回条数"""
+        if not os.path.exists(path):
+            return 0
+        with open(path, encoding="utf-8") as f:
+            records: List[Dict] = json.load(f)
+        if not records:
+            return 0
+        timestamps = np.array([datetime.fromisoformat(record["timestamp"]).timestamp() for record in records])
+        now = time.time() if now is None else now
+        shift_hours = now // 3600 - timestamps.max() // 3600
+        self.record(timestamps + shift_hours * 3600,
+                    {metric: [record.get(metric, 0) for record in records] for metric in METRICS})
+        return len(records)
+
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(ring.values.nbytes + ring.slots.nbytes
+                       for series in self._series.values() for ring in series.values())
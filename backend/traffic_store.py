@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分区列式流量存储
+================
+把 data/traffic/period-*.csv（以及 -rlData 转换文件）转换为按 period 分目录、
+按广告主分区、组内按 timeStepIndex 排序的 .npy 列文件，可直接 mmap 读取：
+
+    traffic_store/
+    └── period-7/
+        ├── meta.json            # 广告主分区表: 编号 / 行业 / 预算 / CPA约束 / 行范围
+        ├── step_offsets.npy     # (广告主数, 49) 每个时间步的起始行
+        ├── timeStepIndex.npy    # int8
+        ├── pValue.npy           # float32
+        └── leastWinningCost.npy # float32
+
+广告主级常量（行业、预算、CPA 约束）只在 meta.json 中保存一份，不再逐行存储。
+读取时只映射需要的列和需要的广告主行范围。
+
+open_step_stream() 按时间步流式读取一个 period，供内存放不下整期流量时使用：
+列式分区直接按 step_offsets 从 mmap 中取出每一步的行；CSV 先分块扫描一遍，
+按时间步把行追加到临时文件，之后每次只读取一个时间步。
+
+用法:
+    python traffic_store.py                      # 转换 data/traffic 下全部 period
+    python traffic_store.py --traffic-dir <dir>  # 指定流量目录
+"""
+
+import os
+import re
+import glob
+import json
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TRAFFIC_DIR = os.path.join(BASE_DIR, "data/traffic")
+DEFAULT_STORE_DIR = os.path.join(BASE_DIR, "data/traffic_store")
+
+TOTAL_STEPS = 48
+
+TRAFFIC_COLUMNS = [
+    "advertiserNumber", "advertiserCategoryIndex", "budget", "CPAConstraint",
+    "timeStepIndex", "pValue", "leastWinningCost",
+]
+
+# CSV 读取时使用的紧凑类型
+CSV_DTYPES = {
+    "advertiserNumber": np.int32,
+    "advertiserCategoryIndex": np.int16,
+    "budget": np.float64,
+    "CPAConstraint": np.float64,
+    "timeStepIndex": np.int8,
+    "pValue": np.float32,
+    "leastWinningCost": np.float32,
+}
+
+# 逐行存储的列；其余列是广告主级常量，保存在 meta.json 中
+ROW_COLUMNS = ["timeStepIndex", "pValue", "leastWinningCost"]
+ADVERTISER_COLUMNS = {
+    "advertiserNumber": "advertiser_number",
+    "advertiserCategoryIndex": "category",
+    "budget": "budget",
+    "CPAConstraint": "cpa_constraint",
+}
+
+
+def resolve_data_path(data_path: str) -> str:
+    """原始流量文件不存在时回退到 -rlData 转换文件"""
+    if os.path.exists(data_path):
+        return data_path
+    rl_data_path = data_path.replace(".csv", "-rlData.csv").replace("traffic/", "traffic/training_data_rlData_folder/")
+    if os.path.exists(rl_data_path):
+        return rl_data_path
+    raise FileNotFoundError(f"数据文件未找到: {data_path}")
+
+
+def period_name(data_path: str) -> str:
+    """period-7.csv / period-7-rlData.csv -> period-7"""
+    name = os.path.splitext(os.path.basename(data_path))[0]
+    return re.sub(r"-rlData$", "", name)
+
+
+# ==================== 转换 ====================
+
+def _read_chunks(csv_path: str, chunksize: int):
+    return pd.read_csv(csv_path, usecols=TRAFFIC_COLUMNS, dtype=CSV_DTYPES, chunksize=chunksize)
+
+
+def ingest_period(csv_path: str, store_dir: str = DEFAULT_STORE_DIR,
+                  chunksize: int = 1_000_000) -> str:
+    """
+    把单个 period CSV 转换为列式分区，返回分区目录
+
+    分块扫描两遍，内存上限为一个数据块（另加每个广告主 48 个计数）：
+    第一遍统计每个 (广告主, 时间步) 的行数并记录广告主级常量，由此得到每组的起始行；
+    第二遍把每块的行按组内到达顺序写入 mmap 打开的 .npy 列文件中各自的位置。
+    """
+    csv_path = resolve_data_path(csv_path)
+
+    # 第一遍：广告主按首次出现顺序编号（保持与原始文件一致的自动选择顺序），逐组计数
+    advertisers: Dict[int, Dict] = {}
+    counts: Dict[int, np.ndarray] = {}
+    rows = 0
+    for chunk in _read_chunks(csv_path, chunksize):
+        steps = chunk["timeStepIndex"].to_numpy()
+        if len(steps) and (steps.min() < 0 or steps.max() >= TOTAL_STEPS):
+            raise ValueError(f"{csv_path}: timeStepIndex 超出 0..{TOTAL_STEPS - 1}")
+        uniques, first_rows, inverse = np.unique(chunk["advertiserNumber"].to_numpy(),
+                                                 return_index=True, return_inverse=True)
+        step_counts = np.bincount(inverse * TOTAL_STEPS + steps,
+                                  minlength=len(uniques) * TOTAL_STEPS).reshape(len(uniques), TOTAL_STEPS)
+        for position in np.argsort(first_rows, kind="stable"):
+            number, row = int(uniques[position]), first_rows[position]
+            if number not in advertisers:
+                advertisers[number] = {
+                    "advertiser_number": number,
+                    "category": int(chunk["advertiserCategoryIndex"].iat[row]),
+                    "budget": float(chunk["budget"].iat[row]),
+                    "cpa_constraint": float(chunk["CPAConstraint"].iat[row]),
+                }
+                counts[number] = np.zeros(TOTAL_STEPS, dtype=np.int64)
+            counts[number] += step_counts[position]
+        rows += len(chunk)
+
+    # 每组的起始行：广告主按出现顺序、组内按时间步
+    numbers = list(advertisers)
+    group_counts = np.array([counts[number] for number in numbers], dtype=np.int64).reshape(-1, TOTAL_STEPS)
+    group_starts = np.concatenate([[0], np.cumsum(group_counts.ravel())])
+    step_offsets = np.concatenate([group_starts[:-1].reshape(-1, TOTAL_STEPS),
+                                   group_starts[TOTAL_STEPS::TOTAL_STEPS, None]], axis=1)
+    for adv, number in enumerate(numbers):
+        advertisers[number].update(start=int(step_offsets[adv, 0]), end=int(step_offsets[adv, -1]))
+
+    out_dir = os.path.join(store_dir, period_name(csv_path))
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # 重写期间分区不完整
+
+    # 第二遍：每块按 (广告主, 时间步) 稳定排序，写到该组的下一个空位
+    outputs = {column: np.lib.format.open_memmap(os.path.join(out_dir, f"{column}.npy"), mode="w+",
+                                                 dtype=CSV_DTYPES[column], shape=(rows,))
+               for column in ROW_COLUMNS}
+    sorted_numbers = np.array(sorted(numbers), dtype=np.int64)
+    rank = {number: adv for adv, number in enumerate(numbers)}
+    rank_of_sorted = np.array([rank[number] for number in sorted_numbers.tolist()], dtype=np.int64)
+    cursor = group_starts[:-1].copy()
+    for chunk in _read_chunks(csv_path, chunksize):
+        adv = rank_of_sorted[np.searchsorted(sorted_numbers, chunk["advertiserNumber"].to_numpy())]
+        keys = adv * TOTAL_STEPS + chunk["timeStepIndex"].to_numpy()
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        first_in_group = np.searchsorted(sorted_keys, sorted_keys, side="left")
+        destination = cursor[sorted_keys] + (np.arange(len(order)) - first_in_group)
+        for column, output in outputs.items():
+            output[destination] = chunk[column].to_numpy()[order]
+        cursor += np.bincount(keys, minlength=len(cursor))
+    for output in outputs.values():
+        output.flush()
+    del outputs
+    np.save(os.path.join(out_dir, "step_offsets.npy"), step_offsets)
+
+    # meta.json 最后写入，作为分区完整的标记
+    meta = {
+        "source": os.path.abspath(csv_path),
+        "source_mtime": os.path.getmtime(csv_path),
+        "rows": rows,
+        "total_steps": TOTAL_STEPS,
+        "columns": {column: np.dtype(CSV_DTYPES[column]).name for column in ROW_COLUMNS},
+        "advertisers": list(advertisers.values()),
+    }
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return out_dir
+
+
+def store_is_current(target_dir: str, source: str) -> bool:
+    """
+    target_dir 完整（meta.json 存在），且 meta.json 记录的源文件就是 source、
+    修改时间未变；源文件改动过或同名的另一个文件都视为过期
+    """
+    meta_path = os.path.join(target_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    return (meta.get("source") == os.path.abspath(source)
+            and meta.get("source_mtime") == os.path.getmtime(source))
+
+
+def find_period_files(traffic_dir: str = DEFAULT_TRAFFIC_DIR) -> Dict[str, str]:
+    """列出全部 period 文件，原始 CSV 优先于 -rlData 转换文件"""
+    files = {}
+    rl_pattern = os.path.join(traffic_dir, "training_data_rlData_folder", "period-*-rlData.csv")
+    for path in sorted(glob.glob(rl_pattern)) + sorted(glob.glob(os.path.join(traffic_dir, "period-*.csv"))):
+        files[period_name(path)] = path
+    return dict(sorted(files.items(), key=lambda item: int(re.sub(r"\D", "", item[0]) or 0)))
+
+
+# ==================== 读取 ====================
+
+class StorePeriodReader:
+    """从列式分区读取一个 period"""
+
+    def __init__(self, period_dir: str):
+        self.period_dir = period_dir
+        self.source = period_dir
+        with open(os.path.join(period_dir, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self._by_number = {a["advertiser_number"]: i for i, a in enumerate(self.meta["advertisers"])}
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.period_dir, f"{name}.npy"), mmap_mode="r")
+        return self._columns[name]
+
+    @property
+    def step_offsets(self) -> np.ndarray:
+        return self.column("step_offsets")
+
+    def advertiser_numbers(self) -> List[int]:
+        return [a["advertiser_number"] for a in self.meta["advertisers"]]
+
+    def advertisers(self) -> pd.DataFrame:
+        """广告主分区表"""
+        return pd.DataFrame(self.meta["advertisers"])
+
+    def load(self, advertiser_number: Optional[int] = None, columns: List[str] = TRAFFIC_COLUMNS) -> pd.DataFrame:
+        """读取单个广告主（或整个 period）的指定列"""
+        if advertiser_number is None:
+            ranges = [(a, a["start"], a["end"]) for a in self.meta["advertisers"]]
+        else:
+            if advertiser_number not in self._by_number:
+                return pd.DataFrame(columns=columns)
+            adv = self.meta["advertisers"][self._by_number[advertiser_number]]
+            ranges = [(adv, adv["start"], adv["end"])]
+
+        data = {}
+        for column in columns:
+            if column in ADVERTISER_COLUMNS:
+                key = ADVERTISER_COLUMNS[column]
+                parts = [np.full(end - start, a[key], dtype=CSV_DTYPES[column]) for a, start, end in ranges]
+            else:
+                parts = [np.asarray(self.column(column)[start:end]) for _, start, end in ranges]
+            data[column] = np.concatenate(parts) if parts else np.empty(0, dtype=CSV_DTYPES[column])
+        return pd.DataFrame(data)
+
+
+class CsvPeriodReader:
+    """列式分区不存在时直接读取 CSV，只读取需要的列并使用紧凑类型"""
+
+    def __init__(self, data_path: str, chunksize: int = 1_000_000):
+        self.source = resolve_data_path(data_path)
+        self.chunksize = chunksize
+
+    def advertiser_numbers(self) -> List[int]:
+        numbers = pd.read_csv(self.source, usecols=["advertiserNumber"], dtype=CSV_DTYPES)["advertiserNumber"]
+        return [int(n) for n in numbers.unique()]
+
+    def load(self, advertiser_number: Optional[int] = None, columns: List[str] = TRAFFIC_COLUMNS) -> pd.DataFrame:
+        usecols = list(dict.fromkeys(list(columns) + ["advertiserNumber"]))
+        dtypes = {column: CSV_DTYPES[column] for column in usecols}
+        parts = []
+        for chunk in pd.read_csv(self.source, usecols=usecols, dtype=dtypes, chunksize=self.chunksize):
+            if advertiser_number is not None:
+                chunk = chunk[chunk["advertiserNumber"] == advertiser_number]
+            parts.append(chunk[list(columns)])
+        return pd.concat(parts, ignore_index=True)
+
+
+def open_period(data_path: str, store_dir: str = DEFAULT_STORE_DIR):
+    """
+    优先使用列式分区，分区缺失或过期（不是由这个文件、或由修改前的文件转换而来）时回退到 CSV；
+    源文件不存在时直接使用分区
+    """
+    period_dir = os.path.join(store_dir, period_name(data_path))
+    try:
+        source = resolve_data_path(data_path)
+    except FileNotFoundError:
+        if os.path.exists(os.path.join(period_dir, "meta.json")):
+            return StorePeriodReader(period_dir)
+        raise
+    if store_is_current(period_dir, source):
+        return StorePeriodReader(period_dir)
+    return CsvPeriodReader(source)
+
+
+# ==================== 按时间步流式读取 ====================
+
+class StoreStepStream:
+    """从列式分区按时间步读取，每步只从 mmap 中取出各广告主在该步的行范围"""
+
+    def __init__(self, reader: StorePeriodReader, total_steps: int = TOTAL_STEPS):
+        if total_steps > reader.meta["total_steps"]:
+            raise ValueError(f"列式分区只有 {reader.meta['total_steps']} 个时间步")
+        table = reader.advertisers()
+        # 广告主按编号排序，与 PeriodSimulator 的广告主下标一致
+        self._order = np.argsort(table["advertiser_number"].to_numpy(), kind="stable")
+        self.advertisers = table.iloc[self._order][list(ADVERTISER_COLUMNS.values())].reset_index(drop=True)
+        self.reader = reader
+        self.source = reader.source
+        self.total_steps = total_steps
+        self.rows = reader.meta["rows"]
+
+    def iter_steps(self, first_step: int = 0):
+        """依次给出 (时间步, 广告主下标, pValue, leastWinningCost)，行按 (广告主, 到达顺序) 排列"""
+        offsets = np.asarray(self.reader.step_offsets)[self._order]
+        p_values = self.reader.column("pValue")
+        least_winning_costs = self.reader.column("leastWinningCost")
+        adv_ids = np.arange(len(self._order))
+        for time_step in range(first_step, self.total_steps):
+            starts = offsets[:, time_step]
+            lengths = offsets[:, time_step + 1] - starts
+            ends = np.cumsum(lengths)
+            rows = np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - (ends - lengths), lengths)
+            yield (time_step, np.repeat(adv_ids, lengths),
+                   p_values[rows].astype(np.float64), least_winning_costs[rows].astype(np.float64))
+
+    def close(self):
+        pass
+
+
+class CsvStepStream:
+    """
+    CSV 按时间步流式读取
+
+    CSV 中的行不按时间步排序：构造时分块扫描一遍，把每个时间步的
+    (广告主编号, pValue, leastWinningCost) 按到达顺序追加到 spill_dir/step-XX.bin，
+    同时记录广告主级常量。内存上限为一个数据块或一个时间步的流量。
+    spill_dir 为空时使用临时目录，close() 时删除。
+    """
+
+    SPILL_DTYPE = np.dtype([
+        ("advertiserNumber", np.int32), ("pValue", np.float32), ("leastWinningCost", np.float32),
+    ])
+
+    def __init__(self, data_path: str, total_steps: int = TOTAL_STEPS, chunksize: int = 1_000_000,
+                 spill_dir: Optional[str] = None):
+        self.source = resolve_data_path(data_path)
+        self.total_steps = total_steps
+        self._tmp = None
+        if spill_dir is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix=f"{period_name(data_path)}-steps-")
+            spill_dir = self._tmp.name
+        os.makedirs(spill_dir, exist_ok=True)
+        self.spill_dir = spill_dir
+        self.rows = 0
+        self.advertisers = self._spill(chunksize)
+
+    def _step_path(self, time_step: int) -> str:
+        return os.path.join(self.spill_dir, f"step-{time_step:02d}.bin")
+
+    def _spill(self, chunksize: int) -> pd.DataFrame:
+        first_seen: Dict[int, Dict] = {}
+        files = [open(self._step_path(t), "wb") for t in range(self.total_steps)]
+        try:
+            for chunk in pd.read_csv(self.source, usecols=TRAFFIC_COLUMNS, dtype=CSV_DTYPES, chunksize=chunksize):
+                numbers = chunk["advertiserNumber"].to_numpy()
+                uniques, first_rows = np.unique(numbers, return_index=True)
+                for number, row in zip(uniques.tolist(), first_rows):
+                    if number not in first_seen:
+                        first_seen[number] = {
+                            "advertiser_number": number,
+                            "category": int(chunk["advertiserCategoryIndex"].iat[row]),
+                            "budget": float(chunk["budget"].iat[row]),
+                            "cpa_constraint": float(chunk["CPAConstraint"].iat[row]),
+                        }
+
+                # 块内按时间步稳定排序，同一时间步保持到达顺序
+                steps = chunk["timeStepIndex"].to_numpy()
+                order = np.argsort(steps, kind="stable")
+                records = np.empty(len(chunk), dtype=self.SPILL_DTYPE)
+                for column in self.SPILL_DTYPE.names:
+                    records[column] = chunk[column].to_numpy()[order]
+                bounds = np.searchsorted(steps[order], np.arange(self.total_steps + 1), side="left")
+                for time_step in range(self.total_steps):
+                    if bounds[time_step] < bounds[time_step + 1]:
+                        records[bounds[time_step]:bounds[time_step + 1]].tofile(files[time_step])
+                self.rows += len(chunk)
+        finally:
+            for f in files:
+                f.close()
+        advertisers = pd.DataFrame(list(first_seen.values()), columns=list(ADVERTISER_COLUMNS.values()))
+        return advertisers.sort_values("advertiser_number").reset_index(drop=True)
+
+    def iter_steps(self, first_step: int = 0):
+        """依次给出 (时间步, 广告主下标, pValue, leastWinningCost)，行按 (广告主, 到达顺序) 排列"""
+        numbers = self.advertisers["advertiser_number"].to_numpy()
+        for time_step in range(first_step, self.total_steps):
+            records = np.fromfile(self._step_path(time_step), dtype=self.SPILL_DTYPE)
+            adv = np.searchsorted(numbers, records["advertiserNumber"])
+            order = np.argsort(adv, kind="stable")
+            yield (time_step, adv[order], records["pValue"][order].astype(np.float64),
+                   records["leastWinningCost"][order].astype(np.float64))
+
+    def close(self):
+        if self._tmp is not None:
+            self._tmp.cleanup()
+            self._tmp = None
+
+
+def open_step_stream(data_path: str, store_dir: str = DEFAULT_STORE_DIR, total_steps: int = TOTAL_STEPS,
+                     chunksize: int = 1_000_000, spill_dir: Optional[str] = None):
+    """优先使用列式分区，否则分块扫描 CSV"""
+    reader = open_period(data_path, store_dir)
+    if isinstance(reader, StorePeriodReader):
+        return StoreStepStream(reader, total_steps)
+    return CsvStepStream(data_path, total_steps, chunksize, spill_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流量 CSV -> 列式分区")
+    parser.add_argument("--traffic-dir", default=DEFAULT_TRAFFIC_DIR)
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--chunksize", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    files = find_period_files(args.traffic_dir)
+    if not files:
+        print(f"未找到流量文件: {args.traffic_dir}")
+        return
+
+    print(f"转换 {len(files)} 个 period 至: {args.store_dir}")
+    for name, path in files.items():
+        out_dir = ingest_period(path, args.store_dir, args.chunksize)
+        with open(os.path.join(out_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        print(f"  ✓ {name}: {meta['rows']} 行, {len(meta['advertisers'])} 个广告主")
+
+
+if __name__ == "__main__":
+    main()
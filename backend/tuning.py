@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+OnlineLp 策略参数搜索
+=====================
+get_alpha 中的两个参数：
+- cpa_cap: alpha 不超过 cpa_cap × CPA约束（默认 1.5）
+- budget_factor: 查表条件 cum_cost > budget_factor × 剩余预算（默认 1.0）
+
+流量与模型只加载一次；候选参数作为 PeriodSimulator 的轨迹维度批量回放，
+所有候选共用同一组随机数（common random numbers），按 calculate_score 总分排序。
+
+用法:
+    python tuning.py --cpa-caps 1.0,1.25,1.5,2.0 --budget-factors 0.5,0.8,1.0,1.2
+    python tuning.py --mode random --samples 200 --data data/traffic/period-6.csv data/traffic/period-7.csv
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Sequence, Tuple, Union
+
+from alpha_index import AlphaIndex
+from batch_simulator import PeriodSimulator
+from strategies import DEFAULT_BUDGET_FACTOR, DEFAULT_CPA_CAP
+from traffic_store import open_period
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, "saved_model/onlineLpTest/period.csv")
+
+
+def grid_candidates(cpa_caps: Sequence[float], budget_factors: Sequence[float]) -> pd.DataFrame:
+    """网格搜索候选：两组取值的笛卡尔积"""
+    caps, factors = np.meshgrid(np.asarray(cpa_caps, dtype=np.float64),
+                                np.asarray(budget_factors, dtype=np.float64), indexing="ij")
+    return pd.DataFrame({"cpa_cap": caps.ravel(), "budget_factor": factors.ravel()})
+
+
+def random_candidates(n_samples: int, cpa_cap_range: Tuple[float, float] = (0.8, 2.5),
+                      budget_factor_range: Tuple[float, float] = (0.3, 2.0),
+                      seed: Optional[int] = None) -> pd.DataFrame:
+    """随机搜索候选：在给定区间内均匀采样；默认参数总是包含在内作为基线"""
+    rng = np.random.default_rng(seed)
+    candidates = pd.DataFrame({
+        "cpa_cap": rng.uniform(*cpa_cap_range, n_samples),
+        "budget_factor": rng.uniform(*budget_factor_range, n_samples),
+    })
+    baseline = pd.DataFrame({"cpa_cap": [DEFAULT_CPA_CAP], "budget_factor": [DEFAULT_BUDGET_FACTOR]})
+    return pd.concat([baseline, candidates], ignore_index=True)
+
+
+def evaluate_candidates(traffic: Union[str, pd.DataFrame, List], model: Union[str, AlphaIndex],
+                        candidates: pd.DataFrame, seed: Optional[int] = None,
+                        budget_mode: str = "proportional", substeps: int = 1,
+                        batch_size: int = 64) -> pd.DataFrame:
+    """
+    评估全部候选参数，返回按总得分降序排列的结果表
+
+    traffic 可以是单个 period（路径或 DataFrame）或多个 period 的列表；
+    batch_size 控制一次回放中同时评估的候选数，以限制 (候选数 × 流量数) 矩阵的内存。
+    """
+    alpha_index = model if isinstance(model, AlphaIndex) else AlphaIndex.from_csv(model)
+    periods = traffic if isinstance(traffic, list) else [traffic]
+    candidates = candidates.reset_index(drop=True)
+    n_candidates = len(candidates)
+
+    totals = {name: np.zeros(n_candidates) for name in
+              ["total_score", "total_cost", "total_conversion", "total_budget", "cpa_violations", "advertisers"]}
+
+    for period in periods:
+        if isinstance(period, str):
+            period = open_period(period).load()
+        simulator = PeriodSimulator(period, alpha_index, seed=seed, budget_mode=budget_mode, substeps=substeps)
+        cpa_constraints = simulator.advertisers["cpa_constraint"].to_numpy()
+        budgets = simulator.advertisers["budget"].to_numpy()
+
+        for start in range(0, n_candidates, batch_size):
+            batch = candidates.iloc[start:start + batch_size]
+            result = simulator.run(
+                n_replicates=len(batch),
+                cpa_cap=batch["cpa_cap"].to_numpy(),
+                budget_factor=batch["budget_factor"].to_numpy(),
+                common_random_numbers=True,
+            )
+            lane_totals = result.lane_totals()
+            rows = slice(start, start + len(batch))
+            totals["total_score"][rows] += lane_totals["score"].sum(axis=1)
+            totals["total_cost"][rows] += lane_totals["total_cost"].sum(axis=1)
+            totals["total_conversion"][rows] += lane_totals["total_conversion"].sum(axis=1)
+            totals["total_budget"][rows] += budgets.sum()
+            totals["cpa_violations"][rows] += (lane_totals["real_cpa"] > cpa_constraints).sum(axis=1)
+            totals["advertisers"][rows] += simulator.n_advertisers
+
+    ranked = candidates.copy()
+    ranked["total_score"] = totals["total_score"]
+    ranked["mean_score"] = totals["total_score"] / np.maximum(totals["advertisers"], 1)
+    ranked["total_conversion"] = totals["total_conversion"]
+    ranked["cpa_violations"] = totals["cpa_violations"].astype(int)
+    ranked["budget_utilization"] = totals["total_cost"] / np.maximum(totals["total_budget"], 1e-10)
+    ranked = ranked.sort_values("total_score", ascending=False, kind="stable").reset_index(drop=True)
+    ranked.insert(0, "rank", np.arange(1, len(ranked) + 1))
+    return ranked
+
+
+def _parse_floats(text: str) -> List[float]:
+    return [float(x) for x in text.split(",") if x.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OnlineLp 策略参数网格 / 随机搜索")
+    parser.add_argument("--data", nargs="+", default=[os.path.join(BASE_DIR, "data/traffic/period-7.csv")])
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--mode", choices=["grid", "random"], default="grid")
+    parser.add_argument("--cpa-caps", default="1.0,1.25,1.5,1.75,2.0")
+    parser.add_argument("--budget-factors", default="0.5,0.75,1.0,1.25,1.5")
+    parser.add_argument("--samples", type=int, default=100, help="随机搜索的采样数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--budget-mode", choices=PeriodSimulator.BUDGET_MODES, default="proportional")
+    parser.add_argument("--substeps", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=64, help="一次回放中同时评估的候选数")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", default=None, help="完整排名 CSV 输出路径")
+    args = parser.parse_args()
+
+    if args.mode == "grid":
+        candidates = grid_candidates(_parse_floats(args.cpa_caps), _parse_floats(args.budget_factors))
+    else:
+        candidates = random_candidates(args.samples, seed=args.seed)
+
+    print(f"评估 {len(candidates)} 组参数, {len(args.data)} 个 period ...")
+    ranked = evaluate_candidates(args.data, args.model, candidates, seed=args.seed,
+                                 budget_mode=args.budget_mode, substeps=args.substeps,
+                                 batch_size=args.batch_size)
+    print(ranked.head(args.top).to_string(index=False))
+
+    if args.output:
+        ranked.to_csv(args.output, index=False)
+        print(f"✓ 已保存至: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -30,21 +30,41 @@ export default function CampaignSimulationModal({ campaign, onClose }) {
     const [data, setData] = useState(null);
     const [currentStep, setCurrentStep] = useState(0);
     const [isPlaying, setIsPlaying] = useState(false);
+    const [streaming, setStreaming] = useState(true);
     const playIntervalRef = useRef(null);
 
     useEffect(() => {
-        async function fetchData() {
-            try {
-                const result = await api.simulateBidding(campaign.id);
-                setData(result);
-                setLoading(false);
-            } catch (err) {
-                console.error("Simulation failed:", err);
-                setError(err.message || '加载失败');
+        // 逐步接收模拟结果：第一个时间步到达即开始展示，每帧最多重绘一次
+        const history = [];
+        let frame = null;
+        const flush = () => {
+            frame = null;
+            setData(prev => prev && { ...prev, history: history.slice() });
+            setLoading(false);
+        };
+
+        setLoading(true);
+        setStreaming(true);
+        const close = api.streamSimulation(campaign.id, 48, {
+            onMeta: (meta) => setData({ meta, history: [] }),
+            onStep: (step) => {
+                history.push(step);
+                if (frame === null) frame = requestAnimationFrame(flush);
+            },
+            onDone: () => setStreaming(false),
+            onError: (message) => {
+                console.error("Simulation failed:", message);
+                setError(message || '加载失败');
+                setStreaming(false);
                 setLoading(false);
-            }
-        }
-        fetchData();
+            },
+        });
+
+        // 关闭弹窗时断开连接，服务端随之停止模拟
+        return () => {
+            close();
+            if (frame !== null) cancelAnimationFrame(frame);
+        };
     }, [campaign.id]);
 
     useEffect(() => {
@@ -117,7 +137,7 @@ export default function CampaignSimulationModal({ campaign, onClose }) {
         );
     }
 
-    if (!data) return null;
+    if (!data || data.history.length === 0) return null;
 
     const currentData = data.history[currentStep];
     const maxSteps = data.history.length - 1;
@@ -147,6 +167,7 @@ export default function CampaignSimulationModal({ campaign, onClose }) {
                         </h2>
                         <p className="text-sm text-slate-500 mt-1">
                             基于 OnlineLp 算法还原历史竞价过程 · 步长: {currentStep}/{maxSteps}
+                            {streaming && ' · 模拟中...'}
                         </p>
                     </div>
                     <button
@@ -102,9 +102,11 @@ export async function getRealtimeMetrics() {
 
 /**
  * 获取趋势数据
+ * options: { resolution: 'minute' | 'hour' | 'day', campaign_id, max_points }
  */
-export async function getMetricsTrend(hours = 24) {
-    return request(`/api/metrics/trend?hours=${hours}`);
+export async function getMetricsTrend(hours = 24, options = {}) {
+    const queryString = new URLSearchParams({ hours, ...options }).toString();
+    return request(`/api/metrics/trend?${queryString}`);
 }
 
 // ==================== 竞价 API ====================
@@ -124,14 +126,46 @@ export async function calculateBid(campaignId, pValue, userFeatures = {}) {
 }
 
 /**
- * 模拟竞价过程
+ * 模拟竞价过程 (传入 seed 时结果可复现)
  */
-export async function simulateBidding(campaignId, steps = 48) {
-    return request(`/api/bidding/simulate?campaign_id=${campaignId}&steps=${steps}`, {
+export async function simulateBidding(campaignId, steps = 48, seed = null) {
+    const seedParam = seed === null ? '' : `&seed=${seed}`;
+    return request(`/api/bidding/simulate?campaign_id=${campaignId}&steps=${steps}${seedParam}`, {
         method: 'POST',
     });
 }
 
+/**
+ * 流式竞价模拟 (Server-Sent Events)，逐步回调：
+ * onMeta(meta) → 每个时间步 onStep(step) → onDone()；出错时 onError(message)
+ * 返回关闭函数，关闭连接后服务端停止计算
+ */
+export function streamSimulation(campaignId, steps = 48, handlers = {}, seed = null) {
+    const { onMeta, onStep, onDone, onError } = handlers;
+    const seedParam = seed === null ? '' : `&seed=${seed}`;
+    const source = new EventSource(
+        `${API_BASE_URL}/api/bidding/simulate/stream?campaign_id=${campaignId}&steps=${steps}${seedParam}`
+    );
+
+    source.addEventListener('meta', (e) => onMeta?.(JSON.parse(e.data)));
+    source.addEventListener('step', (e) => onStep?.(JSON.parse(e.data)));
+    source.addEventListener('done', () => {
+        source.close();
+        onDone?.();
+    });
+    source.addEventListener('failed', (e) => {
+        source.close();
+        onError?.(JSON.parse(e.data).detail);
+    });
+    // 连接失败或中断（EventSource 默认会自动重连，重连会从头重新模拟，这里不重连）
+    source.onerror = () => {
+        source.close();
+        onError?.('模拟数据流连接失败');
+    };
+
+    return () => source.close();
+}
+
 // ==================== AI 诊断 API ====================
 
 /**
@@ -170,6 +204,7 @@ export default {
     getMetricsTrend,
     calculateBid,
     simulateBidding,
+    streamSimulation,
     getDiagnosis,
     chatWithAI,
     healthCheck,
@@ -1,14 +1,121 @@
-// 检查数据是否存在
-if (typeof window.SIMULATION_DATA === 'undefined') {
-    alert("未找到数据文件 data/simulation_data.js。请先运行 Python 生成脚本。");
+// ==================== 数据加载 ====================
+// 两种数据源：
+// 1. 数据包 (generate_report.py --bundle)：多广告主 / 多次运行的列式数据包，按需加载单个运行；
+//    data/simulation_data.js 中的 window.SIMULATION_BUNDLE 给出数据包目录（相对 data/）
+// 2. data/simulation_data.js：单个广告主的逐步数据 (window.SIMULATION_DATA)
+
+const BUNDLE_DIR = 'data/' + (window.SIMULATION_BUNDLE || 'bundle/');
+const TYPED_ARRAYS = { float32: Float32Array, float64: Float64Array, int32: Int32Array };
+
+const SimulationBundle = {
+    index: window.SIMULATION_INDEX || null,
+    cache: new Map(),
+    waiting: new Map(),
+
+    // runs/<id>.js 加载后调用
+    register(id, payload) {
+        const resolve = this.waiting.get(id);
+        if (resolve) {
+            this.waiting.delete(id);
+            resolve(payload);
+        }
+    },
+
+    // json / base64：以 <script> 加载，file:// 下也可用
+    loadScript(run) {
+        return new Promise((resolve, reject) => {
+            this.waiting.set(run.id, resolve);
+            const script = document.createElement('script');
+            script.src = BUNDLE_DIR + run.file;
+            script.onload = () => script.remove();
+            script.onerror = () => {
+                this.waiting.delete(run.id);
+                script.remove();
+                reject(new Error(`无法加载 ${run.file}`));
+            };
+            document.head.appendChild(script);
+        });
+    },
+
+    // binary：fetch 读取（需要 HTTP 服务），gzip 时用 DecompressionStream 解压
+    async loadBinary(run) {
+        const response = await fetch(BUNDLE_DIR + run.file);
+        if (!response.ok) throw new Error(`无法加载 ${run.file}: ${response.status}`);
+        if (!this.index.gzip) return response.arrayBuffer();
+        const stream = response.body.pipeThrough(new DecompressionStream('gzip'));
+        return new Response(stream).arrayBuffer();
+    },
+
+    decode(run, payload) {
+        const columns = {};
+        let offset = 0;
+        for (const { name, dtype } of this.index.columns) {
+            const Typed = TYPED_ARRAYS[dtype];
+            if (this.index.encoding === 'json') {
+                columns[name] = payload[name];
+            } else if (this.index.encoding === 'base64') {
+                const bytes = Uint8Array.from(atob(payload[name]), c => c.charCodeAt(0));
+                columns[name] = new Typed(bytes.buffer);
+            } else {
+                columns[name] = new Typed(payload, offset, run.steps);
+                offset += run.steps * Typed.BYTES_PER_ELEMENT;
+            }
+        }
+        return columns;
+    },
+
+    async load(run) {
+        if (!this.cache.has(run.id)) {
+            const payload = this.index.encoding === 'binary' ? await this.loadBinary(run) : await this.loadScript(run);
+            this.cache.set(run.id, buildRun(run, this.decode(run, payload)));
+        }
+        return this.cache.get(run.id);
+    }
+};
+
+// 由逐步列计算累计列，得到与 simulation_data.js 相同的指标
+function buildRun(meta, columns) {
+    const n = meta.steps;
+    const run = {
+        meta,
+        step: new Array(n), alpha: columns.alpha, step_cost: columns.step_cost,
+        step_conversion: columns.step_conversion, step_wins: columns.step_wins, step_traffic: columns.step_traffic,
+        total_cost: new Float64Array(n), total_conversion: new Float64Array(n), total_wins: new Float64Array(n),
+        remaining_budget: new Float64Array(n), budget_percentage: new Float64Array(n), real_cpa: new Float64Array(n)
+    };
+    let totalCost = 0, totalConversion = 0, totalWins = 0;
+    for (let i = 0; i < n; i++) {
+        totalCost += columns.step_cost[i];
+        totalConversion += columns.step_conversion[i];
+        totalWins += columns.step_wins[i];
+        const remaining = Math.max(meta.initial_budget - totalCost, 0);
+        run.step[i] = i;
+        run.total_cost[i] = totalCost;
+        run.total_conversion[i] = totalConversion;
+        run.total_wins[i] = totalWins;
+        run.remaining_budget[i] = remaining;
+        run.budget_percentage[i] = (meta.initial_budget - remaining) / meta.initial_budget * 100;
+        run.real_cpa[i] = totalCost / (totalConversion + 1e-10);
+    }
+    return run;
+}
+
+// simulation_data.js 的逐步对象 -> 列
+function fromLegacy(data) {
+    const run = { meta: data.meta };
+    for (const key of Object.keys(data.history[0])) {
+        run[key] = data.history.map(h => h[key]);
+    }
+    return run;
 }
 
-const META = window.SIMULATION_DATA.meta;
-const HISTORY = window.SIMULATION_DATA.history;
-const TOTAL_STEPS = HISTORY.length - 1; // 0-based index max
+if (!SimulationBundle.index && typeof window.SIMULATION_DATA === 'undefined') {
+    alert("未找到数据文件 data/simulation_data.js 或其指向的数据包。请先运行 Python 生成脚本。");
+}
 
 // 初始化 DOM 元素
 const elAdvertiserInfo = document.getElementById('advertiser-info');
+const elRunSelect = document.getElementById('run-select');
 const elStatCost = document.getElementById('stat-cost');
 const elProgressBudget = document.getElementById('progress-budget');
 const elStatBudgetPct = document.getElementById('stat-budget-pct');
@@ -17,22 +124,13 @@ const elStatCpa = document.getElementById('stat-cpa');
 const elStatCpaConstraint = document.getElementById('stat-cpa-constraint');
 const elStatWins = document.getElementById('stat-wins');
 const elSlider = document.getElementById('time-slider');
+const elStepTotal = document.getElementById('step-total');
 const elCurrentStepDisplay = document.getElementById('current-step-display');
 const btnPlay = document.getElementById('btn-play');
 
-// 设置静态信息
-elAdvertiserInfo.textContent = `Advertiser: ${META.advertiser_number} | Category: ${META.category} | Budget: ${META.initial_budget}`;
-elStatCpaConstraint.textContent = META.cpa_constraint.toFixed(2);
-elSlider.max = TOTAL_STEPS;
-
-// 准备图表数据
-const xData = HISTORY.map(h => h.step);
-const sAlpha = HISTORY.map(h => h.alpha);
-const sRealCpa = HISTORY.map(h => h.real_cpa);
-const sTotalCost = HISTORY.map(h => h.total_cost);
-const sStepCost = HISTORY.map(h => h.step_cost);
-const sStepConversion = HISTORY.map(h => h.step_conversion);
-const sStepWins = HISTORY.map(h => h.step_wins);
+// 当前运行（列式）
+let RUN = null;
+let TOTAL_STEPS = 0; // 0-based index max
 
 // 初始化 ECharts
 const chartAlpha = echarts.init(document.getElementById('chart-alpha'));
@@ -43,93 +141,115 @@ const chartWins = echarts.init(document.getElementById('chart-wins'));
 const commonGrid = { left: '3%', right: '4%', bottom: '3%', containLabel: true };
 const commonTooltip = { trigger: 'axis', axisPointer: { type: 'cross' } };
 
-// 1. Alpha & Real CPA Chart
-const optionAlpha = {
-    tooltip: commonTooltip,
-    legend: { data: ['Alpha (Bid Price Scale)', 'Real CPA'] },
-    grid: commonGrid,
-    xAxis: { type: 'category', boundaryGap: false, data: xData },
-    yAxis: { type: 'value' },
-    series: [
-        {
-            name: 'Alpha (Bid Price Scale)',
-            type: 'line',
-            data: sAlpha,
-            smooth: true,
-            lineStyle: { width: 3, color: '#ffc107' },
-            itemStyle: { color: '#ffc107' }
-        },
-        {
-            name: 'Real CPA',
-            type: 'line',
-            data: sRealCpa,
-            smooth: true,
-            lineStyle: { type: 'dashed', color: '#17a2b8' },
-            itemStyle: { color: '#17a2b8' },
-            markLine: {
-                data: [{ yAxis: META.cpa_constraint, name: 'CPA Constraint' }],
-                lineStyle: { color: 'red' }
+function renderCharts() {
+    const xData = RUN.step;
+    const toArray = values => Array.from(values);
+
+    // 1. Alpha & Real CPA Chart
+    const optionAlpha = {
+        tooltip: commonTooltip,
+        legend: { data: ['Alpha (Bid Price Scale)', 'Real CPA'] },
+        grid: commonGrid,
+        xAxis: { type: 'category', boundaryGap: false, data: xData },
+        yAxis: { type: 'value' },
+        series: [
+            {
+                name: 'Alpha (Bid Price Scale)',
+                type: 'line',
+                data: toArray(RUN.alpha),
+                smooth: true,
+                lineStyle: { width: 3, color: '#ffc107' },
+                itemStyle: { color: '#ffc107' }
+            },
+            {
+                name: 'Real CPA',
+                type: 'line',
+                data: toArray(RUN.real_cpa),
+                smooth: true,
+                lineStyle: { type: 'dashed', color: '#17a2b8' },
+                itemStyle: { color: '#17a2b8' },
+                markLine: {
+                    data: [{ yAxis: RUN.meta.cpa_constraint, name: 'CPA Constraint' }],
+                    lineStyle: { color: 'red' }
+                }
             }
-        }
-    ]
-};
+        ]
+    };
 
-// 2. Cost Chart
-const optionCost = {
-    tooltip: commonTooltip,
-    legend: { data: ['Total Cost', 'Step Cost'] },
-    grid: commonGrid,
-    xAxis: { type: 'category', boundaryGap: false, data: xData },
-    yAxis: [
-        { type: 'value', name: 'Total' },
-        { type: 'value', name: 'Step', position: 'right' }
-    ],
-    series: [
-        {
-            name: 'Total Cost',
-            type: 'line',
-            areaStyle: {},
-            data: sTotalCost,
-            color: '#28a745'
-        },
-        {
-            name: 'Step Cost',
-            type: 'bar',
-            yAxisIndex: 1,
-            data: sStepCost,
-            color: 'rgba(40, 167, 69, 0.3)'
-        }
-    ]
-};
+    // 2. Cost Chart
+    const optionCost = {
+        tooltip: commonTooltip,
+        legend: { data: ['Total Cost', 'Step Cost'] },
+        grid: commonGrid,
+        xAxis: { type: 'category', boundaryGap: false, data: xData },
+        yAxis: [
+            { type: 'value', name: 'Total' },
+            { type: 'value', name: 'Step', position: 'right' }
+        ],
+        series: [
+            {
+                name: 'Total Cost',
+                type: 'line',
+                areaStyle: {},
+                data: toArray(RUN.total_cost),
+                color: '#28a745'
+            },
+            {
+                name: 'Step Cost',
+                type: 'bar',
+                yAxisIndex: 1,
+                data: toArray(RUN.step_cost),
+                color: 'rgba(40, 167, 69, 0.3)'
+            }
+        ]
+    };
 
-// 3. Wins & Conversion Chart
-const optionWins = {
-    tooltip: commonTooltip,
-    legend: { data: ['Step Wins', 'Step Conversion'] },
-    grid: commonGrid,
-    xAxis: { type: 'category', data: xData },
-    yAxis: { type: 'value' },
-    series: [
-        {
-            name: 'Step Wins',
-            type: 'line',
-            data: sStepWins,
-            smooth: true,
-            color: '#17a2b8'
-        },
-        {
-            name: 'Step Conversion',
-            type: 'bar',
-            data: sStepConversion,
-            color: '#fd7e14'
-        }
-    ]
-};
+    // 3. Wins & Conversion Chart
+    const optionWins = {
+        tooltip: commonTooltip,
+        legend: { data: ['Step Wins', 'Step Conversion'] },
+        grid: commonGrid,
+        xAxis: { type: 'category', data: xData },
+        yAxis: { type: 'value' },
+        series: [
+            {
+                name: 'Step Wins',
+                type: 'line',
+                data: toArray(RUN.step_wins),
+                smooth: true,
+                color: '#17a2b8'
+            },
+            {
+                name: 'Step Conversion',
+                type: 'bar',
+                data: toArray(RUN.step_conversion),
+                color: '#fd7e14'
+            }
+        ]
+    };
+
+    chartAlpha.setOption(optionAlpha, true);
+    chartCost.setOption(optionCost, true);
+    chartWins.setOption(optionWins, true);
+}
 
-// 渲染初始图表
-chartAlpha.setOption(optionAlpha);
-chartCost.setOption(optionCost);
-chartWins.setOption(optionWins);
+function showRun(run) {
+    stopPlay();
+    RUN = run;
+    TOTAL_STEPS = run.step.length - 1;
+    const meta = run.meta;
+
+    // 设置静态信息
+    elAdvertiserInfo.textContent = `Advertiser: ${meta.advertiser_number} | Category: ${meta.category} | Budget: ${meta.initial_budget}`;
+    elStatCpaConstraint.textContent = meta.cpa_constraint.toFixed(2);
+    elSlider.max = TOTAL_STEPS;
+    elStepTotal.textContent = TOTAL_STEPS;
+
+    renderCharts();
+    currentStep = Math.min(currentStep, TOTAL_STEPS);
+    elSlider.value = currentStep;
+    updateDashboard(currentStep);
+}
 
 // 状态更新逻辑
 let isPlaying = false;
@@ -137,45 +257,25 @@ let playInterval = null;
 let currentStep = 0;
 
 function updateDashboard(step) {
-    const data = HISTORY[step];
-    
+    const stepNumber = RUN.step[step];
+    const budgetPercentage = Number(RUN.budget_percentage[step]);
+
     // 更新数字
-    elCurrentStepDisplay.textContent = data.step;
-    elStatCost.textContent = data.total_cost.toFixed(2);
-    elStatCv.textContent = data.total_conversion;
-    elStatWins.textContent = data.total_wins;
-    elStatCpa.textContent = data.real_cpa.toFixed(2);
-    elStatBudgetPct.textContent = data.budget_percentage.toFixed(1);
-    
+    elCurrentStepDisplay.textContent = stepNumber;
+    elStatCost.textContent = Number(RUN.total_cost[step]).toFixed(2);
+    elStatCv.textContent = RUN.total_conversion[step];
+    elStatWins.textContent = RUN.total_wins[step];
+    elStatCpa.textContent = Number(RUN.real_cpa[step]).toFixed(2);
+    elStatBudgetPct.textContent = budgetPercentage.toFixed(1);
+
     // 更新进度条
-    elProgressBudget.style.width = `${data.budget_percentage}%`;
-    
-    // 更新图表的高亮线 (MarkLine)
-    const markLineOpt = {
-        animation: false,
-        data: [{ xAxis: step }]
-    };
-    
-    // 我们可以通过 dispatchAction 来高亮当前点，或者简单地添加一个 markLine
-    // ECharts 更新 markLine 需要 merge option
-    const updateChartMarker = (chart) => {
-        chart.setOption({
-            series: [{
-                markLine: {
-                    symbol: 'none',
-                    label: { show: false },
-                    lineStyle: { type: 'solid', color: '#333', width: 1 },
-                    data: [{ xAxis: data.step }] // 使用 step number 作为 x 轴坐标
-                }
-            }]
-        });
-    };
-    
+    elProgressBudget.style.width = `${budgetPercentage}%`;
+
     // 注意：这里我们假设 series[0] 是我们要加 markLine 的地方
     // 这种做法会覆盖之前的 markLine (如 CPA Constraint)，所以对 Alpha 图表要小心
-    chartCost.setOption({ series: [{ id: 'mk', markLine: { symbol: 'none', data: [{ xAxis: data.step }] } }] });
-    chartWins.setOption({ series: [{ id: 'mk', markLine: { symbol: 'none', data: [{ xAxis: data.step }] } }] });
-    
+    chartCost.setOption({ series: [{ id: 'mk', markLine: { symbol: 'none', data: [{ xAxis: stepNumber }] } }] });
+    chartWins.setOption({ series: [{ id: 'mk', markLine: { symbol: 'none', data: [{ xAxis: stepNumber }] } }] });
+
     // 对于 Alpha 图表，保留 CPA 约束线
     chartAlpha.setOption({
         series: [{
@@ -183,7 +283,7 @@ function updateDashboard(step) {
             markLine: {
                 symbol: 'none',
                 data: [
-                    { xAxis: data.step, lineStyle: { color: '#333' } }
+                    { xAxis: stepNumber, lineStyle: { color: '#333' } }
                 ]
             }
         }]
@@ -235,5 +335,45 @@ window.addEventListener('resize', () => {
     chartWins.resize();
 });
 
+// 运行选择：按 period 分组，组内按得分降序
+function populateRunSelect(runs) {
+    const groups = new Map();
+    for (const run of runs) {
+        if (!groups.has(run.period)) groups.set(run.period, []);
+        groups.get(run.period).push(run);
+    }
+    for (const [period, periodRuns] of groups) {
+        const group = document.createElement('optgroup');
+        group.label = period;
+        periodRuns.sort((a, b) => b.score - a.score);
+        for (const run of periodRuns) {
+            const option = document.createElement('option');
+            option.value = run.id;
+            option.textContent = `广告主 ${run.advertiser_number} · 重复 ${run.replicate} · 得分 ${run.score.toFixed(2)}`;
+            group.appendChild(option);
+        }
+        elRunSelect.appendChild(group);
+    }
+    elRunSelect.classList.remove('d-none');
+}
+
+async function selectRun(runId) {
+    const run = SimulationBundle.index.runs.find(r => r.id === runId);
+    elRunSelect.disabled = true;
+    try {
+        showRun(await SimulationBundle.load(run));
+    } catch (e) {
+        alert(e.message);
+    } finally {
+        elRunSelect.disabled = false;
+    }
+}
+
 // 初始化显示
-updateDashboard(0);
+if (SimulationBundle.index && SimulationBundle.index.runs.length > 0) {
+    populateRunSelect(SimulationBundle.index.runs);
+    elRunSelect.addEventListener('change', e => selectRun(e.target.value));
+    selectRun(elRunSelect.value);
+} else if (typeof window.SIMULATION_DATA !== 'undefined') {
+    showRun(fromLegacy(window.SIMULATION_DATA));
+}
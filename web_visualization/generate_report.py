@@ -3,45 +3,58 @@ import sys
 import pandas as pd
 import numpy as np
 import json
+import argparse
 
 # 配置路径
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
 STRATEGY_ENV_DIR = os.path.join(PROJECT_ROOT, "strategy_train_env")
+BACKEND_DIR = os.path.join(PROJECT_ROOT, "backend")
+
+sys.path.insert(0, BACKEND_DIR)
+from alpha_index import AlphaIndex
+from traffic_store import open_period, period_name
+from profiling import PhaseTimer
+from batch_simulator import PeriodSimulator
+from report_bundle import ENCODINGS, BundleWriter, period_runs
 
 # 默认数据路径
 DEFAULT_DATA_PATH = os.path.join(STRATEGY_ENV_DIR, "data/traffic/period-7.csv")
 DEFAULT_MODEL_PATH = os.path.join(STRATEGY_ENV_DIR, "saved_model/onlineLpTest/period.csv")
+DEFAULT_BUNDLE_DIR = os.path.join(CURRENT_DIR, "data/bundle")
+# index.html always loads this file: either the single-run data or a pointer to the bundle
+SIMULATION_DATA_FILE = os.path.join(CURRENT_DIR, "data/simulation_data.js")
 
 class OnlineLpSimulatorGenerator:
-    def __init__(self, data_path, model_path, advertiser_number=None):
+    def __init__(self, data_path, model_path, advertiser_number=None, profiler=None):
         self.data_path = data_path
         self.model_path = model_path
         self.advertiser_number = advertiser_number
+        # Per-phase timing (backend/profiling.py), disabled by default
+        self.profiler = profiler or PhaseTimer(enabled=False)
         
         print(f"Loading Model: {model_path}")
         if not os.path.exists(model_path):
              raise FileNotFoundError(f"Model not found: {model_path}")
-        self.model = pd.read_csv(model_path)
+        with self.profiler.phase("load_model") as phase:
+            self.model = pd.read_csv(model_path)
+            self.alpha_index = AlphaIndex(self.model)
+            phase.rows = len(self.model)
         
         print(f"Loading Data: {data_path}")
-        if not os.path.exists(data_path):
-             # Try fallback
-             rl_data_path = data_path.replace(".csv", "-rlData.csv").replace("traffic/", "traffic/training_data_rlData_folder/")
-             if os.path.exists(rl_data_path):
-                 print(f"Using alternate data: {rl_data_path}")
-                 self.data_path = rl_data_path
-             else:
-                 raise FileNotFoundError(f"Data not found: {data_path}")
-        
-        self.raw_data = pd.read_csv(self.data_path)
+        reader = open_period(data_path)
+        if reader.source != data_path:
+            print(f"Using data source: {reader.source}")
+        self.data_path = reader.source
         
         if self.advertiser_number is None:
-            valid_advertisers = self.raw_data['advertiserNumber'].unique()
-            self.advertiser_number = valid_advertisers[0]
+            with self.profiler.phase("scan_advertisers"):
+                self.advertiser_number = reader.advertiser_numbers()[0]
             print(f"Auto-selected Advertiser: {self.advertiser_number}")
 
-        self.data = self.raw_data[self.raw_data['advertiserNumber'] == self.advertiser_number].copy()
+        with self.profiler.phase("load_traffic") as phase:
+            self.data = reader.load(self.advertiser_number)
+            phase.rows = len(self.data)
         
         if self.data.empty:
             raise ValueError(f"No data for advertiser {self.advertiser_number}")
@@ -53,17 +66,7 @@ class OnlineLpSimulatorGenerator:
         self.total_steps = 48
 
     def get_alpha(self, time_step, remaining_budget):
-        tem = self.model[
-            (self.model["timeStepIndex"] == time_step) & 
-            (self.model["advertiserCategoryIndex"] == self.category)
-        ]
-        
-        alpha = self.cpa_constraint
-        
-        if len(tem) > 0:
-            filtered_df = tem[tem['cum_cost'] > remaining_budget]
-            if not filtered_df.empty:
-                alpha = filtered_df.iloc[0]['realCPA']
+        alpha = self.alpha_index.lookup(self.category, time_step, remaining_budget, self.cpa_constraint)
         
         alpha = min(self.cpa_constraint * 1.5, alpha)
         return float(alpha)
@@ -93,7 +96,8 @@ class OnlineLpSimulatorGenerator:
         })
 
         for time_step in range(self.total_steps):
-            step_data = self.data[self.data['timeStepIndex'] == time_step]
+            with self.profiler.phase("step_mask", step=time_step, rows=len(self.data)):
+                step_data = self.data[self.data['timeStepIndex'] == time_step]
             
             if step_data.empty:
                 # Still record empty steps to maintain time continuity
@@ -114,36 +118,38 @@ class OnlineLpSimulatorGenerator:
                 })
                 continue
                 
-            alpha = self.get_alpha(time_step, self.remaining_budget)
+            with self.profiler.phase("get_alpha", step=time_step):
+                alpha = self.get_alpha(time_step, self.remaining_budget)
             
-            p_values = step_data['pValue'].values
-            bids = alpha * p_values
+            with self.profiler.phase("auction", step=time_step, rows=len(step_data)):
+                p_values = step_data['pValue'].values
+                bids = alpha * p_values
             
-            least_winning_costs = step_data['leastWinningCost'].values
-            is_win = bids >= least_winning_costs
-            costs = least_winning_costs * is_win
+                least_winning_costs = step_data['leastWinningCost'].values
+                is_win = bids >= least_winning_costs
+                costs = least_winning_costs * is_win
             
-            # Simulation conversions
-            random_vals = np.random.rand(len(p_values))
-            conversions = (random_vals < p_values) & is_win
+                # Simulation conversions
+                random_vals = np.random.rand(len(p_values))
+                conversions = (random_vals < p_values) & is_win
             
-            step_cost = np.sum(costs)
-            step_conversion = np.sum(conversions)
-            step_wins = np.sum(is_win)
-            step_traffic = len(step_data)
+                step_cost = np.sum(costs)
+                step_conversion = np.sum(conversions)
+                step_wins = np.sum(is_win)
+                step_traffic = len(step_data)
             
-            if step_cost > self.remaining_budget:
-                ratio = self.remaining_budget / step_cost if step_cost > 0 else 0
-                step_cost = self.remaining_budget
-                step_wins = int(step_wins * ratio)
-                step_conversion = int(step_conversion * ratio)
+                if step_cost > self.remaining_budget:
+                    ratio = self.remaining_budget / step_cost if step_cost > 0 else 0
+                    step_cost = self.remaining_budget
+                    step_wins = int(step_wins * ratio)
+                    step_conversion = int(step_conversion * ratio)
             
-            self.remaining_budget -= step_cost
-            if self.remaining_budget < 0: self.remaining_budget = 0
+                self.remaining_budget -= step_cost
+                if self.remaining_budget < 0: self.remaining_budget = 0
             
-            total_cost += step_cost
-            total_conversion += step_conversion
-            total_wins += step_wins
+                total_cost += step_cost
+                total_conversion += step_conversion
+                total_wins += step_wins
             
             real_cpa = total_cost / (total_conversion + 1e-10)
             budget_percent = (self.budget - self.remaining_budget) / self.budget * 100
@@ -173,9 +179,66 @@ class OnlineLpSimulatorGenerator:
         
         return metadata, simulation_steps
 
+def generate_bundle(data_paths, model_path, out_dir=DEFAULT_BUNDLE_DIR, replicates=1, seed=None,
+                    encoding="json", gzip_runs=False, profiler=None):
+    """Simulate every advertiser of every period with the batch engine and write a columnar bundle"""
+    profiler = profiler or PhaseTimer(enabled=False)
+    with profiler.phase("load_model"):
+        alpha_index = AlphaIndex.from_csv(model_path)
+    writer = BundleWriter(out_dir, encoding=encoding, gzip_runs=gzip_runs)
+    for data_path in data_paths:
+        period = period_name(data_path)
+        with profiler.phase("batch_prepare"):
+            simulator = PeriodSimulator(data_path, alpha_index, seed=seed)
+        with profiler.phase("batch_run", rows=len(simulator.adv_index) * replicates):
+            result = simulator.run(n_replicates=replicates)
+        with profiler.phase("write_runs") as phase:
+            for meta, columns in period_runs(result, period):
+                writer.add_run(meta, columns)
+            phase.rows = result.n_replicates * simulator.n_advertisers
+        print(f"  {period}: {simulator.n_advertisers} advertisers x {replicates} replicates")
+    index_file = writer.close()
+    # Point index.html at the bundle (directory relative to data/, where simulation_data.js lives)
+    bundle_dir = os.path.relpath(out_dir, os.path.dirname(SIMULATION_DATA_FILE)).replace(os.sep, "/")
+    os.makedirs(os.path.dirname(SIMULATION_DATA_FILE), exist_ok=True)
+    with open(SIMULATION_DATA_FILE, "w", encoding="utf-8") as f:
+        f.write(f"window.SIMULATION_BUNDLE = {json.dumps(bundle_dir + '/')};")
+    print(f"Bundle: {len(writer.runs)} runs, {writer.bytes_written / 1024:.1f} KiB of run data -> {out_dir}")
+    return index_file
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Generate simulation_data.js for the web report")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record per-phase timing to data/simulation_profile.json")
+    parser.add_argument("--trace-memory", action="store_true", help="Also record peak memory per phase (tracemalloc)")
+    parser.add_argument("--bundle", action="store_true",
+                        help="Write a lazy-loaded columnar bundle for all advertisers instead of simulation_data.js")
+    parser.add_argument("--data", nargs="+", default=[DEFAULT_DATA_PATH],
+                        help="Period file (several with --bundle)")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--replicates", type=int, default=1, help="Runs per advertiser in the bundle")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--encoding", choices=ENCODINGS, default="json",
+                        help="json / base64 run scripts (work from file://) or binary (needs an HTTP server)")
+    parser.add_argument("--gzip", action="store_true", help="gzip binary run files")
+    parser.add_argument("--output-dir", default=DEFAULT_BUNDLE_DIR)
+    args = parser.parse_args()
+
+    if args.bundle:
+        profiler = PhaseTimer(enabled=args.profile, trace_memory=args.trace_memory)
+        generate_bundle(args.data, args.model, args.output_dir, args.replicates, args.seed,
+                        args.encoding, args.gzip, profiler)
+        if args.profile:
+            print(profiler.report())
+            print(f"Timing profile saved to: {profiler.save(os.path.join(args.output_dir, 'profile.json'))}")
+        return
+    if len(args.data) > 1:
+        parser.error("multiple --data files need --bundle")
+
     try:
-        generator = OnlineLpSimulatorGenerator(DEFAULT_DATA_PATH, DEFAULT_MODEL_PATH)
+        profiler = PhaseTimer(enabled=args.profile, trace_memory=args.trace_memory)
+        generator = OnlineLpSimulatorGenerator(args.data[0], args.model, profiler=profiler)
         metadata, steps = generator.generate()
         
         output_data = {
@@ -184,13 +247,20 @@ def main():
         }
         
         # Save as JS file to avoid CORS issues
-        output_file = os.path.join(CURRENT_DIR, "data/simulation_data.js")
-        json_str = json.dumps(output_data, indent=2)
-        
-        with open(output_file, "w", encoding='utf-8') as f:
-            f.write(f"window.SIMULATION_DATA = {json_str};")
+        output_file = SIMULATION_DATA_FILE
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        with profiler.phase("write_output"):
+            json_str = json.dumps(output_data, indent=2)
+            
+            with open(output_file, "w", encoding='utf-8') as f:
+                f.write(f"window.SIMULATION_DATA = {json_str};")
             
         print(f"Successfully generated data to: {output_file}")
+
+        if args.profile:
+            profile_file = profiler.save(os.path.join(CURRENT_DIR, "data/simulation_profile.json"))
+            print(profiler.report())
+            print(f"Timing profile saved to: {profile_file}")
         
     except Exception as e:
         print(f"Error: {e}")
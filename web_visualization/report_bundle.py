@@ -0,0 +1,153 @@
+"""
+Columnar report bundle
+======================
+Many advertisers / replicates in one bundle directory that the report lazy-loads
+run by run, instead of one indented-JSON JS file per advertiser:
+
+    data/bundle/
+    ├── index.json        # runs + column schema (fetched when served over HTTP)
+    ├── index.js          # same index as window.SIMULATION_INDEX (works from file://)
+    └── runs/
+        ├── period-7-adv107-r0.js     # encoding "json" / "base64"
+        └── period-7-adv107-r0.bin.gz # encoding "binary" (+ gzip)
+
+Each run stores step-level metrics as one array per column (step 0 is the
+initial all-zero state, as in simulation_data.js); cumulative totals, remaining
+budget and real CPA are derived in the browser.
+
+Encodings:
+- json:   runs/<id>.js calls SimulationBundle.register(id, {column: [numbers]})
+- base64: same, but each column is a base64 little-endian typed array
+- binary: runs/<id>.bin holds the columns back to back (fetch, needs HTTP);
+          with gzip=True it is runs/<id>.bin.gz, decoded with DecompressionStream
+"""
+
+import os
+import sys
+import gzip
+import json
+import base64
+import numpy as np
+from typing import Dict, Iterator, List, Tuple
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "backend")
+
+sys.path.insert(0, BACKEND_DIR)
+from batch_simulator import PeriodResult
+
+FORMAT_VERSION = 1
+ENCODINGS = ("json", "base64", "binary")
+
+# Stored step-level columns; order defines the binary layout
+COLUMNS = [
+    ("alpha", "float32"),
+    ("step_cost", "float32"),
+    ("step_conversion", "int32"),
+    ("step_wins", "int32"),
+    ("step_traffic", "int32"),
+]
+
+# Rounding of the JSON encoding, matching generate_report.py
+JSON_DECIMALS = {"alpha": 4, "step_cost": 2}
+
+
+def period_runs(result: PeriodResult, period: str) -> Iterator[Tuple[Dict, Dict[str, np.ndarray]]]:
+    """Yield (run metadata, step-level columns) for every (replicate, advertiser) of a PeriodResult"""
+    history = result.history_arrays
+    n_steps = result.active.shape[1]
+
+    # Steps without traffic keep the previous alpha, like OnlineLpSimulatorGenerator
+    last_active = np.maximum.accumulate(np.where(result.active, np.arange(n_steps), -1), axis=1)
+    totals = result.lane_totals()
+
+    for replicate in range(result.n_replicates):
+        for adv, row in enumerate(result.advertisers.itertuples(index=False)):
+            alpha = history["alpha"][replicate, adv]
+            alpha = np.where(last_active[adv] >= 0, alpha[np.maximum(last_active[adv], 0)], 0.0)
+            columns = {
+                "alpha": alpha,
+                "step_cost": history["cost"][replicate, adv],
+                "step_conversion": history["conversion"][replicate, adv],
+                "step_wins": history["wins"][replicate, adv],
+                "step_traffic": history["traffic"][replicate, adv],
+            }
+            # Leading step 0 = initial state
+            columns = {name: np.concatenate([[0], values]) for name, values in columns.items()}
+            meta = {
+                "id": f"{period}-adv{int(row.advertiser_number)}-r{replicate}",
+                "period": period,
+                "replicate": replicate,
+                "advertiser_number": int(row.advertiser_number),
+                "category": int(row.category),
+                "initial_budget": float(row.budget),
+                "cpa_constraint": float(row.cpa_constraint),
+                "total_cost": round(float(totals["total_cost"][replicate, adv]), 2),
+                "total_conversion": int(totals["total_conversion"][replicate, adv]),
+                "real_cpa": round(float(totals["real_cpa"][replicate, adv]), 2),
+                "score": round(float(totals["score"][replicate, adv]), 4),
+            }
+            yield meta, columns
+
+
+class BundleWriter:
+    """Writes runs into a bundle directory and the index on close()"""
+
+    def __init__(self, out_dir: str, encoding: str = "json", gzip_runs: bool = False):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding: {encoding}")
+        if gzip_runs and encoding != "binary":
+            raise ValueError("gzip requires the binary encoding (script-loaded runs cannot be decompressed)")
+        self.out_dir = out_dir
+        self.encoding = encoding
+        self.gzip_runs = gzip_runs
+        self.runs: List[Dict] = []
+        self.bytes_written = 0
+        os.makedirs(os.path.join(out_dir, "runs"), exist_ok=True)
+
+    def _run_file(self, run_id: str) -> str:
+        if self.encoding == "binary":
+            return f"runs/{run_id}.bin.gz" if self.gzip_runs else f"runs/{run_id}.bin"
+        return f"runs/{run_id}.js"
+
+    def add_run(self, meta: Dict, columns: Dict[str, np.ndarray]):
+        n_steps = len(next(iter(columns.values())))
+        typed = {name: np.ascontiguousarray(columns[name], dtype=np.dtype(dtype).newbyteorder("<"))
+                 for name, dtype in COLUMNS}
+
+        if self.encoding == "binary":
+            payload = b"".join(values.tobytes() for values in typed.values())
+            if self.gzip_runs:
+                payload = gzip.compress(payload, compresslevel=6)
+        else:
+            if self.encoding == "json":
+                body = {}
+                for name, dtype in COLUMNS:
+                    values = np.asarray(columns[name], dtype=np.float64)
+                    body[name] = (np.round(values, JSON_DECIMALS.get(name, 2)).tolist() if dtype.startswith("float")
+                                  else values.astype(np.int64).tolist())
+            else:
+                body = {name: base64.b64encode(values.tobytes()).decode("ascii") for name, values in typed.items()}
+            payload = (f"SimulationBundle.register({json.dumps(meta['id'])}, "
+                       f"{json.dumps(body, separators=(',', ':'))});").encode("utf-8")
+
+        run_file = self._run_file(meta["id"])
+        with open(os.path.join(self.out_dir, run_file), "wb") as f:
+            f.write(payload)
+        self.bytes_written += len(payload)
+        self.runs.append(dict(meta, file=run_file, steps=n_steps))
+
+    def close(self) -> str:
+        index = {
+            "version": FORMAT_VERSION,
+            "encoding": self.encoding,
+            "gzip": self.gzip_runs,
+            "columns": [{"name": name, "dtype": dtype} for name, dtype in COLUMNS],
+            "runs": self.runs,
+        }
+        text = json.dumps(index, ensure_ascii=False, separators=(",", ":"))
+        with open(os.path.join(self.out_dir, "index.json"), "w", encoding="utf-8") as f:
+            f.write(text)
+        with open(os.path.join(self.out_dir, "index.js"), "w", encoding="utf-8") as f:
+            f.write(f"window.SIMULATION_INDEX = {text};")
+        return os.path.join(self.out_dir, "index.json")